@@ -1,6 +1,14 @@
 import os
-from flask import Flask, render_template, request, jsonify, session
+import time
+from flask import Flask, Request, render_template, request, jsonify, session, Response, stream_with_context, g
 from app.insights_engine import InsightsEngine
+from app.jobs import JobManager, QueueFullError, SUCCEEDED, FAILED, CANCELLED
+from app.upload_store import UploadStore
+from app.upload_profiler import UploadProfiler
+from app.excel_reader import EXCEL_EXTENSIONS
+from app.aggregate_cube import STATS as AGGREGATE_STATS
+from app.metrics import (registry as metrics_registry, stage, start_request_timings, request_timings,
+                         server_timing_header, REQUEST_DURATION)
 import pandas as pd
 import json
 import uuid
@@ -11,13 +19,29 @@ logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__, template_folder='app/templates', static_folder='app/static')
-app.secret_key = os.environ.get('SECRET_KEY', 'insighta-dev-key')
-
 # Configure upload folder
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
+
+# Content-addressed upload storage with a disk quota
+upload_store = UploadStore(UPLOAD_FOLDER)
+upload_store.start_janitor()
+
+class UploadRequest(Request):
+    """
+    Request that streams uploaded files into hashing temp files in the upload folder,
+    profiling large CSV uploads on the way
+    """
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        profiler = None
+        if insights_engine.should_profile_upload(filename, total_content_length):
+            profiler = UploadProfiler()
+        return upload_store.new_temp_file(profiler=profiler)
+
+app = Flask(__name__, template_folder='app/templates', static_folder='app/static')
+app.request_class = UploadRequest
+app.secret_key = os.environ.get('SECRET_KEY', 'insighta-dev-key')
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
 # Sample data path
@@ -25,6 +49,48 @@ SAMPLE_DATA_PATH = os.path.join('app', 'static', 'data', 'sample_data.csv')
 
 # Initialize insights engine
 insights_engine = InsightsEngine()
+# Forget what the engine cached for uploads the janitor deletes
+upload_store.on_remove = insights_engine.forget
+
+# Background workers for analysis jobs
+job_manager = JobManager()
+
+# Cache, deduplication and storage counters on /metrics
+metrics_registry.collect('insighta_dataset_cache', 'Parsed dataset cache', insights_engine.dataset_cache.stats,
+                         counters=('hits', 'misses', 'evictions'))
+metrics_registry.collect('insighta_profile_cache', 'Dataset profile cache', insights_engine.profile_cache.stats,
+                         counters=('hits', 'misses', 'evictions'))
+metrics_registry.collect('insighta_shared_store', 'Cross-process shared dataset store',
+                         insights_engine.shared_store.stats, counters=('hits', 'misses', 'evictions'))
+metrics_registry.collect('insighta_response_cache', 'Cached model responses', insights_engine.response_cache.stats,
+                         counters=('hits', 'misses'))
+metrics_registry.collect('insighta_singleflight', 'Concurrent identical work coalesced into one call',
+                         insights_engine.inflight.stats, counters=('executions', 'coalesced'))
+metrics_registry.collect('insighta_upload_store', 'Content-addressed upload storage', upload_store.stats,
+                         counters=('uploads', 'deduplicated', 'evictions'))
+
+# Report per-stage timings of each request in a Server-Timing header
+SERVER_TIMING = os.environ.get('INSIGHTA_SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+
+@app.before_request
+def start_timing():
+    g.request_started = time.perf_counter()
+    start_request_timings()
+
+@app.after_request
+def record_timing(response):
+    elapsed = time.perf_counter() - g.get('request_started', time.perf_counter())
+    REQUEST_DURATION.observe(elapsed, endpoint=request.endpoint or 'unknown', method=request.method,
+                             status=response.status_code)
+    if SERVER_TIMING:
+        timings = request_timings() + [('total', elapsed)]
+        response.headers['Server-Timing'] = server_timing_header(timings)
+    return response
+
+def serialize(payload):
+    """jsonify a response payload, timed as the 'serialize' stage"""
+    with stage('serialize'):
+        return jsonify(payload)
 
 @app.route('/')
 def index():
@@ -68,11 +134,12 @@ def sample_data():
         session['session_id'] = session_id
         session['file_path'] = SAMPLE_DATA_PATH
         session['original_filename'] = 'sample_data.csv'
+        session.pop('workbook_path', None)
         
         # Get data summary
         data_summary = insights_engine.get_data_summary(SAMPLE_DATA_PATH)
         
-        return jsonify({
+        return serialize({
             'success': True,
             'filename': 'sample_data.csv (Demo)',
             'summary': data_summary
@@ -101,32 +168,50 @@ def upload_file():
         
         # Check file extension
         file_ext = os.path.splitext(file.filename)[1].lower()
-        if file_ext not in ['.csv', '.xlsx', '.xls', '.json']:
+        if file_ext not in ['.csv', '.xlsx', '.xls', '.json', '.ndjson', '.jsonl']:
             logger.error(f"Unsupported file type: {file_ext}")
-            return jsonify({'error': f'Unsupported file type: {file_ext}. Please upload CSV, Excel, or JSON files.'}), 400
+            return jsonify({'error': f'Unsupported file type: {file_ext}. Please upload CSV, Excel, JSON or NDJSON files.'}), 400
         
         # Generate unique session ID for this analysis
         session_id = str(uuid.uuid4())
         session['session_id'] = session_id
         
-        # Save file with session ID
-        saved_filename = f"{session_id}{file_ext}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], saved_filename)
-        
-        # Ensure upload directory exists
-        if not os.path.exists(app.config['UPLOAD_FOLDER']):
-            os.makedirs(app.config['UPLOAD_FOLDER'])
-        
-        file.save(file_path)
-        logger.info(f"File saved to {file_path}")
+        # Store the file under its content hash; identical uploads share one copy
+        # and everything derived from it (parsed data, profile, cached insights)
+        profiler = getattr(file.stream, 'profiler', None)
+        profile = profiler.finish() if profiler is not None else None
+        file_path, content_hash, duplicate = upload_store.save(file, file_ext)
+        insights_engine.remember_content_hash(file_path, content_hash)
+        if profile is not None:
+            # The summary was computed while the upload arrived; no second pass over the file
+            insights_engine.remember_profile(file_path, profile)
+        logger.info(f"File {'matched existing' if duplicate else 'saved to'} {file_path}")
         
         # Store file info in session
         session['file_path'] = file_path
         session['original_filename'] = file.filename
+        session.pop('workbook_path', None)
         
         try:
-            # Get data summary for preview
-            data_summary = insights_engine.get_data_summary(file_path)
+            sheets = None
+            with upload_store.in_use(file_path):
+                if file_ext in EXCEL_EXTENSIONS:
+                    # Workbooks are analysed one sheet at a time; the chosen sheet is
+                    # converted once and the workbook is not parsed again
+                    sheets = insights_engine.list_sheets(file_path)
+                    sheet = request.form.get('sheet') or sheets[0]['name']
+                    session['workbook_path'] = file_path
+                    file_path = insights_engine.convert_sheet(file_path, sheet)
+                    session['file_path'] = file_path
+                
+                # Convert once to columnar form so later analyses skip text parsing
+                try:
+                    insights_engine.ingest(file_path)
+                except Exception as e:
+                    logger.warning(f"Columnar conversion failed, analyses will parse {file_path} directly: {str(e)}")
+                
+                # Get data summary for preview
+                data_summary = insights_engine.get_data_summary(file_path)
             logger.info("Successfully generated data summary")
             
             # Return the response with success flag, filename and summary
@@ -135,8 +220,11 @@ def upload_file():
                 'filename': file.filename,
                 'summary': data_summary
             }
+            if sheets is not None:
+                response_data['sheets'] = sheets
+                response_data['sheet'] = sheet
             logger.debug(f"Response data keys: {list(response_data.keys())}")
-            return jsonify(response_data)
+            return serialize(response_data)
             
         except Exception as e:
             logger.error(f"Error processing uploaded file: {str(e)}")
@@ -150,39 +238,359 @@ def upload_file():
         logger.error(traceback.format_exc())
         return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
 
+@app.route('/sheet', methods=['POST'])
+def select_sheet():
+    """Switch the analysed sheet of the uploaded Excel workbook"""
+    workbook_path = session.get('workbook_path')
+    if workbook_path is None or not os.path.exists(workbook_path):
+        return jsonify({'error': 'No Excel workbook uploaded. Please upload a file first.'}), 400
+    
+    data = request.get_json(silent=True) or {}
+    sheet = data.get('sheet')
+    if not sheet:
+        return jsonify({'error': 'No sheet selected'}), 400
+    
+    try:
+        with upload_store.in_use(workbook_path):
+            sheets = insights_engine.list_sheets(workbook_path)
+            if sheet not in [info['name'] for info in sheets]:
+                return jsonify({'error': f'Sheet not found: {sheet}'}), 404
+            file_path = insights_engine.convert_sheet(workbook_path, sheet)
+            data_summary = insights_engine.get_data_summary(file_path)
+    except Exception as e:
+        logger.error(f"Error loading sheet {sheet!r}: {str(e)}")
+        return jsonify({'error': f'Error processing sheet: {str(e)}'}), 500
+    
+    session['file_path'] = file_path
+    return serialize({
+        'success': True,
+        'filename': session.get('original_filename'),
+        'sheets': sheets,
+        'sheet': sheet,
+        'summary': data_summary
+    })
+
+def get_session_file():
+    """Return the session's data file, or None if nothing was uploaded or the upload was evicted"""
+    file_path = session.get('file_path')
+    if file_path is None or not os.path.exists(file_path):
+        return None
+    return file_path
+
 @app.route('/analyze', methods=['POST'])
 def analyze_data():
     """Generate insights based on the uploaded data and parameters"""
-    if 'file_path' not in session:
+    file_path = get_session_file()
+    if file_path is None:
         return jsonify({'error': 'No file uploaded. Please upload a file first.'}), 400
     
-    file_path = session['file_path']
-    
     # Get analysis parameters
     data = request.get_json()
     insight_type = data.get('insight_type', 'general')
     question = data.get('question', None)
     
     try:
-        # Generate insights
-        insights = insights_engine.generate_insights(
-            file_path, 
-            question=question, 
-            insight_type=insight_type
-        )
+        with upload_store.in_use(file_path):
+            # Generate insights
+            insights = insights_engine.generate_insights(
+                file_path, 
+                question=question, 
+                insight_type=insight_type
+            )
         
-        # Generate visualizations data
+            # Generate visualizations data
+            visualization_data = insights_engine.generate_visualization_data(file_path)
+        
+            return serialize({
+                'success': True,
+                'insights': insights,
+                'visualizations': visualization_data
+            })
+    except Exception as e:
+        logger.error(f"Error generating insights: {str(e)}")
+        return jsonify({'error': f'Error generating insights: {str(e)}'}), 500
+
+def run_analysis_job(job, file_path, question, insight_type):
+    """Job function: build visualizations, then stream insights into the job's partial result"""
+    with upload_store.in_use(file_path):
+        job.update(0.1, 'Building visualizations')
         visualization_data = insights_engine.generate_visualization_data(file_path)
+        job.check_cancelled()
         
-        return jsonify({
+        job.update(0.3, 'Generating insights', visualizations=visualization_data)
+        insights = ''
+        for chunk in insights_engine.generate_insights_stream(
+            file_path,
+            question=question,
+            insight_type=insight_type
+        ):
+            job.check_cancelled()
+            insights += chunk
+            job.update(insights=insights)
+        
+        return {
             'success': True,
             'insights': insights,
             'visualizations': visualization_data
-        })
+        }
+
+def get_session_job(job_id):
+    """Return the job if it belongs to the current session, otherwise None"""
+    job = job_manager.get(job_id)
+    if job is None or job.owner != session.get('session_id'):
+        return None
+    return job
+
+@app.route('/jobs/analyze', methods=['POST'])
+def submit_analysis_job():
+    """Queue an analysis and return its job id immediately"""
+    file_path = get_session_file()
+    if file_path is None:
+        return jsonify({'error': 'No file uploaded. Please upload a file first.'}), 400
+    
+    # Get analysis parameters
+    data = request.get_json()
+    insight_type = data.get('insight_type', 'general')
+    question = data.get('question', None)
+    
+    try:
+        job = job_manager.submit('analysis', run_analysis_job, file_path, question, insight_type,
+                                 owner=session.get('session_id'))
+    except QueueFullError as e:
+        logger.warning(f"Rejected analysis job: {str(e)}")
+        return jsonify({'error': f'Server is busy: {str(e)}'}), 503
+    
+    return jsonify({'success': True, 'job_id': job.id, 'status': job.status}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Report status, progress and partial results of a job"""
+    job = get_session_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Return the result of a finished job"""
+    job = get_session_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status == SUCCEEDED:
+        return serialize(job.result)
+    if job.status == FAILED:
+        return jsonify({'error': f'Error generating insights: {job.error}'}), 500
+    if job.status == CANCELLED:
+        return jsonify({'error': 'Job was cancelled'}), 409
+    return jsonify(job.to_dict()), 202
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    job = get_session_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    cancelled = job_manager.cancel(job_id)
+    return jsonify({'success': cancelled, 'status': job.status})
+
+@app.route('/jobs/metrics', methods=['GET'])
+def job_metrics():
+    """Report job queue depth and counters"""
+    return jsonify(job_manager.metrics())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose stage, prompt and request histograms and cache counters in the Prometheus text format"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+def format_sse(event, data):
+    """Format a Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {app.json.dumps(data)}\n\n"
+
+@app.route('/analyze/stream', methods=['POST'])
+def analyze_data_stream():
+    """
+    Stream insights over Server-Sent Events.
+    
+    Sends a 'visualizations' event first, then one 'insight' event per chunk of
+    markdown as the model produces it, and finally 'done' (or 'error').
+    """
+    file_path = get_session_file()
+    if file_path is None:
+        return jsonify({'error': 'No file uploaded. Please upload a file first.'}), 400
+    
+    # Get analysis parameters
+    data = request.get_json()
+    insight_type = data.get('insight_type', 'general')
+    question = data.get('question', None)
+    
+    def generate():
+        try:
+            with upload_store.in_use(file_path):
+                visualization_data = insights_engine.generate_visualization_data(file_path)
+                yield format_sse('visualizations', visualization_data)
+            
+                for chunk in insights_engine.generate_insights_stream(
+                    file_path,
+                    question=question,
+                    insight_type=insight_type
+                ):
+                    yield format_sse('insight', {'text': chunk})
+            
+                yield format_sse('done', {'success': True})
+        except Exception as e:
+            logger.error(f"Error streaming insights: {str(e)}")
+            yield format_sse('error', {'error': f'Error generating insights: {str(e)}'})
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Upper bound on insight requests in one batch
+MAX_BATCH_REQUESTS = 10
+
+def parse_batch_requests(data):
+    """
+    Read the insight requests of a batch analysis body
+    
+    Accepts either 'requests': [{'insight_type': ..., 'question': ...}, ...] or the
+    shorthand 'insight_types': [...] and 'questions': [...]. Defaults to all insight types.
+    """
+    requests_list = data.get('requests')
+    if requests_list is None:
+        requests_list = [{'insight_type': insight_type} for insight_type in data.get('insight_types', [])]
+        requests_list += [{'question': question} for question in data.get('questions', [])]
+    if not requests_list:
+        requests_list = [{'insight_type': insight_type} for insight_type in ['general', 'trends', 'anomalies']]
+    if not isinstance(requests_list, list) or not all(isinstance(item, dict) for item in requests_list):
+        raise ValueError('requests must be a list of objects')
+    if len(requests_list) > MAX_BATCH_REQUESTS:
+        raise ValueError(f'At most {MAX_BATCH_REQUESTS} insight requests are allowed per batch')
+    return requests_list
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """
+    Generate several insight types and questions for the session's dataset at once.
+    
+    The dataset is profiled once and the LLM calls run concurrently. With
+    "stream": true, results are sent as Server-Sent Events ('visualizations',
+    then one 'result' per finished request, then 'done'); otherwise they are
+    returned together in request order.
+    """
+    file_path = get_session_file()
+    if file_path is None:
+        return jsonify({'error': 'No file uploaded. Please upload a file first.'}), 400
+    data = request.get_json() or {}
+    try:
+        requests_list = parse_batch_requests(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if data.get('stream'):
+        def generate():
+            try:
+                with upload_store.in_use(file_path):
+                    yield format_sse('visualizations', insights_engine.generate_visualization_data(file_path))
+                    for index, result in insights_engine.iter_insights_batch(file_path, requests_list):
+                        yield format_sse('result', dict(result, index=index))
+                    yield format_sse('done', {'success': True})
+            except Exception as e:
+                logger.error(f"Error streaming batch insights: {str(e)}")
+                yield format_sse('error', {'error': f'Error generating insights: {str(e)}'})
+        
+        return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    
+    try:
+        with upload_store.in_use(file_path):
+            results = insights_engine.generate_insights_batch(file_path, requests_list)
+            visualization_data = insights_engine.generate_visualization_data(file_path)
+        
+            return serialize({
+                'success': True,
+                'results': results,
+                'visualizations': visualization_data
+            })
     except Exception as e:
-        logger.error(f"Error generating insights: {str(e)}")
+        logger.error(f"Error generating batch insights: {str(e)}")
         return jsonify({'error': f'Error generating insights: {str(e)}'}), 500
 
+# Upper bound on groups returned by one aggregation query
+MAX_QUERY_LIMIT = 1000
+
+def parse_aggregate_query(data):
+    """
+    Read the options of an aggregation query body
+    
+    Accepts 'group_by' (column or list of columns), 'filters' ({column: value or
+    [values]}), 'measures', 'stats', 'sort_by', 'descending' and 'limit'.
+    """
+    group_by = data.get('group_by') or []
+    if isinstance(group_by, str):
+        group_by = [group_by]
+    filters = data.get('filters') or {}
+    measures = data.get('measures')
+    if isinstance(measures, str):
+        measures = [measures]
+    if not isinstance(group_by, list) or not isinstance(filters, dict) or not (measures is None or isinstance(measures, list)):
+        raise ValueError('group_by and measures must be lists of column names and filters an object')
+    stats = data.get('stats') or list(AGGREGATE_STATS)
+    if not isinstance(stats, list) or not set(stats) <= set(AGGREGATE_STATS):
+        raise ValueError(f"stats must be a list drawn from: {', '.join(AGGREGATE_STATS)}")
+    try:
+        limit = int(data.get('limit', 100))
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    if not 1 <= limit <= MAX_QUERY_LIMIT:
+        raise ValueError(f'limit must be between 1 and {MAX_QUERY_LIMIT}')
+    return {
+        'group_by': group_by,
+        'filters': filters,
+        'measures': measures,
+        'stats': tuple(stats),
+        'sort_by': data.get('sort_by'),
+        'descending': bool(data.get('descending', True)),
+        'limit': limit
+    }
+
+@app.route('/query', methods=['GET', 'POST'])
+def query_aggregates():
+    """
+    Drill into the session's dataset with precomputed aggregates.
+    
+    GET lists the cube's dimensions and measures. POST returns the measures'
+    sum, count, mean, min and max per group, e.g.
+    {"group_by": ["Region", "Sales_Channel"], "filters": {"Product_Category": "Toys"}}.
+    Queries over the cube's dimensions are answered from memory; other columns
+    are aggregated from the data.
+    """
+    file_path = get_session_file()
+    if file_path is None:
+        return jsonify({'error': 'No file uploaded. Please upload a file first.'}), 400
+    try:
+        options = parse_aggregate_query(request.get_json(silent=True) or {}) if request.method == 'POST' else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        with upload_store.in_use(file_path):
+            started = time.perf_counter()
+            if options is None:
+                cube = insights_engine.get_cube(file_path)
+                if cube is None:
+                    return jsonify({'error': 'Aggregation queries need tabular data'}), 400
+                return serialize({'success': True, 'dimensions': cube.dimensions, 'measures': cube.measures,
+                                  'rows': cube.rows})
+            result = insights_engine.query_aggregates(file_path, **options)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error querying aggregates: {str(e)}")
+        return jsonify({'error': f'Error querying aggregates: {str(e)}'}), 500
+    
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return serialize(dict(result, success=True))
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True) 
\ No newline at end of file
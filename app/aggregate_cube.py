@@ -0,0 +1,433 @@
+"""
+AggregateCube: group-by aggregates over low-cardinality dimensions, precomputed once per dataset
+"""
+import re
+import itertools
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Categorical columns with at most this many distinct values are dimensions
+MAX_DIMENSION_CARDINALITY = 50
+MAX_DIMENSIONS = 6
+
+# Cubes are precomputed for every combination of up to this many dimensions
+MAX_DEPTH = 3
+
+MAX_MEASURES = 20
+
+# Cell budget of all precomputed cubes together, and of any single cube
+MAX_TOTAL_CELLS = 20_000
+MAX_CUBE_CELLS = 10_000
+
+STATS = ('sum', 'count', 'mean', 'min', 'max')
+
+DEFAULT_QUERY_LIMIT = 100
+
+
+class CubeTable:
+    """
+    Aggregates of every measure for each observed combination of some dimensions.
+
+    Sums, non-null counts, minima and maxima are kept (means are derived), so a
+    table can be merged with another chunk's table or rolled up to fewer
+    dimensions without going back to the data.
+    """
+    def __init__(self, dimensions, rows, sums, counts, mins, maxs):
+        self.dimensions = tuple(dimensions)
+        self.rows = rows  # Series: rows per cell
+        self.sums = sums  # DataFrames: cells x measures
+        self.counts = counts
+        self.mins = mins
+        self.maxs = maxs
+
+    @classmethod
+    def from_frame(cls, data, dimensions, measures):
+        """Aggregate a DataFrame (or one chunk of a file)"""
+        grouped = data[list(measures)].groupby([data[dim] for dim in dimensions], dropna=False,
+                                                observed=True, sort=False)
+        return cls(dimensions, grouped.size(), grouped.sum(min_count=1), grouped.count(),
+                   grouped.min(), grouped.max())
+
+    @property
+    def cells(self):
+        return len(self.rows)
+
+    @property
+    def nbytes(self):
+        return int(self.rows.memory_usage(index=True, deep=True)) + 4 * self.sums.size * 8
+
+    def merge(self, other):
+        """Combine with the table of another chunk over the same dimensions"""
+        return self._regroup([self, other], list(range(len(self.dimensions))), self.dimensions)
+
+    def rollup(self, dimensions):
+        """Aggregate away every dimension not listed"""
+        levels = [self.dimensions.index(dim) for dim in dimensions]
+        return self._regroup([self], levels, dimensions)
+
+    def map_keys(self, index):
+        """
+        Relabel the cells of a one-dimension table and merge cells that now share a key
+
+        Args:
+            index (Index): New key of each cell, in cell order
+        """
+        def relabel(part):
+            part = part.copy()
+            part.index = index
+            return part
+        relabeled = CubeTable(self.dimensions, relabel(self.rows), relabel(self.sums), relabel(self.counts),
+                              relabel(self.mins), relabel(self.maxs))
+        return self._regroup([relabeled], [0], self.dimensions)
+
+    def filter(self, filters):
+        """
+        Keep the cells matching every filter
+
+        Args:
+            filters (dict): Dimension -> list of accepted values (None matches missing)
+        """
+        mask = np.ones(self.cells, dtype=bool)
+        for dim, values in filters.items():
+            level = self.rows.index.get_level_values(self.dimensions.index(dim))
+            wanted = level.isin([value for value in values if value is not None])
+            if any(value is None for value in values):
+                wanted |= level.isna()
+            mask &= np.asarray(wanted)
+        return CubeTable(self.dimensions, self.rows[mask], self.sums[mask], self.counts[mask],
+                         self.mins[mask], self.maxs[mask])
+
+    @staticmethod
+    def _regroup(tables, levels, dimensions):
+        def combine(parts, how):
+            frame = pd.concat(parts)
+            options = {'min_count': 1} if how == 'sum' and frame.ndim == 2 else {}
+            if levels:
+                return getattr(frame.groupby(level=levels, dropna=False, sort=False), how)(**options)
+            # Grand total: a single cell
+            total = getattr(frame, how)(**options)
+            return total.to_frame().T if frame.ndim == 2 else pd.Series([total])
+
+        return CubeTable(dimensions,
+                         combine([t.rows for t in tables], 'sum'),
+                         combine([t.sums for t in tables], 'sum'),
+                         combine([t.counts for t in tables], 'sum'),
+                         combine([t.mins for t in tables], 'min'),
+                         combine([t.maxs for t in tables], 'max'))
+
+
+class AggregateCube:
+    """
+    Precomputed group-by cubes of one dataset.
+
+    Dimensions are the low-cardinality categorical columns and measures the
+    numeric columns. A table is computed from the data for each combination of
+    MAX_DEPTH dimensions (within the cell budget), and every smaller combination
+    is rolled up from one of those. Queries then filter and roll up a small
+    in-memory table instead of scanning the data, so drill-downs take
+    milliseconds and return exact values.
+    """
+    def __init__(self, dimensions, measures, rows, tables):
+        """
+        Args:
+            dimensions (list): Dimension columns
+            measures (list): Measure columns
+            rows (int): Rows aggregated
+            tables (dict): Sorted dimension tuple -> CubeTable
+        """
+        self.dimensions = list(dimensions)
+        self.measures = list(measures)
+        self.rows = rows
+        self.tables = tables
+
+    @classmethod
+    def plan(cls, profile):
+        """
+        Choose dimensions, measures and the dimension combinations to compute from the data
+
+        Args:
+            profile (DatasetProfile): Profile of the data
+
+        Returns:
+            tuple: (dimensions, measures, combinations) where combinations are the
+                top-level dimension tuples to aggregate, in file order
+        """
+        cardinality = {col: info['unique'] for col, info in profile.top_categories.items()
+                       if 2 <= info['unique'] <= MAX_DIMENSION_CARDINALITY}
+        # The fewest distinct values first: those make the most readable breakdowns
+        dimensions = sorted(cardinality, key=lambda col: cardinality[col])[:MAX_DIMENSIONS]
+        dimensions = [col for col in profile.column_names if col in dimensions]
+        measures = profile.numeric_columns[:MAX_MEASURES]
+
+        def estimated_cells(combination):
+            return min(int(np.prod([cardinality[dim] + 1 for dim in combination])), max(profile.rows, 1))
+
+        combinations, budget = [], MAX_TOTAL_CELLS
+        for depth in range(min(MAX_DEPTH, len(dimensions)), 0, -1):
+            candidates = sorted(itertools.combinations(dimensions, depth), key=estimated_cells)
+            for combination in candidates:
+                if any(set(combination) <= set(chosen) for chosen in combinations):
+                    continue
+                cells = estimated_cells(combination)
+                if cells <= MAX_CUBE_CELLS and cells <= budget:
+                    combinations.append(combination)
+                    budget -= cells
+        return dimensions, measures, combinations
+
+    @classmethod
+    def from_chunks(cls, chunks, dimensions, measures, combinations):
+        """
+        Build the cube in one pass over DataFrame chunks
+
+        Args:
+            chunks (iterable): DataFrames holding at least the dimension and measure columns
+            dimensions (list): Dimension columns
+            measures (list): Measure columns
+            combinations (list): Dimension tuples to aggregate from the data
+
+        Returns:
+            AggregateCube: The cube
+        """
+        tables, rows = {}, 0
+        for chunk in chunks:
+            rows += len(chunk)
+            for combination in combinations:
+                table = CubeTable.from_frame(chunk, combination, measures)
+                tables[combination] = table if combination not in tables else tables[combination].merge(table)
+
+        # Roll every smaller combination up from the smallest table that contains it
+        computed = dict(tables)
+        for depth in range(1, MAX_DEPTH + 1):
+            for combination in itertools.combinations(dimensions, depth):
+                if combination in tables:
+                    continue
+                sources = [table for dims, table in computed.items() if set(combination) <= set(dims)]
+                if sources:
+                    tables[combination] = min(sources, key=lambda table: table.cells).rollup(combination)
+        logger.info(f"Built aggregate cube over {len(dimensions)} dimensions and {len(measures)} measures: "
+                    f"{len(tables)} tables, {sum(t.cells for t in tables.values())} cells from {rows} rows")
+        return cls(dimensions, measures, rows, tables)
+
+    @classmethod
+    def from_dataframe(cls, data, profile):
+        """Build the cube of an in-memory DataFrame"""
+        dimensions, measures, combinations = cls.plan(profile)
+        return cls.from_chunks([data], dimensions, measures, combinations)
+
+    @property
+    def nbytes(self):
+        """Rough resident size, used to budget the cache"""
+        return sum(table.nbytes for table in self.tables.values()) + 1024
+
+    def can_answer(self, group_by, filters=None):
+        """Check whether a query only involves precomputed dimensions"""
+        return self._table_for(set(group_by) | set(filters or {})) is not None
+
+    def query(self, group_by, filters=None, measures=None, stats=STATS, sort_by=None,
+              descending=True, limit=DEFAULT_QUERY_LIMIT):
+        """
+        Aggregate measures by some dimensions
+
+        Args:
+            group_by (list): Dimensions to break down by (may be empty for a total)
+            filters (dict, optional): Dimension -> value or list of values to keep
+            measures (list, optional): Measures to return; all by default
+            stats (tuple): Statistics per measure, from STATS
+            sort_by (str, optional): 'rows' or a measure name; rows are then sorted by
+                that measure's first requested statistic. Defaults to 'rows'.
+            descending (bool): Sort order
+            limit (int): Maximum number of groups returned
+
+        Returns:
+            dict: 'group_by', 'measures', 'stats', 'groups' (list of dicts with the
+                dimension values, 'rows' and per-measure statistics), 'total_groups'
+                and 'truncated'
+        """
+        filters = _normalize_filters(filters)
+        group_by = list(group_by)
+        measures = self.measures if measures is None else list(measures)
+        unknown = [m for m in measures if m not in self.measures]
+        if unknown:
+            raise ValueError(f"Not a measure: {', '.join(map(str, unknown))}")
+        bad_stats = [s for s in stats if s not in STATS]
+        if bad_stats:
+            raise ValueError(f"Unknown statistic: {', '.join(bad_stats)}")
+        if len(set(group_by)) != len(group_by):
+            raise ValueError("Each dimension can only be grouped by once")
+
+        table = self._table_for(set(group_by) | set(filters))
+        if table is None:
+            raise KeyError(f"No precomputed cube covers {sorted(set(group_by) | set(filters))}")
+        if filters:
+            table = table.filter(filters)
+        table = table.rollup(group_by)
+        return _query_result(table, group_by, measures, stats, sort_by, descending, limit)
+
+    def describe_for_question(self, question, max_chars):
+        """
+        Render exact aggregates for the dimensions and measures a question mentions
+
+        Args:
+            question (str): User question
+            max_chars (int): Maximum length of the returned text
+
+        Returns:
+            str: Aggregate table as text, empty when the question names no dimension or measure
+        """
+        text = _normalize_name(question)
+        dimensions = [dim for dim in self.dimensions if _mentions(text, dim)]
+        measures = [measure for measure in self.measures if _mentions(text, measure)]
+        if not dimensions and not measures:
+            return ''
+        # Two nested levels are as much as a prompt table can show legibly
+        group_by = dimensions[:2] if self.can_answer(dimensions[:2]) else dimensions[:1]
+        if not self.can_answer(group_by):
+            # No precomputed table (e.g. the data has no dimension columns)
+            return ''
+        measures = measures or self.measures[:3]
+        result = self.query(group_by, measures=measures, stats=('sum', 'mean', 'count'))
+
+        title = f"by {', '.join(map(str, group_by))}" if group_by else "over all rows"
+        lines = [f"Exact aggregates {title} ({result['total_groups']} groups, largest first):"]
+        length = len(lines[0])
+        for shown, group in enumerate(result['groups']):
+            key = ', '.join(f"{dim}={'(missing)' if group[dim] is None else group[dim]}" for dim in group_by)
+            values = '; '.join(f"{measure} sum={_format_number(stats['sum'])} mean={_format_number(stats['mean'])}"
+                               f" count={_format_number(stats['count'])}"
+                               for measure, stats in group['measures'].items())
+            line = f"{key + ': ' if key else ''}rows={group['rows']}{'; ' + values if values else ''}"
+            if length + len(line) + 1 > max_chars:
+                lines.append(f"... {result['total_groups'] - shown} more groups")
+                break
+            lines.append(line)
+            length += len(line) + 1
+        else:
+            if result['truncated']:
+                lines.append(f"... {result['total_groups'] - len(result['groups'])} more groups")
+        return '\n'.join(lines) if len(lines) > 1 else ''
+
+    def _table_for(self, dimensions):
+        if not dimensions <= set(self.dimensions):
+            return None
+        if not dimensions:
+            # A grand total rolls up from any table
+            return min(self.tables.values(), key=lambda table: table.cells) if self.tables else None
+        candidates = [table for dims, table in self.tables.items() if dimensions <= set(dims)]
+        return min(candidates, key=lambda table: table.cells) if candidates else None
+
+
+def query_dataframe(data, group_by, filters=None, measures=None, **options):
+    """
+    Answer a cube query directly from the data, for dimensions the cube does not cover
+
+    Args:
+        data (DataFrame): Loaded data
+        group_by (list): Columns to break down by
+        filters (dict, optional): Column -> value or list of values to keep
+        measures (list): Numeric columns to aggregate
+        **options: stats, sort_by, descending and limit as for AggregateCube.query
+
+    Returns:
+        dict: Same shape as AggregateCube.query
+    """
+    filters = _normalize_filters(filters)
+    missing = [col for col in list(group_by) + list(filters) + list(measures or []) if col not in data.columns]
+    if missing:
+        raise ValueError(f"Columns not found: {', '.join(map(str, missing))}")
+    if measures is None:
+        measures = data.select_dtypes(include=['number']).columns.tolist()[:MAX_MEASURES]
+    non_numeric = [col for col in measures if not pd.api.types.is_numeric_dtype(data[col])]
+    if non_numeric:
+        raise ValueError(f"Not a measure: {', '.join(map(str, non_numeric))}")
+
+    dimensions = tuple(group_by) + tuple(dim for dim in filters if dim not in group_by)
+    if dimensions:
+        table = CubeTable.from_frame(data, dimensions, measures)
+    else:
+        table = CubeTable.from_frame(data.assign(_all=0), ('_all',), measures).rollup(())
+    if filters:
+        table = table.filter(filters)
+    return _query_result(table.rollup(list(group_by)), list(group_by), list(measures), **options)
+
+
+def _query_result(table, group_by, measures, stats=STATS, sort_by=None, descending=True,
+                  limit=DEFAULT_QUERY_LIMIT):
+    if sort_by is None or sort_by == 'rows':
+        order_values = table.rows.to_numpy(dtype='float64')
+    elif sort_by in measures:
+        order_values = _stat_values(table, sort_by, stats[0] if stats else 'sum')
+    else:
+        raise ValueError(f"Cannot sort by {sort_by}")
+    order_values = np.where(np.isnan(order_values), -np.inf if descending else np.inf, order_values)
+    order = np.argsort(-order_values if descending else order_values, kind='stable')
+    total = len(order)
+    order = order[:max(int(limit), 0)]
+
+    columns = {(measure, stat): _stat_values(table, measure, stat) for measure in measures for stat in stats}
+    keys = table.rows.index
+    groups = []
+    for position in order:
+        key = keys[position] if group_by else ()
+        if not isinstance(key, tuple):
+            key = (key,)
+        group = {dim: _json_value(value) for dim, value in zip(group_by, key)}
+        group['rows'] = int(table.rows.iloc[position])
+        group['measures'] = {measure: {stat: _json_value(columns[(measure, stat)][position], integer=stat == 'count')
+                                       for stat in stats}
+                             for measure in measures}
+        groups.append(group)
+    return {
+        'group_by': group_by,
+        'measures': measures,
+        'stats': list(stats),
+        'groups': groups,
+        'total_groups': total,
+        'truncated': total > len(groups)
+    }
+
+
+def _stat_values(table, measure, stat):
+    if stat == 'mean':
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (table.sums[measure].to_numpy(dtype='float64', na_value=np.nan)
+                    / table.counts[measure].to_numpy(dtype='float64'))
+    source = {'sum': table.sums, 'count': table.counts, 'min': table.mins, 'max': table.maxs}[stat]
+    return source[measure].to_numpy(dtype='float64', na_value=np.nan)
+
+
+def _normalize_filters(filters):
+    """Turn {dim: value or [values]} into {dim: [values]}"""
+    return {dim: list(values) if isinstance(values, (list, tuple, set)) else [values]
+            for dim, values in (filters or {}).items()}
+
+
+def _normalize_name(text):
+    return ' '.join(str(text).lower().replace('_', ' ').replace('-', ' ').split())
+
+
+def _mentions(text, column):
+    name = _normalize_name(column)
+    return bool(name) and re.search(rf"(?<!\w){re.escape(name)}(?!\w)", text) is not None
+
+
+def _format_number(value):
+    if value is None:
+        return 'n/a'
+    return str(int(value)) if float(value).is_integer() else str(round(value, 4))
+
+
+def _json_value(value, integer=False):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        if np.isnan(value):
+            return None
+        return int(value) if integer else round(value, 6)
+    if value is None or isinstance(value, (str, int, bool)):
+        return value
+    if pd.isna(value):
+        return None
+    return str(value)
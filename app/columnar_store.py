@@ -0,0 +1,183 @@
+"""
+Columnar store: converts parsed uploads into per-column .npy files that are opened memory-mapped
+"""
+import os
+import json
+import uuid
+import shutil
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_FILE = 'schema.json'
+FORMAT_VERSION = 1
+
+COLUMNAR_SUFFIX = '.columnar'
+
+
+def columnar_path(file_path):
+    """Return the directory holding the columnar copy of a data file"""
+    return f"{file_path}{COLUMNAR_SUFFIX}"
+
+
+def write_columnar(data, target_dir, source_fingerprint=None, metadata=None):
+    """
+    Write a DataFrame as one .npy file per column plus a JSON schema sidecar
+
+    Numeric, boolean and datetime columns are stored as raw arrays. String and
+    categorical columns are dictionary encoded: integer codes go to the .npy file
+    and the distinct values go to the schema.
+
+    Args:
+        data (DataFrame): Data to store
+        target_dir (str): Directory to create (replaced if it already exists)
+        source_fingerprint (tuple, optional): Fingerprint of the source file, used
+            to detect stale conversions
+        metadata (dict, optional): JSON-serializable facts about the conversion
+            (e.g. the dtype memory report), returned by read_metadata
+    """
+    tmp_dir = f"{target_dir}.tmp-{uuid.uuid4().hex}"
+    os.makedirs(tmp_dir)
+    try:
+        columns = []
+        for i, name in enumerate(data.columns):
+            spec = {'name': name if isinstance(name, (str, int)) else str(name), 'file': f"{i}.npy"}
+            values = _encode_column(data[name], spec)
+            np.save(os.path.join(tmp_dir, spec['file']), values, allow_pickle=False)
+            columns.append(spec)
+
+        schema = {
+            'version': FORMAT_VERSION,
+            'rows': int(len(data)),
+            'columns': columns,
+            'source': None if source_fingerprint is None else {
+                'mtime_ns': source_fingerprint[1],
+                'size': source_fingerprint[2]
+            },
+            'metadata': metadata or {}
+        }
+        with open(os.path.join(tmp_dir, SCHEMA_FILE), 'w', encoding='utf-8') as f:
+            json.dump(schema, f)
+
+        if os.path.exists(target_dir):
+            shutil.rmtree(target_dir)
+        os.replace(tmp_dir, target_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def read_schema(target_dir):
+    """Return the schema of a columnar directory, or None if it is missing or unreadable"""
+    try:
+        with open(os.path.join(target_dir, SCHEMA_FILE), 'r', encoding='utf-8') as f:
+            schema = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return schema if schema.get('version') == FORMAT_VERSION else None
+
+
+def read_metadata(target_dir):
+    """Return the metadata stored with a columnar directory ({} if there is none)"""
+    schema = read_schema(target_dir)
+    return {} if schema is None else schema.get('metadata', {})
+
+
+def is_current(target_dir, source_fingerprint):
+    """Check whether a columnar directory was converted from this version of the source file"""
+    schema = read_schema(target_dir)
+    if schema is None or schema.get('source') is None:
+        return False
+    return (schema['source']['mtime_ns'], schema['source']['size']) == tuple(source_fingerprint[1:3])
+
+
+def read_columnar(target_dir, columns=None):
+    """
+    Open a columnar directory as a DataFrame without copying numeric data
+
+    Numeric and datetime columns are backed by read-only memory maps, so pages are
+    shared through the OS cache and only touched columns are read from disk.
+
+    Args:
+        target_dir (str): Directory written by write_columnar
+        columns (list, optional): Subset of columns to load
+
+    Returns:
+        DataFrame: Loaded data
+    """
+    schema = read_schema(target_dir)
+    if schema is None:
+        raise ValueError(f"No readable columnar data in {target_dir}")
+
+    specs = schema['columns']
+    if columns is not None:
+        by_name = {spec['name']: spec for spec in specs}
+        missing = [col for col in columns if col not in by_name]
+        if missing:
+            raise ValueError(f"Columns not found: {', '.join(map(str, missing))}")
+        specs = [by_name[col] for col in columns]
+
+    arrays = {}
+    for spec in specs:
+        stored = np.load(os.path.join(target_dir, spec['file']), mmap_mode='r', allow_pickle=False)
+        arrays[spec['name']] = _decode_column(stored, spec)
+
+    # copy=False keeps each column in its own block instead of consolidating into a copy
+    return pd.DataFrame(arrays, index=pd.RangeIndex(schema['rows']), copy=False)
+
+
+def _encode_column(series, spec):
+    """Convert a column into a plain numpy array and record how to decode it in spec"""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        spec['kind'] = 'category'
+        spec['values'] = _json_values(dtype.categories)
+        spec['ordered'] = bool(dtype.ordered)
+        return np.asarray(series.cat.codes)
+    if pd.api.types.is_datetime64_dtype(dtype):
+        spec['kind'] = 'datetime'
+        spec['dtype'] = str(dtype)
+        return series.to_numpy().view('int64')
+    if isinstance(dtype, np.dtype) and (pd.api.types.is_numeric_dtype(dtype) or dtype == bool):
+        spec['kind'] = 'numeric'
+        return series.to_numpy()
+    if pd.api.types.is_numeric_dtype(dtype):
+        # Nullable extension types (Int64, Float64, boolean) become float64 with NaN
+        spec['kind'] = 'numeric'
+        return series.to_numpy(dtype='float64', na_value=np.nan)
+
+    spec['kind'] = 'object'
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    spec['values'] = _json_values(uniques)
+    return codes.astype(np.int32 if len(uniques) < 2 ** 31 else np.int64)
+
+
+def _decode_column(stored, spec):
+    """Rebuild a column from its stored array and schema entry"""
+    kind = spec['kind']
+    if kind == 'numeric':
+        return stored
+    if kind == 'datetime':
+        return stored.view(spec['dtype'])
+    if kind == 'category':
+        return pd.Categorical.from_codes(stored, categories=spec['values'], ordered=spec['ordered'])
+
+    # Missing values use code -1, which picks the trailing NaN
+    values = np.empty(len(spec['values']) + 1, dtype=object)
+    values[:-1] = spec['values']
+    values[-1] = np.nan
+    return values.take(stored)
+
+
+def _json_values(values):
+    """Convert distinct values to JSON-serializable Python objects"""
+    result = []
+    for value in values:
+        if isinstance(value, np.generic):
+            value = value.item()
+        if value is not None and not isinstance(value, (str, int, float, bool)):
+            value = str(value)
+        result.append(value)
+    return result
@@ -0,0 +1,136 @@
+"""
+CSV dialect detection: pick encoding, delimiter, quoting and header from a file prefix
+"""
+import csv
+import codecs
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Number of bytes read from the start of the file to detect the dialect
+SNIFF_BYTES = 256 * 1024
+
+# Number of lines handed to csv.Sniffer (it is regex based and slows down on long samples)
+SNIFF_LINES = 200
+
+CANDIDATE_DELIMITERS = [',', ';', '\t', '|']
+
+
+def sniff_csv_dialect(file_path, sample_bytes=SNIFF_BYTES):
+    """
+    Detect the CSV dialect of a file by reading only its first few hundred KB
+
+    Args:
+        file_path (str): Path to the CSV file
+        sample_bytes (int): Number of bytes to inspect
+
+    Returns:
+        dict: Keyword arguments for pd.read_csv (encoding, sep, quotechar, header, ...)
+    """
+    with open(file_path, 'rb') as f:
+        prefix = f.read(sample_bytes)
+    return sniff_csv_prefix(prefix, complete=len(prefix) < sample_bytes)
+
+
+def sniff_csv_prefix(prefix, complete=False):
+    """
+    Detect the CSV dialect from the leading bytes of a file
+
+    Args:
+        prefix (bytes): Leading bytes of the file
+        complete (bool): Whether prefix holds the whole file
+
+    Returns:
+        dict: Keyword arguments for pd.read_csv
+    """
+    if not complete:
+        # Drop the partial last line so it cannot confuse decoding or sniffing
+        last_newline = prefix.rfind(b'\n')
+        if last_newline > 0:
+            prefix = prefix[:last_newline + 1]
+
+    encoding, text = _detect_encoding(prefix)
+    lines = text.splitlines()
+    sample_lines = [line for line in lines[:SNIFF_LINES] if line.strip()]
+    sample = '\n'.join(sample_lines)
+
+    dialect = {'encoding': encoding, 'sep': ',', 'quotechar': '"', 'doublequote': True, 'header': 0}
+    if not sample_lines:
+        return dialect
+
+    sniffer = csv.Sniffer()
+    try:
+        sniffed = sniffer.sniff(sample, delimiters=''.join(CANDIDATE_DELIMITERS))
+        dialect['sep'] = sniffed.delimiter
+        dialect['quotechar'] = sniffed.quotechar or '"'
+        # Sniffer reports doublequote=False whenever the sample has no escaped quotes,
+        # so keep the RFC 4180 default rather than trusting it
+        if sniffed.skipinitialspace:
+            dialect['skipinitialspace'] = True
+    except csv.Error:
+        dialect['sep'] = _guess_delimiter(sample_lines)
+
+    if _is_headerless(sniffer, sample, sample_lines[0], dialect):
+        n_columns = len(next(csv.reader([sample_lines[0]], delimiter=dialect['sep'],
+                                        quotechar=dialect['quotechar'])))
+        dialect['header'] = None
+        dialect['names'] = [f"Column_{i + 1}" for i in range(n_columns)]
+
+    logger.info(f"Detected CSV dialect: encoding={encoding}, delimiter={dialect['sep']!r}, "
+                f"header={'yes' if dialect['header'] == 0 else 'no'}")
+    return dialect
+
+
+def _detect_encoding(prefix):
+    """Return (encoding, decoded text) for the prefix"""
+    if prefix.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig', prefix[len(codecs.BOM_UTF8):].decode('utf-8', errors='replace')
+    if prefix.startswith(codecs.BOM_UTF16_LE) or prefix.startswith(codecs.BOM_UTF16_BE):
+        return 'utf-16', prefix.decode('utf-16', errors='replace')
+
+    for encoding in ['utf-8', 'cp1252']:
+        try:
+            return encoding, prefix.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    # latin1 maps every byte, so it always succeeds
+    return 'latin1', prefix.decode('latin1')
+
+
+def _guess_delimiter(lines):
+    """Pick the candidate delimiter that appears most consistently across lines"""
+    best_delimiter, best_score = ',', 0
+    for delimiter in CANDIDATE_DELIMITERS:
+        counts = [line.count(delimiter) for line in lines]
+        score = min(counts)
+        if score > best_score:
+            best_delimiter, best_score = delimiter, score
+    return best_delimiter
+
+
+def _is_headerless(sniffer, sample, first_line, dialect):
+    """
+    Decide whether the file lacks a header row.
+
+    csv.Sniffer.has_header is only a heuristic, so a header is assumed unless the
+    sniffer agrees that there is none and every field of the first row is numeric.
+    Headers often mix names and numbers (e.g. region,2021,2022), so a single
+    numeric field says nothing.
+    """
+    try:
+        if sniffer.has_header(sample):
+            return False
+    except csv.Error:
+        return False
+
+    first_row = next(csv.reader([first_line], delimiter=dialect['sep'], quotechar=dialect['quotechar']))
+    values = [value.strip() for value in first_row if value.strip()]
+    return bool(values) and all(_is_number(value) for value in values)
+
+
+def _is_number(value):
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
@@ -0,0 +1,224 @@
+"""
+DatasetCache: In-memory LRU cache of parsed datasets shared by the upload and analyze paths
+"""
+import os
+import sys
+import mmap
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Default memory budget for cached datasets (overridable with INSIGHTA_DATASET_CACHE_MB)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def file_fingerprint(file_path):
+    """
+    Identify the current version of a file on disk
+
+    Args:
+        file_path (str): Path to the data file
+
+    Returns:
+        tuple: (absolute path, mtime in nanoseconds, size in bytes)
+    """
+    stat = os.stat(file_path)
+    return (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+
+
+def file_content_hash(file_path, block_size=1024 * 1024):
+    """
+    Hash the contents of a file, or of every file in a directory (e.g. a columnar dataset)
+
+    Args:
+        file_path (str): Path to the data file or directory
+        block_size (int): Bytes read per step
+
+    Returns:
+        str: SHA-256 hex digest of the contents
+    """
+    digest = hashlib.sha256()
+    if os.path.isdir(file_path):
+        for name in sorted(os.listdir(file_path)):
+            path = os.path.join(file_path, name)
+            if os.path.isfile(path):
+                digest.update(name.encode('utf-8') + b'\0')
+                _hash_file(digest, path, block_size)
+    else:
+        _hash_file(digest, file_path, block_size)
+    return digest.hexdigest()
+
+
+def _hash_file(digest, file_path, block_size):
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+
+
+def estimate_nbytes(value, default=0):
+    """
+    Estimate the process-private resident size of a cached value in bytes
+
+    Memory-mapped columns are not counted: their pages belong to the OS cache and
+    are shared with every other process mapping the same file.
+    """
+    if isinstance(value, pd.DataFrame):
+        usage = value.memory_usage(index=True, deep=True)
+        shared = sum(int(usage.iloc[i + 1]) for i in range(value.shape[1])
+                     if _is_memory_mapped(value.iloc[:, i].array))
+        return int(usage.sum()) - shared
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    return max(int(default), sys.getsizeof(value))
+
+
+def _is_memory_mapped(array):
+    array = getattr(array, 'codes', getattr(array, '_ndarray', array))
+    while array is not None:
+        if isinstance(array, (np.memmap, mmap.mmap)):
+            return True
+        array = getattr(array, 'base', None)
+    return False
+
+
+class DatasetCache:
+    """
+    Thread-safe LRU cache keyed by file fingerprint and bounded by a memory budget.
+
+    Cached values are shared between requests and must be treated as read-only.
+    """
+    def __init__(self, max_bytes=None, on_remove=None):
+        """
+        Args:
+            max_bytes (int, optional): Memory budget in bytes. Defaults to the
+                INSIGHTA_DATASET_CACHE_MB environment variable or 512 MB.
+            on_remove (callable, optional): Called as on_remove(key, value) whenever
+                an entry leaves the cache (eviction, replacement, invalidation)
+        """
+        if max_bytes is None:
+            max_mb = os.environ.get('INSIGHTA_DATASET_CACHE_MB')
+            max_bytes = int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_MAX_BYTES
+        self.max_bytes = int(max_bytes)
+        self.on_remove = on_remove
+        self._entries = OrderedDict()  # key -> (value, nbytes)
+        self._current_bytes = 0
+        self._lock = threading.RLock()
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None if it is not cached"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, key):
+        """Return the cached value for key without touching counters or LRU order"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry[0]
+
+    def put(self, key, value, size_hint=0):
+        """
+        Store a value, evicting least recently used entries to stay within budget
+
+        Args:
+            key (tuple): Cache key starting with the file fingerprint
+            value: Value to cache
+            size_hint (int, optional): Fallback size for values whose footprint
+                cannot be measured directly (e.g. parsed JSON)
+        """
+        nbytes = estimate_nbytes(value, default=size_hint)
+        if nbytes > self.max_bytes:
+            logger.info(f"Not caching {key[0]}: {nbytes} bytes exceeds cache budget of {self.max_bytes} bytes")
+            if self.on_remove is not None:
+                self.on_remove(key, value)
+            return
+
+        with self._lock:
+            # Older versions of the same file can never be hit again
+            for stale_key in [k for k in self._entries if k[0] == key[0] and k[:3] != key[:3]]:
+                self._remove(stale_key)
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, nbytes)
+            self._current_bytes += nbytes
+            while self._current_bytes > self.max_bytes:
+                evicted_key = next(iter(self._entries))
+                self._remove(evicted_key)
+                self.evictions += 1
+                logger.info(f"Evicted {evicted_key[0]} from dataset cache")
+
+    def get_or_load(self, key, loader, size_hint=0):
+        """
+        Return the cached value for key, calling loader() once to fill it on a miss.
+
+        Concurrent callers for the same key wait for the first loader instead of
+        parsing the file again.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        try:
+            with load_lock:
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry is not None:
+                        self._entries.move_to_end(key)
+                        return entry[0]
+                value = loader()
+                self.put(key, value, size_hint=size_hint)
+                return value
+        finally:
+            with self._lock:
+                self._load_locks.pop(key, None)
+
+    def invalidate(self, file_path):
+        """Drop every cached version of a file"""
+        abs_path = os.path.abspath(file_path)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == abs_path]:
+                self._remove(key)
+
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current memory usage"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'current_bytes': self._current_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+    def _remove(self, key):
+        value, nbytes = self._entries.pop(key)
+        self._current_bytes -= nbytes
+        if self.on_remove is not None:
+            try:
+                self.on_remove(key, value)
+            except Exception as e:
+                logger.warning(f"Cache removal callback failed for {key[0]}: {str(e)}")
@@ -0,0 +1,439 @@
+"""
+DatasetProfile: statistics of a tabular dataset computed once and shared by previews, prompts and charts
+"""
+import warnings
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+STAT_NAMES = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+
+# Number of preview rows kept in the profile
+SAMPLE_ROWS = 5
+
+# Number of stratified rows kept as candidates for prompt samples
+SAMPLE_POOL_ROWS = 20
+
+# Number of most frequent values kept per categorical column
+TOP_K_CATEGORIES = 10
+
+# Number of numeric columns that get a histogram
+HISTOGRAM_COLUMNS = 3
+HISTOGRAM_BINS = 10
+
+# Correlations are computed over at most this many numeric columns
+CORRELATION_MAX_COLUMNS = 500
+
+# The heatmap shows at most this many columns; wider matrices are truncated to the
+# columns of the strongest pairs
+HEATMAP_COLUMNS = 12
+TOP_CORRELATION_PAIRS = 20
+
+
+class DatasetProfile:
+    """
+    Summary statistics of a tabular dataset.
+
+    Built once per dataset version, either from an in-memory DataFrame
+    (from_dataframe) or from a chunked pass over a large CSV (see
+    StreamingProfiler.to_profile), and then read by get_data_summary,
+    prompt construction and generate_visualization_data.
+    """
+    def __init__(self, rows, column_names, dtypes, sample, stats, null_counts=None,
+                 histograms=None, correlation=None, top_categories=None, approximate=False,
+                 fallback_describe=None, sample_pool=None, date_ranges=None, approximate_histograms=False):
+        """
+        Args:
+            rows (int): Number of rows
+            column_names (list): Column names in file order
+            dtypes (dict): Column name -> dtype string
+            sample (DataFrame): Preview rows
+            stats (DataFrame): describe()-style table (STAT_NAMES x numeric columns)
+            null_counts (dict, optional): Column name -> number of missing values
+            histograms (dict, optional): Column name -> (counts, bin edges)
+            correlation (DataFrame, optional): Correlation matrix of numeric columns
+            top_categories (dict, optional): Column name -> {'values': [(value, count)],
+                'unique': distinct count} for categorical columns; 'approximate_unique'
+                is set when the distinct count is an estimate
+            approximate (bool): Whether quantiles and sample are estimates
+            fallback_describe (DataFrame, optional): describe() output used in prompts
+                when there are no numeric columns
+            sample_pool (DataFrame, optional): Rows spread across the data, ordered so
+                that any prefix is itself spread out; used for prompt samples
+            date_ranges (dict, optional): Column name -> (first, last) Timestamp for
+                datetime columns
+            approximate_histograms (bool): Whether histogram counts are estimates
+        """
+        self.rows = rows
+        self.column_names = column_names
+        self.dtypes = dtypes
+        self.sample = sample
+        self.stats = stats
+        self.null_counts = null_counts or {}
+        self.histograms = histograms or {}
+        self.correlation = correlation
+        self.top_categories = top_categories or {}
+        self.approximate = approximate
+        self.approximate_histograms = approximate_histograms
+        self.fallback_describe = fallback_describe
+        self.sample_pool = sample if sample_pool is None else sample_pool
+        self.date_ranges = date_ranges or {}
+
+    @classmethod
+    def from_dataframe(cls, data):
+        """
+        Profile an in-memory DataFrame with vectorized NumPy reductions
+
+        Args:
+            data (DataFrame): Data to profile
+
+        Returns:
+            DatasetProfile: Profile of the data
+        """
+        numeric_cols = data.select_dtypes(include=['number']).columns.tolist()
+        categorical_cols = data.select_dtypes(include=['object', 'category']).columns.tolist()
+
+        # One float64 matrix feeds every numeric statistic
+        values = data[numeric_cols].to_numpy(dtype='float64', na_value=np.nan)
+        stats = pd.DataFrame(index=STAT_NAMES, columns=numeric_cols, dtype='float64')
+        histograms = {}
+        stats.loc['count'] = 0
+        if numeric_cols and len(values):
+            with warnings.catch_warnings():
+                # All-NaN columns legitimately produce NaN statistics
+                warnings.simplefilter('ignore', category=RuntimeWarning)
+                stats.loc['count'] = (~np.isnan(values)).sum(axis=0)
+                stats.loc['mean'] = np.nanmean(values, axis=0)
+                stats.loc['std'] = np.nanstd(values, axis=0, ddof=1)
+                stats.loc['min'] = np.nanmin(values, axis=0)
+                stats.loc[['25%', '50%', '75%']] = np.nanquantile(values, [0.25, 0.5, 0.75], axis=0)
+                stats.loc['max'] = np.nanmax(values, axis=0)
+
+            for i, col in enumerate(numeric_cols[:HISTOGRAM_COLUMNS]):
+                column_values = values[:, i]
+                histograms[col] = np.histogram(column_values[~np.isnan(column_values)], bins=HISTOGRAM_BINS)
+
+        correlation = _correlation(values, numeric_cols, stats) if len(numeric_cols) >= 2 else None
+
+        top_categories = {}
+        for col in categorical_cols:
+            try:
+                codes, uniques = pd.factorize(data[col], sort=False)
+            except TypeError:
+                # Unhashable values (e.g. lists from nested JSON) cannot be counted
+                continue
+            counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+            top = _top_indices(counts, TOP_K_CATEGORIES)
+            top_categories[col] = {
+                'values': list(zip(uniques.take(top).tolist(), counts[top].tolist())),
+                'unique': int(len(uniques))
+            }
+
+        date_ranges = {}
+        for col in data.select_dtypes(include=['datetime', 'datetimetz']).columns:
+            if data[col].notna().any():
+                date_ranges[col] = (data[col].min(), data[col].max())
+
+        return cls(
+            rows=int(data.shape[0]),
+            column_names=data.columns.tolist(),
+            dtypes={col: str(dtype) for col, dtype in data.dtypes.items()},
+            # Copy so the profile does not keep the full frame alive
+            sample=data.head(SAMPLE_ROWS).copy(),
+            stats=stats,
+            null_counts={col: int(n) for col, n in data.isna().sum().items()},
+            histograms=histograms,
+            correlation=correlation,
+            top_categories=top_categories,
+            fallback_describe=None if numeric_cols or data.empty else data.describe(),
+            sample_pool=_stratified_sample(data, stats, top_categories),
+            date_ranges=date_ranges
+        )
+
+    @property
+    def numeric_columns(self):
+        return self.stats.columns.tolist()
+
+    @property
+    def categorical_columns(self):
+        return [col for col in self.column_names if col in self.top_categories]
+
+    @property
+    def nbytes(self):
+        """Rough resident size, used to budget the profile cache"""
+        size = int(self.sample.memory_usage(deep=True).sum()) + self.stats.size * 8
+        size += int(self.sample_pool.memory_usage(deep=True).sum())
+        if self.correlation is not None:
+            size += self.correlation.size * 8
+        return size + 256 * len(self.column_names) + 1024 * len(self.top_categories)
+
+    def to_summary(self):
+        """
+        Build the upload preview returned by InsightsEngine.get_data_summary
+
+        Returns:
+            dict: Summary of the data
+        """
+        summary = {
+            'type': 'dataframe',
+            'rows': self.rows,
+            'columns': len(self.column_names),
+            'column_names': list(self.column_names),
+            'sample': _json_records(self.sample),
+            'data_types': dict(self.dtypes)
+        }
+        if self.approximate:
+            summary['approximate'] = True
+
+        numeric_cols = self.numeric_columns
+        if numeric_cols:
+            summary['statistics'] = {}
+            for col in numeric_cols[:5]:  # Limit to first 5 numerical columns
+                summary['statistics'][col] = {
+                    'min': _float_or_none(self.stats.at['min', col]),
+                    'max': _float_or_none(self.stats.at['max', col]),
+                    'mean': _float_or_none(self.stats.at['mean', col]),
+                    'median': _float_or_none(self.stats.at['50%', col])
+                }
+        return summary
+
+    def to_prompt_summary(self):
+        """
+        Describe the data as text for the LLM prompt
+
+        Returns:
+            str: Shape, columns, sample rows and summary statistics
+        """
+        data_summary = f"DataFrame with {self.rows} rows and {len(self.column_names)} columns.\n"
+        data_summary += f"Columns: {', '.join(map(str, self.column_names))}\n"
+        if self.approximate:
+            data_summary += f"Random sample of rows:\n{self.sample.to_string()}\n"
+            data_summary += f"Summary statistics (quantiles approximate):\n{self.describe_table().to_string()}"
+        else:
+            data_summary += f"Sample data:\n{self.sample.to_string()}\n"
+            data_summary += f"Summary statistics:\n{self.describe_table().to_string()}"
+        return data_summary
+
+    def describe_table(self):
+        """Return a DataFrame laid out like DataFrame.describe()"""
+        if self.stats.empty and self.fallback_describe is not None:
+            return self.fallback_describe
+        return self.stats
+
+    def visualizations(self, exclude=()):
+        """
+        Build chart payloads from the profile
+
+        Args:
+            exclude (tuple): Columns not to chart as categories (e.g. an unparsed date column)
+
+        Returns:
+            list: Visualization data objects (heatmap, histograms, pies)
+        """
+        visualizations = []
+
+        # 1. Correlation data for numeric columns
+        if self.correlation is not None:
+            visualizations.append(_correlation_heatmap(self.correlation))
+
+        # 2. Distribution data for the first few numeric columns
+        for col, (hist_data, bin_edges) in self.histograms.items():
+            viz_data = [{'bin': f"{bin_edges[i]:.2f}-{bin_edges[i+1]:.2f}", 'count': int(hist_data[i])}
+                        for i in range(len(hist_data))]
+            histogram = {
+                'type': 'histogram',
+                'title': f'Distribution of {col}',
+                'data': viz_data,
+                'x_field': 'bin',
+                'y_field': 'count'
+            }
+            if self.approximate_histograms:
+                histogram['title'] += ' (approximate)'
+                histogram['approximate'] = True
+            visualizations.append(histogram)
+
+        # 3. Top categories of the first categorical columns as pie charts
+        for col in [col for col in self.categorical_columns if col not in exclude][:2]:
+            visualizations.append({
+                'type': 'pie',
+                'title': f'Distribution of {col}',
+                'data': [{'category': value, 'count': int(count)}
+                         for value, count in self.top_categories[col]['values']],
+                'category_field': 'category',
+                'value_field': 'count'
+            })
+
+        return visualizations
+
+
+def _correlation(values, columns, stats):
+    """
+    Pearson correlation of the numeric columns with one float32 matrix product
+
+    Missing values are replaced by the column mean after standardising, so they
+    add nothing to the sums, and each pair is normalised by its number of jointly
+    present rows. This matches DataFrame.corr() exactly when nothing is missing.
+    Only the first CORRELATION_MAX_COLUMNS non-constant columns are correlated.
+
+    Args:
+        values (ndarray): float64 matrix of the numeric columns (NaN = missing)
+        columns (list): Column names of values
+        stats (DataFrame): describe()-style statistics of the columns
+
+    Returns:
+        DataFrame: Correlation matrix, or None if fewer than two columns vary
+    """
+    std = stats.loc['std'].to_numpy(dtype='float64')
+    keep = np.flatnonzero(np.isfinite(std) & (std > 0))[:CORRELATION_MAX_COLUMNS]
+    if len(keep) < 2:
+        return None
+
+    mean = stats.loc['mean'].to_numpy(dtype='float64')[keep]
+    with np.errstate(invalid='ignore'):
+        z = ((values[:, keep] - mean) / std[keep]).astype('float32')
+    present = ~np.isnan(z)
+    np.nan_to_num(z, copy=False, nan=0.0)
+
+    products = z.T @ z
+    if present.all():
+        pairs = np.float32(len(z) - 1)
+    else:
+        mask = present.astype('float32')
+        pairs = mask.T @ mask - 1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = np.clip(products / pairs, -1, 1)
+    np.fill_diagonal(corr, 1)
+
+    names = [columns[i] for i in keep]
+    return pd.DataFrame(corr, index=names, columns=names)
+
+
+def _correlation_heatmap(correlation):
+    """
+    Build a compact heatmap payload from a correlation matrix of any width
+
+    Returns the strongest pairs and a matrix truncated to HEATMAP_COLUMNS columns
+    (those taking part in the strongest pairs), ordered so that correlated columns
+    sit next to each other.
+    """
+    names = correlation.columns.tolist()
+    matrix = correlation.to_numpy(dtype='float32')
+    upper_rows, upper_cols = np.triu_indices(len(names), 1)
+    strength = np.nan_to_num(np.abs(matrix[upper_rows, upper_cols]), nan=-1.0)
+    top = _top_indices(strength, TOP_CORRELATION_PAIRS)
+    top = top[strength[top] >= 0]
+
+    if len(names) <= HEATMAP_COLUMNS:
+        shown = list(range(len(names)))
+    else:
+        shown = []
+        for pair in top:
+            for i in (upper_rows[pair], upper_cols[pair]):
+                if i not in shown and len(shown) < HEATMAP_COLUMNS:
+                    shown.append(int(i))
+        shown += [i for i in range(len(names)) if i not in shown][:HEATMAP_COLUMNS - len(shown)]
+        # Order by loading on the leading eigenvector so correlated columns cluster
+        _, vectors = np.linalg.eigh(np.nan_to_num(matrix[np.ix_(shown, shown)]).astype('float64'))
+        shown = [shown[i] for i in np.argsort(vectors[:, -1], kind='stable')]
+
+    title = 'Correlation Matrix'
+    if len(shown) < len(names):
+        title += f' (strongest {len(shown)} of {len(names)} columns)'
+    return {
+        'type': 'heatmap',
+        'title': title,
+        'columns': [names[i] for i in shown],
+        'matrix': _rounded_rows(matrix[np.ix_(shown, shown)]),
+        'top_pairs': {
+            'x': [names[upper_rows[pair]] for pair in top],
+            'y': [names[upper_cols[pair]] for pair in top],
+            'value': _rounded_rows(matrix[upper_rows[top], upper_cols[top]][np.newaxis])[0]
+        }
+    }
+
+
+def _top_indices(values, n):
+    """Indices of the n largest values, largest first, without a full sort"""
+    if len(values) > n:
+        candidates = np.argpartition(-values, n - 1)[:n]
+    else:
+        candidates = np.arange(len(values))
+    return candidates[np.argsort(-values[candidates], kind='stable')]
+
+
+def _rounded_rows(matrix, decimals=4):
+    """Convert a 2-D array to JSON-safe nested lists (NaN -> None)"""
+    return [[None if np.isnan(v) else v for v in row]
+            for row in np.round(matrix.astype('float64'), decimals).tolist()]
+
+
+def _stratified_sample(data, stats, top_categories, n=SAMPLE_POOL_ROWS):
+    """
+    Pick up to n rows that cover the data rather than just its head
+
+    Rows are stratified by the first low-cardinality categorical column (one row
+    per category before any category repeats), otherwise spread across the value
+    range of the most variable numeric column, otherwise spread by position.
+    """
+    if data.empty:
+        return data.head(0).copy()
+
+    strata_col = next((col for col, info in top_categories.items() if 2 <= info['unique'] <= n), None)
+    if strata_col is not None:
+        rank_in_stratum = data.groupby(strata_col, sort=False, dropna=False, observed=True).cumcount()
+        chosen = rank_in_stratum[rank_in_stratum < max(1, n // top_categories[strata_col]['unique'])]
+        return data.loc[chosen.sort_values(kind='stable').index[:n]].copy()
+
+    fractions = _spread_fractions(n)
+    if not stats.empty:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variation = (stats.loc['std'] / stats.loc['mean'].abs()).replace([np.inf, -np.inf], np.nan)
+        if variation.notna().any():
+            values = data[variation.idxmax()].to_numpy(dtype='float64', na_value=np.nan)
+            order = np.argsort(values, kind='stable')[:int((~np.isnan(values)).sum())]
+            if len(order):
+                positions = pd.unique(order[np.rint(fractions * (len(order) - 1)).astype(int)])
+                return data.iloc[positions].copy()
+
+    positions = pd.unique(np.rint(fractions * (len(data) - 1)).astype(int))
+    return data.iloc[positions].copy()
+
+
+def _spread_fractions(n):
+    """Fractions in [0, 1] ordered so that every prefix is evenly spread (0.5, 0, 1, 0.25, 0.75, ...)"""
+    fractions = [0.5, 0.0, 1.0]
+    step = 0.25
+    while len(fractions) < n:
+        fractions.extend(np.arange(step, 1, 2 * step).tolist())
+        step /= 2
+    return np.asarray(fractions[:n])
+
+
+def _json_records(frame):
+    """
+    Convert rows to records that read like the source file
+
+    Parsed dates become ISO strings and float32 values are widened through their
+    shortest representation (899.99, not 899.989990234375).
+    """
+    dates = frame.select_dtypes(include=['datetime', 'datetimetz']).columns
+    narrow = frame.select_dtypes(include=['float32']).columns
+    if len(dates) or len(narrow):
+        frame = frame.copy()
+        for col in dates:
+            frame[col] = frame[col].map(_format_date)
+        for col in narrow:
+            frame[col] = frame[col].to_numpy().astype(str).astype('float64')
+    return frame.to_dict(orient='records')
+
+
+def _format_date(value):
+    if pd.isna(value):
+        return None
+    return value.date().isoformat() if value == value.normalize() else value.isoformat()
+
+
+def _float_or_none(value):
+    return None if pd.isna(value) else float(value)
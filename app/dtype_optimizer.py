@@ -0,0 +1,117 @@
+"""
+Dtype optimizer: shrink parsed DataFrames with downcast numerics, categoricals and parsed dates
+"""
+import warnings
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# String columns become categorical when at most this share of their values is distinct
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+# A string column is parsed as dates when this share of its sampled values are dates
+DATE_MIN_PARSED_RATIO = 0.95
+DATE_SAMPLE_SIZE = 200
+
+
+def optimize_dtypes(data):
+    """
+    Convert a DataFrame to the most compact dtypes that preserve its values
+
+    Integers are downcast to the smallest integer type that holds their range,
+    floats become float32 when every value survives the round trip exactly, string columns that look
+    like dates are parsed once into datetime64, and low-cardinality string
+    columns become categoricals.
+
+    Args:
+        data (DataFrame): Parsed data; it is not modified
+
+    Returns:
+        tuple: (optimized DataFrame, report dict with 'bytes_before', 'bytes_after'
+            and 'converted' mapping column -> "old -> new" dtype)
+    """
+    bytes_before = int(data.memory_usage(deep=True).sum())
+    columns = []
+    converted = {}
+    for i, col in enumerate(data.columns):
+        series = data.iloc[:, i]
+        optimized = _optimize_column(series)
+        if optimized.dtype != series.dtype:
+            converted[col] = f"{series.dtype} -> {optimized.dtype}"
+        columns.append(optimized)
+
+    result = pd.concat(columns, axis=1) if columns else data.copy()
+    result.columns = data.columns
+    report = {
+        'bytes_before': bytes_before,
+        'bytes_after': int(result.memory_usage(deep=True).sum()),
+        'converted': converted
+    }
+    logger.info(f"Compacted dtypes of {len(converted)} columns: "
+                f"{report['bytes_before'] / 1e6:.1f} MB -> {report['bytes_after'] / 1e6:.1f} MB")
+    return result, report
+
+
+def _optimize_column(series):
+    dtype = series.dtype
+    if pd.api.types.is_bool_dtype(dtype) or not isinstance(dtype, np.dtype):
+        return series
+    if pd.api.types.is_integer_dtype(dtype):
+        kind = 'unsigned' if len(series) and series.min() >= 0 else 'integer'
+        return pd.to_numeric(series, downcast=kind)
+    if pd.api.types.is_float_dtype(dtype):
+        return _downcast_float(series)
+    if dtype == object:
+        dates = parse_dates(series)
+        if dates is not None:
+            return dates
+        return _to_category(series)
+    return series
+
+
+def _downcast_float(series):
+    if series.dtype != np.float64:
+        return series
+    values = series.to_numpy()
+    narrowed = values.astype(np.float32)
+    with np.errstate(invalid='ignore', over='ignore'):
+        # Exact equality only: a relative tolerance still merges close timestamps and IDs
+        lossless = np.array_equal(narrowed.astype(np.float64), values, equal_nan=True)
+    return pd.Series(narrowed, index=series.index, name=series.name) if lossless else series
+
+
+def parse_dates(series):
+    """Return the column parsed as datetimes, or None if it does not hold dates"""
+    non_null = series.dropna()
+    if non_null.empty:
+        return None
+    sample = non_null.iloc[:DATE_SAMPLE_SIZE]
+    if not all(isinstance(value, str) for value in sample):
+        return None
+    # Plain numbers and words parse as dates too easily; require date separators
+    if not sample.str.contains(r'\d[-/:]\d|\d[-/]\w|\d\.\d{1,2}\.\d', regex=True).all():
+        return None
+
+    with warnings.catch_warnings():
+        # Format inference warns when it falls back to parsing each value separately
+        warnings.simplefilter('ignore', category=UserWarning)
+        if pd.to_datetime(sample, errors='coerce').notna().mean() < DATE_MIN_PARSED_RATIO:
+            return None
+        parsed = pd.to_datetime(series, errors='coerce')
+    if parsed.notna().sum() < DATE_MIN_PARSED_RATIO * len(non_null):
+        return None
+    return parsed
+
+
+def _to_category(series):
+    try:
+        unique = series.nunique(dropna=True)
+    except TypeError:
+        # Unhashable values (e.g. lists from nested JSON)
+        return series
+    non_null = series.notna().sum()
+    if non_null == 0 or unique > CATEGORY_MAX_UNIQUE_RATIO * non_null:
+        return series
+    return series.astype('category')
@@ -0,0 +1,87 @@
+"""
+Excel reader: list workbook sheets and read one sheet with the fastest available engine
+"""
+import os
+import logging
+import importlib.util
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xls')
+
+# Directory next to a workbook holding the columnar copies of its converted sheets
+SHEETS_SUFFIX = '.sheets'
+
+
+def excel_engine(file_path):
+    """
+    Pick the pd.read_excel engine for a workbook
+
+    python-calamine (Rust) parses several times faster than openpyxl and is used
+    whenever it is installed. Otherwise .xlsx files go through openpyxl, which
+    pandas opens in read-only mode so rows are streamed from the sheet XML
+    instead of building the full cell object model.
+
+    Returns:
+        str: Engine name, or None to let pandas decide (e.g. xlrd for .xls)
+    """
+    if importlib.util.find_spec('python_calamine') is not None:
+        return 'calamine'
+    if os.path.splitext(file_path)[1].lower() == '.xlsx':
+        return 'openpyxl'
+    return None
+
+
+def list_sheets(file_path):
+    """
+    List the sheets of a workbook without reading their cells
+
+    Args:
+        file_path (str): Path to the .xlsx or .xls file
+
+    Returns:
+        list: One dict per sheet with 'name', and 'rows'/'columns' as recorded in
+            the workbook (header row included; None when not recorded)
+    """
+    if os.path.splitext(file_path)[1].lower() == '.xlsx':
+        from openpyxl import load_workbook
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            sheets = []
+            for sheet in workbook.worksheets:
+                try:
+                    rows, columns = sheet.max_row, sheet.max_column
+                except (AttributeError, TypeError, ValueError):
+                    rows, columns = None, None
+                sheets.append({'name': sheet.title, 'rows': rows, 'columns': columns})
+            return sheets
+        finally:
+            workbook.close()
+
+    with pd.ExcelFile(file_path, engine=excel_engine(file_path)) as workbook:
+        return [{'name': name, 'rows': None, 'columns': None} for name in workbook.sheet_names]
+
+
+def read_sheet(file_path, sheet=0, columns=None):
+    """
+    Read one sheet of a workbook into a DataFrame
+
+    Args:
+        file_path (str): Path to the .xlsx or .xls file
+        sheet (str or int): Sheet name or position
+        columns (list, optional): Only read these columns
+
+    Returns:
+        DataFrame: Sheet contents, first row as header
+    """
+    engine = excel_engine(file_path)
+    data = pd.read_excel(file_path, sheet_name=sheet, usecols=columns, engine=engine)
+    logger.info(f"Read sheet {sheet!r} of {file_path} with {engine or 'the default engine'}: "
+                f"{len(data)} rows, {data.shape[1]} columns")
+    return data
+
+
+def sheet_dataset_path(file_path, sheet_index):
+    """Return the columnar directory a workbook sheet is converted to"""
+    return os.path.join(f"{file_path}{SHEETS_SUFFIX}", f"{sheet_index}.columnar")
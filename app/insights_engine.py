@@ -2,26 +2,100 @@
 InsightsEngine: Core module for generating business intelligence insights using LLMs (not tied to business only insights)
 """
 import os
+import time
 import pandas as pd
-import json
 import numpy as np
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import google.generativeai as genai
 from google.generativeai import GenerativeModel
+from app.dataset_cache import DatasetCache, file_fingerprint, file_content_hash
+from app.response_cache import ResponseCache
+from app.csv_sniffer import sniff_csv_dialect
+from app.columnar_store import (COLUMNAR_SUFFIX, columnar_path, write_columnar, read_columnar, read_metadata,
+                                is_current)
+from app.streaming_profiler import StreamingProfiler, DEFAULT_CHUNKSIZE
+from app.dataset_profile import DatasetProfile
+from app.singleflight import SingleFlight
+from app.prompt_builder import PromptBuilder, estimate_tokens, CHARS_PER_TOKEN
+from app.dtype_optimizer import optimize_dtypes
+from app.shared_store import SharedDatasetStore
+from app.json_reader import JSON_EXTENSIONS, read_json, json_preview
+from app.excel_reader import EXCEL_EXTENSIONS, list_sheets, read_sheet, sheet_dataset_path
+from app.metrics import stage, PROMPT_BYTES, RESPONSE_BYTES
+from app.aggregate_cube import AggregateCube, STATS, DEFAULT_QUERY_LIMIT, query_dataframe
+from app.time_series import TimeSeries, detect_date_column, MAX_MEASURES as TIME_SERIES_MEASURES
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+MODEL_NAME = "gemini-2.0-flash"
+
+# Concurrent LLM calls for batch analyses and how long a single call may take
+DEFAULT_LLM_CONCURRENCY = 4
+DEFAULT_LLM_TIMEOUT_SECONDS = 60
+
+# CSV files at least this large are profiled in chunks instead of being loaded whole
+DEFAULT_STREAMING_THRESHOLD_BYTES = 512 * 1024 * 1024
+
+# Memory budget of the per-file facts cache (dialects, content hashes, dtype reports)
+FILE_FACTS_MAX_BYTES = 4 * 1024 * 1024
+
+# Approximate footprint of a memory report, whose nested dict sys.getsizeof does not count
+MEMORY_REPORT_BYTES = 1024
+
+# Memoized in place of a TimeSeries for data without a date column
+_NO_TIME_SERIES = object()
+
 class InsightsEngine:
     """
     Main class that uses Gemini API to analyze data and generate business insights.
     """
-    def __init__(self):
-        """Initialize the insights engine and set up the Gemini API connection"""
+    def __init__(self, cache_max_bytes=None, streaming_threshold_bytes=None, compact_dtypes=None,
+                 profile_on_upload=None):
+        """
+        Initialize the insights engine and set up the Gemini API connection
+
+        Args:
+            cache_max_bytes (int, optional): Memory budget for parsed datasets.
+                Defaults to INSIGHTA_DATASET_CACHE_MB or 512 MB.
+            streaming_threshold_bytes (int, optional): CSV size from which summaries
+                are streamed in chunks. Defaults to INSIGHTA_STREAMING_THRESHOLD_MB or 512 MB.
+            compact_dtypes (bool, optional): Downcast numerics, parse dates and convert
+                low-cardinality strings to categoricals on load. Defaults to
+                INSIGHTA_COMPACT_DTYPES.
+            profile_on_upload (bool, optional): Profile large CSV uploads while they
+                arrive. Defaults to INSIGHTA_PROFILE_ON_UPLOAD (on).
+        """
+        self.model_name = MODEL_NAME
         self.setup_gemini_api()
         self.model = self.get_gemini_model()
+        self.dataset_cache = DatasetCache(max_bytes=cache_max_bytes, on_remove=self._release_shared)
+        self.shared_store = SharedDatasetStore()
+        self._shared_keys = {}  # dataset cache key -> shared store key it holds a reference to
+        self.profile_cache = DatasetCache(max_bytes=64 * 1024 * 1024)
+        if streaming_threshold_bytes is None:
+            threshold_mb = os.environ.get('INSIGHTA_STREAMING_THRESHOLD_MB')
+            streaming_threshold_bytes = (int(float(threshold_mb) * 1024 * 1024) if threshold_mb
+                                         else DEFAULT_STREAMING_THRESHOLD_BYTES)
+        self.streaming_threshold_bytes = streaming_threshold_bytes
+        if compact_dtypes is None:
+            compact_dtypes = os.environ.get('INSIGHTA_COMPACT_DTYPES', '').lower() in ('1', 'true', 'yes')
+        self.compact_dtypes = compact_dtypes
+        if profile_on_upload is None:
+            profile_on_upload = os.environ.get('INSIGHTA_PROFILE_ON_UPLOAD', '1').lower() in ('1', 'true', 'yes')
+        self.profile_on_upload = profile_on_upload
+        # Small per-file facts (CSV dialect, content hash, dtype report), keyed by
+        # fingerprint plus kind and bounded like the dataset cache
+        self.file_facts = DatasetCache(max_bytes=FILE_FACTS_MAX_BYTES)
+        self.response_cache = ResponseCache()
+        self.inflight = SingleFlight()
+        self.prompt_builder = PromptBuilder()
+        self.llm_concurrency = int(os.environ.get('INSIGHTA_LLM_CONCURRENCY', DEFAULT_LLM_CONCURRENCY))
+        self.llm_timeout = float(os.environ.get('INSIGHTA_LLM_TIMEOUT_SECONDS', DEFAULT_LLM_TIMEOUT_SECONDS))
+        self._llm_executor = ThreadPoolExecutor(max_workers=self.llm_concurrency, thread_name_prefix='insighta-llm')
         
     def setup_gemini_api(self):
         """Configure the Gemini API with the API key"""
@@ -37,14 +111,131 @@ class InsightsEngine:
         """Initialize and return the Gemini model"""
         if self.use_mock:
             return None
-        return GenerativeModel(model_name="gemini-2.0-flash")
+        return GenerativeModel(model_name=self.model_name)
+    
+    def load_data(self, file_path, columns=None):
+        """
+        Load data from file path, reusing the parsed result until the file changes
+        
+        Args:
+            file_path (str): Path to the data file
+            columns (list, optional): Only load these columns (tabular files only)
+            
+        Returns:
+            data: Loaded data (DataFrame or dict). Cached data is shared between
+                requests and must not be modified in place.
+        """
+        try:
+            key = file_fingerprint(file_path)
+        except OSError as e:
+            logger.error(f"Error loading file {file_path}: {str(e)}")
+            raise ValueError(f"Could not load the file: {str(e)}")
+        
+        if columns is None:
+            return self.dataset_cache.get_or_load(key, lambda: self._load_shared(file_path, key), size_hint=key[2])
+        
+        columns = list(columns)
+        full_data = self.dataset_cache.peek(key)
+        if isinstance(full_data, pd.DataFrame):
+            return full_data[columns]
+        subset_key = key + (tuple(columns),)
+        return self.dataset_cache.get_or_load(subset_key, lambda: self._load_shared(file_path, subset_key, columns))
     
-    def load_data(self, file_path):
+    def _load_shared(self, file_path, cache_key, columns=None):
         """
-        Load data from file path
+        Load a tabular file through the cross-process shared store when it is enabled
+        
+        The first worker process to load a file parses it and stores it by content
+        hash; every other process maps the stored copy instead of parsing again.
         
         Args:
             file_path (str): Path to the data file
+            cache_key (tuple): Dataset cache key the result will be cached under
+            columns (list, optional): Only load these columns
+            
+        Returns:
+            data: Loaded data (DataFrame or dict)
+        """
+        ext = os.path.splitext(file_path)[1].lower()
+        with stage('load'):
+            if (not self.shared_store.enabled or ext not in ('.csv',) + EXCEL_EXTENSIONS + JSON_EXTENSIONS
+                    or self.should_stream(file_path)):
+                return self._read_file(file_path, columns=columns)
+            
+            store_key = self._shared_store_key(file_path)
+            data, attached = self.shared_store.attach(store_key, lambda: self._read_file(file_path), columns=columns,
+                                                      metadata=lambda: self._columnar_metadata(file_path))
+        if attached:
+            self._shared_keys[cache_key] = store_key
+        return data
+    
+    def _shared_store_key(self, file_path):
+        """Shared store key of a file: its content hash plus the load mode"""
+        return self.get_content_hash(file_path) + ('-compact' if self.compact_dtypes else '')
+    
+    def _release_shared(self, cache_key, value):
+        """Dataset cache removal callback: give back the shared store reference"""
+        store_key = self._shared_keys.pop(cache_key, None)
+        if store_key is not None:
+            self.shared_store.release(store_key)
+    
+    def ingest(self, file_path):
+        """
+        Convert an uploaded file once into memory-mapped columnar form
+        
+        The copy goes to the shared store when it is enabled, otherwise next to the
+        file. Later loads open the columnar copy instead of parsing the original file
+        again. Non-tabular files (e.g. nested JSON) are left as they are.
+        
+        Args:
+            file_path (str): Path to the uploaded data file
+            
+        Returns:
+            bool: True if a columnar copy was written
+        """
+        if os.path.splitext(file_path)[1].lower() == COLUMNAR_SUFFIX:
+            # Already columnar, e.g. a converted Excel sheet
+            return True
+        if self.should_stream(file_path):
+            # Converting would require materializing the whole file in memory
+            return False
+        if self.shared_store.enabled:
+            # Loading through the shared store converts the file once for all workers
+            self.load_data(file_path)
+            return self.shared_store.contains(self._shared_store_key(file_path))
+        
+        key = file_fingerprint(file_path)
+        target_dir = columnar_path(file_path)
+        if is_current(target_dir, key):
+            return True
+        
+        data = self.load_data(file_path)
+        if not isinstance(data, pd.DataFrame):
+            return False
+        
+        write_columnar(data, target_dir, source_fingerprint=key, metadata=self._columnar_metadata(file_path))
+        logger.info(f"Converted {file_path} to columnar form at {target_dir}")
+        # Swap the parsed frame for the memory-mapped one so cached pages are shared
+        self.dataset_cache.put(key, read_columnar(target_dir))
+        return True
+    
+    def forget(self, file_path):
+        """
+        Drop everything cached for a file, e.g. after the upload janitor deleted it
+        
+        Args:
+            file_path (str): Path to the data file
+        """
+        for cache in (self.dataset_cache, self.profile_cache, self.file_facts):
+            cache.invalidate(file_path)
+    
+    def _read_file(self, file_path, columns=None):
+        """
+        Read a data file from disk, preferring its columnar copy when it is current
+        
+        Args:
+            file_path (str): Path to the data file
+            columns (list, optional): Only read these columns
             
         Returns:
             data: Loaded data (DataFrame or dict)
@@ -52,39 +243,22 @@ class InsightsEngine:
         ext = os.path.splitext(file_path)[1].lower()
         
         try:
+            if ext == COLUMNAR_SUFFIX:
+                return read_columnar(file_path, columns=columns)
+            
+            target_dir = columnar_path(file_path)
+            if os.path.isdir(target_dir) and is_current(target_dir, file_fingerprint(file_path)):
+                return read_columnar(target_dir, columns=columns)
+            
             if ext == '.csv':
-                try:
-                    # First try with default settings
-                    return pd.read_csv(file_path)
-                except Exception as e:
-                    # If that fails, try with some common encoding and delimiter variations
-                    logger.warning(f"Standard CSV parsing failed: {str(e)}. Trying with different parameters.")
-                    
-                    # Try different encodings
-                    for encoding in ['utf-8', 'latin1', 'ISO-8859-1']:
-                        try:
-                            logger.info(f"Trying with encoding: {encoding}")
-                            return pd.read_csv(file_path, encoding=encoding)
-                        except Exception:
-                            continue
-                    
-                    # Try different delimiters
-                    for delimiter in [',', ';', '\t', '|']:
-                        try:
-                            logger.info(f"Trying with delimiter: {delimiter}")
-                            return pd.read_csv(file_path, delimiter=delimiter)
-                        except Exception:
-                            continue
-                    
-                    # If all attempts fail, try a very flexible approach
-                    logger.info("Trying with the most flexible settings")
-                    return pd.read_csv(file_path, encoding='latin1', sep=None, engine='python')
-            
-            elif ext in ['.xlsx', '.xls']:
-                return pd.read_excel(file_path)
-            elif ext == '.json':
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return self._compact(file_path, self._read_csv(file_path, usecols=columns), columns)
+            elif ext in EXCEL_EXTENSIONS:
+                return self._compact(file_path, read_sheet(file_path, columns=columns), columns)
+            elif ext in JSON_EXTENSIONS:
+                data = read_json(file_path)
+                if not isinstance(data, pd.DataFrame):
+                    return data
+                return self._compact(file_path, data if columns is None else data[columns], columns)
             else:
                 raise ValueError(f"Unsupported file format: {ext}")
         except Exception as e:
@@ -93,45 +267,390 @@ class InsightsEngine:
             logger.error(traceback.format_exc())
             raise ValueError(f"Could not load the file: {str(e)}")
     
-    def get_data_summary(self, file_path):
+    def list_sheets(self, file_path):
         """
-        Generate a summary of the data for preview
+        List the sheets of an Excel workbook
+        
+        Args:
+            file_path (str): Path to the workbook
+            
+        Returns:
+            list: Dicts with the 'name' and recorded size of each sheet
+        """
+        try:
+            return list_sheets(file_path)
+        except Exception as e:
+            logger.error(f"Error reading sheets of {file_path}: {str(e)}")
+            raise ValueError(f"Could not read the workbook: {str(e)}")
+    
+    def convert_sheet(self, file_path, sheet=None):
+        """
+        Convert one sheet of a workbook once into a columnar dataset
+        
+        The returned path is analysed like any other data file. Every later load
+        maps the columnar copy, so the workbook is only parsed again when it changes.
+        
+        Args:
+            file_path (str): Path to the workbook
+            sheet (str or int, optional): Sheet name or position; the first sheet by default
+            
+        Returns:
+            str: Path of the sheet's columnar dataset
+        """
+        names = [info['name'] for info in self.list_sheets(file_path)]
+        if not names:
+            raise ValueError("The workbook has no sheets")
+        if sheet is None:
+            index = 0
+        elif isinstance(sheet, int) and 0 <= sheet < len(names):
+            index = sheet
+        elif sheet in names:
+            index = names.index(sheet)
+        else:
+            raise ValueError(f"Sheet not found: {sheet}")
+        
+        key = file_fingerprint(file_path)
+        target_dir = sheet_dataset_path(file_path, index)
+        
+        def convert():
+            if is_current(target_dir, key):
+                return target_dir
+            try:
+                with stage('load'):
+                    data = read_sheet(file_path, sheet=names[index])
+            except Exception as e:
+                logger.error(f"Error loading sheet {names[index]!r} of {file_path}: {str(e)}")
+                raise ValueError(f"Could not load the sheet: {str(e)}")
+            report = None
+            if self.compact_dtypes:
+                with stage('dtypes'):
+                    data, report = optimize_dtypes(data)
+            os.makedirs(os.path.dirname(target_dir), exist_ok=True)
+            metadata = None if report is None else {'memory_report': _json_report(report)}
+            write_columnar(data, target_dir, source_fingerprint=key, metadata=metadata)
+            logger.info(f"Converted sheet {names[index]!r} of {file_path} to columnar form at {target_dir}")
+            if report is not None:
+                sheet_key = file_fingerprint(target_dir)
+                self.file_facts.put(sheet_key + ('memory',), report, size_hint=MEMORY_REPORT_BYTES)
+            return target_dir
+        
+        # Concurrent requests for the same sheet share one conversion
+        return self.inflight.do(('sheet',) + key + (index,), convert)
+    
+    def _compact(self, file_path, data, columns=None):
+        """
+        Apply compact dtypes to a freshly parsed frame when compact loading is enabled
+        
+        Args:
+            file_path (str): Path the data was read from
+            data (DataFrame): Parsed data
+            columns (list, optional): Column subset that was read; reports are only
+                kept for full loads
+            
+        Returns:
+            DataFrame: The data, compacted if enabled
+        """
+        if not self.compact_dtypes:
+            return data
+        with stage('dtypes'):
+            data, report = optimize_dtypes(data)
+        if columns is None:
+            key = file_fingerprint(file_path)
+            self.file_facts.put(key + ('memory',), report, size_hint=MEMORY_REPORT_BYTES)
+        return data
+    
+    def get_memory_report(self, file_path):
+        """
+        Return the compact-dtype report of a loaded file
+        
+        The report is kept with the columnar copy or shared store entry written from
+        the compacted data, so it survives reloads from those copies in other worker
+        processes and after restarts.
         
         Args:
             file_path (str): Path to the data file
             
         Returns:
-            dict: Summary of the data
+            dict: optimize_dtypes report, or None if the data was not compacted
+        """
+        key = file_fingerprint(file_path)
+        known = self.file_facts.get(key + ('memory',))
+        if known is not None:
+            return known
+        
+        if os.path.splitext(file_path)[1].lower() == COLUMNAR_SUFFIX:
+            metadata = read_metadata(file_path)
+        elif is_current(columnar_path(file_path), key):
+            metadata = read_metadata(columnar_path(file_path))
+        elif self.compact_dtypes and self.shared_store.enabled and not self.should_stream(file_path):
+            metadata = self.shared_store.metadata(self._shared_store_key(file_path))
+        else:
+            return None
+        report = metadata.get('memory_report')
+        if report is not None:
+            self.file_facts.put(key + ('memory',), report, size_hint=MEMORY_REPORT_BYTES)
+        return report
+    
+    def _columnar_metadata(self, file_path):
+        """Metadata stored with a columnar copy of a freshly loaded file"""
+        report = self.file_facts.peek(file_fingerprint(file_path) + ('memory',))
+        return None if report is None else {'memory_report': _json_report(report)}
+    
+    def get_csv_dialect(self, file_path):
+        """
+        Return the detected CSV dialect for a file, sniffing it only once per file version
+        
+        Args:
+            file_path (str): Path to the CSV file
+            
+        Returns:
+            dict: Keyword arguments for pd.read_csv
+        """
+        key = file_fingerprint(file_path) + ('dialect',)
+        known = self.file_facts.get(key)
+        if known is not None:
+            return dict(known)
+        
+        dialect = sniff_csv_dialect(file_path)
+        self.file_facts.put(key, dialect)
+        return dict(dialect)
+    
+    def _read_csv(self, file_path, **kwargs):
+        """
+        Parse a CSV file in a single pass using its detected dialect
+        
+        Args:
+            file_path (str): Path to the CSV file
+            **kwargs: Extra keyword arguments for pd.read_csv
+            
+        Returns:
+            DataFrame: Parsed data
+        """
+        dialect = self.get_csv_dialect(file_path)
+        try:
+            return pd.read_csv(file_path, engine='c', **dialect, **kwargs)
+        except UnicodeDecodeError as e:
+            # Non UTF-8 bytes past the sniffed prefix; latin1 accepts every byte
+            logger.warning(f"CSV is not valid {dialect['encoding']} beyond the sniffed prefix: {str(e)}. Re-reading as latin1.")
+            dialect['encoding'] = 'latin1'
+            self.file_facts.put(file_fingerprint(file_path) + ('dialect',), dict(dialect))
+            return pd.read_csv(file_path, engine='c', **dialect, **kwargs)
+        except pd.errors.ParserError as e:
+            logger.warning(f"C parser failed with detected dialect: {str(e)}. Trying with the most flexible settings.")
+            # Let the python engine re-detect the delimiter but keep the detected header and quoting
+            fallback = {name: value for name, value in dialect.items() if name not in ('sep', 'delimiter')}
+            return pd.read_csv(file_path, sep=None, engine='python', **fallback, **kwargs)
+    
+    def should_stream(self, file_path):
+        """
+        Decide whether a file is too large to load whole and must be profiled in chunks
+        
+        Args:
+            file_path (str): Path to the data file
+            
+        Returns:
+            bool: True for CSV files above the streaming threshold without a columnar copy
         """
+        if os.path.splitext(file_path)[1].lower() != '.csv':
+            return False
+        key = file_fingerprint(file_path)
+        if key[2] < self.streaming_threshold_bytes:
+            return False
+        return not is_current(columnar_path(file_path), key)
+    
+    def should_profile_upload(self, filename, upload_bytes):
+        """
+        Decide whether an upload should be profiled while it streams to disk
+        
+        Only uploads that will be streamed anyway qualify; smaller files are parsed
+        whole after the upload, which also yields their exact profile.
+        
+        Args:
+            filename (str): Name of the uploaded file
+            upload_bytes (int): Size of the request body, None if unknown
+            
+        Returns:
+            bool: True for CSV uploads above the streaming threshold
+        """
+        return (self.profile_on_upload and upload_bytes is not None
+                and upload_bytes >= self.streaming_threshold_bytes
+                and os.path.splitext(filename or '')[1].lower() == '.csv')
+    
+    def remember_profile(self, file_path, profile):
+        """
+        Record a profile computed elsewhere (e.g. while the upload streamed to disk)
+        
+        Args:
+            file_path (str): Path to the stored data file
+            profile (DatasetProfile): Profile of its current contents
+            
+        Returns:
+            bool: True if the profile was kept; it is only used for files that are
+                streamed, others are profiled exactly from the loaded data
+        """
+        if not self.should_stream(file_path):
+            return False
+        self.profile_cache.put(file_fingerprint(file_path) + ('profile',), profile)
+        return True
+    
+    def get_profile(self, file_path):
+        """
+        Return the DatasetProfile of a tabular file, built in one pass and memoized
+        until the file changes
+        
+        Args:
+            file_path (str): Path to the data file
+            
+        Returns:
+            DatasetProfile: Profile of the data, or None for non-tabular data (e.g. nested JSON)
+        """
+        key = file_fingerprint(file_path) + ('profile',)
+        if self.should_stream(file_path):
+            def stream_profile():
+                with stage('summary'):
+                    return StreamingProfiler().profile_file(file_path, **self.get_csv_dialect(file_path)).to_profile()
+            return self.profile_cache.get_or_load(key, stream_profile)
+        
         data = self.load_data(file_path)
+        if not isinstance(data, pd.DataFrame):
+            return None
         
-        if isinstance(data, pd.DataFrame):
-            # For DataFrame
-            summary = {
-                'type': 'dataframe',
-                'rows': data.shape[0],
-                'columns': data.shape[1],
-                'column_names': data.columns.tolist(),
-                'sample': data.head(5).to_dict(orient='records'),
-                'data_types': {col: str(dtype) for col, dtype in data.dtypes.items()}
-            }
+        def build_profile():
+            with stage('summary'):
+                return DatasetProfile.from_dataframe(data)
+        return self.profile_cache.get_or_load(key, build_profile)
+    
+    def get_cube(self, file_path):
+        """
+        Return the AggregateCube of a tabular file, built on first use and memoized
+        until the file changes
+        
+        Args:
+            file_path (str): Path to the data file
             
-            # Add basic statistics if numerical columns exist
-            numeric_cols = data.select_dtypes(include=['number']).columns.tolist()
-            if numeric_cols:
-                summary['statistics'] = {}
-                for col in numeric_cols[:5]:  # Limit to first 5 numerical columns
-                    summary['statistics'][col] = {
-                        'min': float(data[col].min()) if not pd.isna(data[col].min()) else None,
-                        'max': float(data[col].max()) if not pd.isna(data[col].max()) else None,
-                        'mean': float(data[col].mean()) if not pd.isna(data[col].mean()) else None,
-                        'median': float(data[col].median()) if not pd.isna(data[col].median()) else None
-                    }
+        Returns:
+            AggregateCube: Precomputed aggregates, or None for non-tabular data
+        """
+        profile = self.get_profile(file_path)
+        if profile is None:
+            return None
+        key = file_fingerprint(file_path) + ('cube',)
+        
+        def build_cube():
+            dimensions, measures, combinations = AggregateCube.plan(profile)
+            if not combinations:
+                return AggregateCube(dimensions, measures, profile.rows, {})
+            with stage('aggregate'):
+                if not self.should_stream(file_path):
+                    return AggregateCube.from_chunks([self.load_data(file_path)], dimensions, measures, combinations)
+                # Only the cube's columns are parsed, a chunk at a time; dimensions are
+                # read as strings so that every chunk groups on the same values
+                with pd.read_csv(file_path, chunksize=DEFAULT_CHUNKSIZE, usecols=dimensions + measures,
+                                 dtype={dim: str for dim in dimensions}, **self.get_csv_dialect(file_path)) as reader:
+                    return AggregateCube.from_chunks(reader, dimensions, measures, combinations)
+        return self.profile_cache.get_or_load(key, build_cube)
+    
+    def get_time_series(self, file_path):
+        """
+        Return the numeric columns aggregated over the dataset's date column, built
+        in one pass and memoized until the file changes
+        
+        Args:
+            file_path (str): Path to the data file
+            
+        Returns:
+            TimeSeries: Date-bucketed aggregates, or None without a date column
+        """
+        profile = self.get_profile(file_path)
+        if profile is None:
+            return None
+        key = file_fingerprint(file_path) + ('timeseries',)
+        
+        def build_series():
+            date_column = detect_date_column(profile)
+            if date_column is None:
+                return _NO_TIME_SERIES
+            measures = [col for col in profile.numeric_columns if col != date_column][:TIME_SERIES_MEASURES]
+            with stage('timeseries'):
+                if not self.should_stream(file_path):
+                    data = self.load_data(file_path)
+                    series = TimeSeries.from_chunks([data[[date_column] + measures]], date_column, measures)
+                else:
+                    # Only the date and measure columns are parsed, a chunk at a time
+                    with pd.read_csv(file_path, chunksize=DEFAULT_CHUNKSIZE, usecols=[date_column] + measures,
+                                     dtype={date_column: str}, **self.get_csv_dialect(file_path)) as reader:
+                        series = TimeSeries.from_chunks(reader, date_column, measures)
+            return _NO_TIME_SERIES if series is None else series
+        
+        series = self.profile_cache.get_or_load(key, build_series)
+        return None if series is _NO_TIME_SERIES else series
+    
+    def query_aggregates(self, file_path, group_by, filters=None, measures=None, stats=STATS,
+                         sort_by=None, descending=True, limit=DEFAULT_QUERY_LIMIT):
+        """
+        Aggregate numeric columns by one or more columns, from the cube when it covers them
+        
+        Args:
+            file_path (str): Path to the data file
+            group_by (list): Columns to break down by (empty for totals)
+            filters (dict, optional): Column -> value or list of values to keep
+            measures (list, optional): Numeric columns to aggregate; the cube's measures by default
+            stats (tuple): Statistics per measure (sum, count, mean, min, max)
+            sort_by (str, optional): 'rows' or a measure name
+            descending (bool): Sort order
+            limit (int): Maximum number of groups returned
+            
+        Returns:
+            dict: Result of AggregateCube.query plus 'source' ('cube' or 'data')
+        """
+        cube = self.get_cube(file_path)
+        if cube is None:
+            raise ValueError("Aggregation queries need tabular data")
+        options = {'stats': tuple(stats), 'sort_by': sort_by, 'descending': descending, 'limit': limit}
+        if cube.can_answer(group_by, filters) and (measures is None or set(measures) <= set(cube.measures)):
+            result = cube.query(group_by, filters=filters, measures=measures, **options)
+            result['source'] = 'cube'
+            return result
+        
+        # Dimensions outside the cube (e.g. high-cardinality columns): aggregate the data
+        measures = cube.measures if measures is None else list(measures)
+        columns = list(dict.fromkeys(list(group_by) + list(filters or {}) + measures))
+        known = set(self.get_profile(file_path).column_names)
+        missing = [col for col in columns if col not in known]
+        if missing:
+            raise ValueError(f"Columns not found: {', '.join(map(str, missing))}")
+        with stage('aggregate'):
+            result = query_dataframe(self.load_data(file_path, columns=columns), group_by,
+                                     filters=filters, measures=measures, **options)
+        result['source'] = 'data'
+        return result
+    
+    def get_data_summary(self, file_path):
+        """
+        Generate a summary of the data for preview
+        
+        Args:
+            file_path (str): Path to the data file
+            
+        Returns:
+            dict: Summary of the data
+        """
+        profile = self.get_profile(file_path)
+        if profile is not None:
+            summary = profile.to_summary()
+            report = self.get_memory_report(file_path)
+            if report is not None:
+                summary['memory'] = {
+                    'bytes_before': report['bytes_before'],
+                    'bytes_after': report['bytes_after'],
+                    'converted_columns': dict(report['converted'])
+                }
         else:
+            data = self.load_data(file_path)
             # For JSON
             summary = {
                 'type': 'json',
-                'preview': json.dumps(data, indent=2)[:1000] + "..." if len(json.dumps(data)) > 1000 else json.dumps(data, indent=2)
+                'preview': json_preview(data)
             }
             
         return summary
@@ -140,6 +659,9 @@ class InsightsEngine:
         """
         Generate insights from data using Gemini API
         
+        Concurrent identical requests (same file version, insight type and question)
+        share a single computation.
+        
         Args:
             file_path (str): Path to the data file
             question (str, optional): Specific question to answer about the data
@@ -148,67 +670,297 @@ class InsightsEngine:
         Returns:
             str: Generated insights
         """
-        data = self.load_data(file_path)
+        key = ('insights', file_fingerprint(file_path), insight_type, question)
+        return self.inflight.do(key, lambda: self._generate_insights(file_path, question, insight_type))
+    
+    def generate_insights_stream(self, file_path, question=None, insight_type="general"):
+        """
+        Generate insights chunk by chunk as Gemini produces them
         
+        Concurrent identical requests read from a single shared stream.
+        
+        Args:
+            file_path (str): Path to the data file
+            question (str, optional): Specific question to answer about the data
+            insight_type (str): Type of insights to generate (general, trends, anomalies)
+            
+        Returns:
+            iterator: Consecutive pieces of the insights markdown
+        """
+        key = ('insights-stream', file_fingerprint(file_path), insight_type, question)
+        return self.inflight.stream(key, lambda: self._iter_insights(file_path, question, insight_type))
+    
+    def generate_insights_batch(self, file_path, requests, timeout=None):
+        """
+        Generate several insight types and questions for one dataset concurrently
+        
+        Args:
+            file_path (str): Path to the data file
+            requests (list): Dicts with 'insight_type' and/or 'question'
+            timeout (float, optional): Per-call time limit in seconds. Defaults to
+                INSIGHTA_LLM_TIMEOUT_SECONDS or 60.
+            
+        Returns:
+            list: One result dict per request, in request order
+        """
+        results = [None] * len(requests)
+        for index, result in self.iter_insights_batch(file_path, requests, timeout=timeout):
+            results[index] = result
+        return results
+    
+    def iter_insights_batch(self, file_path, requests, timeout=None):
+        """
+        Fan out insight requests over the bounded LLM pool and yield results as they finish
+        
+        The dataset is loaded and profiled once up front; every request then only
+        builds its prompt from the shared profile and waits on its own LLM call.
+        
+        Args:
+            file_path (str): Path to the data file
+            requests (list): Dicts with 'insight_type' and/or 'question'
+            timeout (float, optional): Per-call time limit in seconds, counted from
+                when the call starts running. A call still queued behind other work
+                this long after submission is cancelled, so no request waits more
+                than twice the limit. The model request itself is cut off after
+                llm_timeout, which releases its slot in the LLM pool.
+            
+        Yields:
+            tuple: (request index, result dict with 'success' and 'insights' or 'error')
+        """
+        timeout = self.llm_timeout if timeout is None else timeout
+        self.get_profile(file_path)
+        
+        started = {}
+        
+        def run(index, question, insight_type):
+            started[index] = time.monotonic()
+            return self.generate_insights(file_path, question=question, insight_type=insight_type)
+        
+        pending = {}
+        submitted = time.monotonic()
+        for index, item in enumerate(requests):
+            insight_type = item.get('insight_type', 'general')
+            question = item.get('question')
+            future = self._llm_executor.submit(run, index, question, insight_type)
+            pending[future] = (index, {'insight_type': insight_type, 'question': question})
+        
+        while pending:
+            done, _ = wait(pending, timeout=0.25, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, result = pending.pop(future)
+                try:
+                    result.update(success=True, insights=future.result())
+                except Exception as e:
+                    logger.error(f"Batch insight {index} failed: {str(e)}")
+                    result.update(success=False, error=str(e))
+                yield index, result
+            
+            now = time.monotonic()
+            for future in list(pending):
+                index = pending[future][0]
+                if index in started:
+                    if now - started[index] <= timeout:
+                        continue
+                    # The batch stops waiting; the call itself ends at its request timeout (see _generate_content)
+                    message = f'Timed out after {timeout:g} seconds'
+                elif now - submitted > timeout and future.cancel():
+                    # Still queued behind other calls (e.g. hung ones filling the pool): give up its slot
+                    message = f'Not started within {timeout:g} seconds: the model is busy'
+                else:
+                    continue
+                index, result = pending.pop(future)
+                logger.warning(f"Batch insight {index}: {message}")
+                result.update(success=False, error=message)
+                yield index, result
+    
+    def _generate_insights(self, file_path, question, insight_type):
+        """Generate the full insights text (see generate_insights)"""
         # If using mock responses, return mock data
         if self.use_mock:
+            profile = self.get_profile(file_path)
+            data = profile.sample if profile is not None else self.load_data(file_path)
             return self._get_mock_insights(data, question, insight_type)
         
-        # Prepare data summary for the model
-        if isinstance(data, pd.DataFrame):
-            data_summary = f"DataFrame with {data.shape[0]} rows and {data.shape[1]} columns.\n"
-            data_summary += f"Columns: {', '.join(data.columns)}\n"
-            data_summary += f"Sample data:\n{data.head(5).to_string()}\n"
-            data_summary += f"Summary statistics:\n{data.describe().to_string()}"
-        else:
-            data_summary = f"JSON data: {json.dumps(data, indent=2)[:1000]}..."
+        prompt = self.build_prompt(file_path, question=question, insight_type=insight_type)
+        return self._generate_content(prompt, file_path, insight_label(question, insight_type))
+    
+    def _iter_insights(self, file_path, question, insight_type):
+        """Yield insights chunks as the model produces them (see generate_insights_stream)"""
+        if self.use_mock:
+            profile = self.get_profile(file_path)
+            data = profile.sample if profile is not None else self.load_data(file_path)
+            yield from self._iter_mock_insights(data, question, insight_type)
+            return
         
+        prompt = self.build_prompt(file_path, question=question, insight_type=insight_type)
+        cache_key = self._response_cache_key(prompt, file_path)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Serving insights from LLM response cache")
+            yield cached
+            return
+        
+        parts = []
+        with stage('llm'):
+            for chunk in self.model.generate_content(prompt, stream=True):
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. safety metadata) carry nothing to show
+                    continue
+                if text:
+                    parts.append(text)
+                    yield text
+        response = ''.join(parts)
+        RESPONSE_BYTES.observe(len(response.encode('utf-8')), insight_type=insight_label(question, insight_type))
+        self.response_cache.put(cache_key, response)
+    
+    def build_prompt(self, file_path, question=None, insight_type="general"):
+        """
+        Build the Gemini prompt for an insight type from the dataset profile
+        
+        Args:
+            file_path (str): Path to the data file
+            question (str, optional): Specific question to answer about the data
+            insight_type (str): Type of insights to generate (general, trends, anomalies)
+            
+        Returns:
+            str: Prompt text
+        """
+        with stage('prompt'):
+            prompt = self._build_prompt(file_path, question, insight_type)
+        PROMPT_BYTES.observe(len(prompt.encode('utf-8')), insight_type=insight_label(question, insight_type))
+        return prompt
+    
+    def _build_prompt(self, file_path, question, insight_type):
+        """Build the prompt text (see build_prompt)"""
         # Craft different prompts based on insight type
-        if question:
-            prompt = f"""
-            As a business intelligence expert, analyze this data and answer the specific question:
-            {question}
+        def render(data_summary):
+            if question:
+                prompt = f"""
+                As a business intelligence expert, analyze this data and answer the specific question:
+                {question}
+            
+                Data:
+                {data_summary}
+            
+                Provide a clear, concise answer with specific insights backed by the data.
+                Format your response in structured paragraphs with headers for each key point.
+                """
+            elif insight_type == "trends":
+                prompt = f"""
+                As a business intelligence expert, analyze this data and identify the most significant trends.
+            
+                Data:
+                {data_summary}
+            
+                Provide 3-5 key trends with supporting evidence from the data.
+                Format your response with clear headers for each trend and supporting points in paragraphs.
+                """
+            elif insight_type == "anomalies":
+                prompt = f"""
+                As a business intelligence expert, analyze this data and identify any anomalies or outliers.
+            
+                Data:
+                {data_summary}
+            
+                Provide details on the most significant anomalies and what they might indicate.
+                Format your response with clear headers for each anomaly and supporting points in paragraphs.
+                """
+            else:  # general insights
+                prompt = f"""
+                As a business intelligence expert, analyze this data and provide valuable business insights.
             
-            Data:
-            {data_summary}
+                Data:
+                {data_summary}
             
-            Provide a clear, concise answer with specific insights backed by the data.
-            Format your response in structured paragraphs with headers for each key point.
-            """
+                Provide 3-5 actionable insights that could help business decision-making.
+                Include specific details from the data to support each insight.
+                Format your response with clear headers for each insight and supporting points in paragraphs.
+                """
+        
+            return prompt
+
+        profile = self.get_profile(file_path)
+        if profile is None:
+            data = self.load_data(file_path)
+            return render(f"JSON data: {json_preview(data)}")
+
+        # The data summary gets whatever the template leaves of the token budget
+        template_tokens = estimate_tokens(render(''))
+        data_budget = self.prompt_builder.token_budget - template_tokens
+        aggregates = ''
+        if question:
+            # Exact figures for the columns the question names, within a quarter of the budget
+            cube = self.get_cube(file_path)
+            aggregates = cube.describe_for_question(question, max_chars=data_budget // 4 * CHARS_PER_TOKEN)
+            data_budget -= estimate_tokens(aggregates)
         elif insight_type == "trends":
-            prompt = f"""
-            As a business intelligence expert, analyze this data and identify the most significant trends.
-            
-            Data:
-            {data_summary}
-            
-            Provide 3-5 key trends with supporting evidence from the data.
-            Format your response with clear headers for each trend and supporting points in paragraphs.
-            """
-        elif insight_type == "anomalies":
-            prompt = f"""
-            As a business intelligence expert, analyze this data and identify any anomalies or outliers.
-            
-            Data:
-            {data_summary}
-            
-            Provide details on the most significant anomalies and what they might indicate.
-            Format your response with clear headers for each anomaly and supporting points in paragraphs.
-            """
-        else:  # general insights
-            prompt = f"""
-            As a business intelligence expert, analyze this data and provide valuable business insights.
-            
-            Data:
-            {data_summary}
-            
-            Provide 3-5 actionable insights that could help business decision-making.
-            Include specific details from the data to support each insight.
-            Format your response with clear headers for each insight and supporting points in paragraphs.
-            """
-        
-        # Generate response from Gemini
-        response = self.model.generate_content(prompt)
+            # Compact period-over-period figures say more about trends than raw rows
+            series = self.get_time_series(file_path)
+            if series is not None:
+                aggregates = series.describe_periods(max_chars=data_budget // 4 * CHARS_PER_TOKEN)
+                data_budget -= estimate_tokens(aggregates)
+        data_summary, report = self.prompt_builder.build(profile, token_budget=data_budget)
+        if aggregates:
+            data_summary = f"{data_summary}\n\n{aggregates}"
+        logger.info(f"Prompt for {os.path.basename(file_path)} ({insight_type}): "
+                    f"~{report['estimated_tokens'] + template_tokens} tokens, "
+                    f"{report['detailed_columns']} columns detailed, "
+                    f"{report['summarised_columns']} summarised, {report['sample_rows']} sample rows")
+        return render(data_summary)
+    
+    def remember_content_hash(self, file_path, content_hash):
+        """
+        Record a content hash computed elsewhere (e.g. while the upload streamed to disk)
+        
+        Args:
+            file_path (str): Path to the data file
+            content_hash (str): SHA-256 hex digest of its current contents
+        """
+        self.file_facts.put(file_fingerprint(file_path) + ('sha256',), content_hash)
+    
+    def get_content_hash(self, file_path):
+        """
+        Return the SHA-256 of a file's contents, computed once per file version
+        
+        Args:
+            file_path (str): Path to the data file
+            
+        Returns:
+            str: Hex digest
+        """
+        key = file_fingerprint(file_path) + ('sha256',)
+        known = self.file_facts.get(key)
+        if known is not None:
+            return known
+        content_hash = file_content_hash(file_path)
+        self.file_facts.put(key, content_hash)
+        return content_hash
+    
+    def _generate_content(self, prompt, file_path, label=None):
+        """
+        Send a prompt to Gemini, answering repeats from the persistent response cache
+        
+        Args:
+            prompt (str): Prompt text
+            file_path (str): Path to the data file the prompt describes
+            label (str, optional): Insight type reported with the response size
+            
+        Returns:
+            str: Generated insights
+        """
+        cache_key = self._response_cache_key(prompt, file_path)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Serving insights from LLM response cache")
+            return cached
+        
+        # Generate response from Gemini; the request timeout also frees the LLM pool slot of a hung call
+        with stage('llm'):
+            response = self.model.generate_content(prompt, request_options={'timeout': self.llm_timeout})
+        RESPONSE_BYTES.observe(len(response.text.encode('utf-8')), insight_type=label)
+        self.response_cache.put(cache_key, response.text)
         return response.text
     
     def generate_visualization_data(self, file_path):
@@ -221,64 +973,25 @@ class InsightsEngine:
         Returns:
             list: List of visualization data objects
         """
-        data = self.load_data(file_path)
-        visualizations = []
-        
-        if isinstance(data, pd.DataFrame):
+        profile = self.get_profile(file_path)
+        if profile is None:
             # Only generate visualizations for DataFrames
-            
-            # 1. For numeric columns, create data for bar charts or line charts
-            numeric_cols = data.select_dtypes(include=['number']).columns.tolist()
-            if len(numeric_cols) >= 2:
-                # Correlation data
-                corr_data = data[numeric_cols].corr().reset_index().melt(id_vars='index')
-                corr_data.columns = ['x', 'y', 'value']
-                visualizations.append({
-                    'type': 'heatmap',
-                    'title': 'Correlation Matrix',
-                    'data': corr_data.to_dict(orient='records'),
-                    'x_field': 'x',
-                    'y_field': 'y',
-                    'value_field': 'value'
-                })
-            
-            # 2. Distribution data for the first few numeric columns
-            for col in numeric_cols[:3]:
-                # Calculate histogram data
-                hist_data, bin_edges = np.histogram(data[col].dropna(), bins=10)
-                viz_data = [{'bin': f"{bin_edges[i]:.2f}-{bin_edges[i+1]:.2f}", 'count': int(hist_data[i])} 
-                           for i in range(len(hist_data))]
-                
-                visualizations.append({
-                    'type': 'histogram',
-                    'title': f'Distribution of {col}',
-                    'data': viz_data,
-                    'x_field': 'bin',
-                    'y_field': 'count'
-                })
-            
-            # 3. If we have categorical columns, create data for pie charts
-            categorical_cols = data.select_dtypes(include=['object']).columns.tolist()
-            for col in categorical_cols[:2]:  # Limit to first 2 categorical columns
-                try:
-                    # Get value counts and convert to chart data
-                    value_counts = data[col].value_counts().reset_index()
-                    value_counts.columns = ['category', 'count']
-                    # Limit to top 10 categories
-                    value_counts = value_counts.head(10)
-                    
-                    visualizations.append({
-                        'type': 'pie',
-                        'title': f'Distribution of {col}',
-                        'data': value_counts.to_dict(orient='records'),
-                        'category_field': 'category',
-                        'value_field': 'count'
-                    })
-                except:
-                    # Skip this column if there's an error
-                    continue
-                    
-        return visualizations
+            return []
+        series = self.get_time_series(file_path)
+        with stage('visualization'):
+            # Trend lines lead when the rows are dated
+            if series is None:
+                return profile.visualizations()
+            return series.visualizations() + profile.visualizations(exclude=(series.date_column,))
+    
+    def _response_cache_key(self, prompt, file_path):
+        """Fingerprint a model call for the response cache"""
+        return self.response_cache.make_key(self.model_name, prompt, self.get_content_hash(file_path))
+    
+    def _iter_mock_insights(self, data, question, insight_type):
+        """Yield the mock insights line by line, mimicking a streamed model response"""
+        for line in self._get_mock_insights(data, question, insight_type).splitlines(keepends=True):
+            yield line
     
     def _get_mock_insights(self, data, question, insight_type):
         """Generate mock insights when API key is not available"""
@@ -364,4 +1077,18 @@ class InsightsEngine:
             
             ## Next Steps
             A deeper dive into specific objects and arrays within the JSON would yield more specific insights.
-            """ 
\ No newline at end of file
+            """ 
+
+
+def insight_label(question, insight_type):
+    """Name a prompt for metrics: its insight type, or 'question' for free-form questions"""
+    return 'question' if question else insight_type
+
+
+def _json_report(report):
+    """optimize_dtypes report with string column names, so it can be stored as JSON"""
+    return {
+        'bytes_before': report['bytes_before'],
+        'bytes_after': report['bytes_after'],
+        'converted': {str(col): change for col, change in report['converted'].items()}
+    }
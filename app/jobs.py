@@ -0,0 +1,243 @@
+"""
+Background jobs: run analyses on a bounded worker pool with progress, results and cancellation
+"""
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_QUEUED = 100
+
+# Finished jobs are kept this long so clients can fetch their results
+DEFAULT_RETENTION_SECONDS = 60 * 60
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function when cancellation was requested"""
+
+
+class QueueFullError(Exception):
+    """Raised when too many jobs are waiting for a worker"""
+
+
+class Job:
+    """State of one background job, updated by the worker and read by pollers"""
+    def __init__(self, kind, owner=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.owner = owner
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = 'Queued'
+        self.partial = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def update(self, progress=None, message=None, **partial):
+        """
+        Report progress from inside the job function
+
+        Args:
+            progress (float, optional): Completed fraction between 0 and 1
+            message (str, optional): Human readable stage description
+            **partial: Intermediate results exposed to pollers before completion
+        """
+        with self._lock:
+            if progress is not None:
+                self.progress = max(0.0, min(1.0, float(progress)))
+            if message is not None:
+                self.message = message
+            self.partial.update(partial)
+
+    def check_cancelled(self):
+        """Raise JobCancelled if cancellation was requested; call between work steps"""
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def request_cancel(self):
+        """Ask the job function to stop at its next check_cancelled() call"""
+        self._cancel_event.set()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_event.is_set()
+
+    def to_dict(self):
+        """Return the pollable status of the job"""
+        with self._lock:
+            status = {
+                'job_id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'progress': self.progress,
+                'message': self.message,
+                'partial': dict(self.partial),
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at
+            }
+            if self.error is not None:
+                status['error'] = self.error
+            return status
+
+
+class JobManager:
+    """
+    Runs job functions on a bounded thread pool.
+
+    Threads (not processes) are used so jobs share the engine's in-process dataset
+    and profile caches; the heavy work is either I/O bound (LLM calls) or runs in
+    pandas/NumPy code that releases the GIL.
+    """
+    def __init__(self, max_workers=None, max_queued=None, retention_seconds=DEFAULT_RETENTION_SECONDS):
+        """
+        Args:
+            max_workers (int, optional): Concurrently running jobs. Defaults to
+                INSIGHTA_JOB_WORKERS or 4.
+            max_queued (int, optional): Jobs allowed to wait for a worker. Defaults to
+                INSIGHTA_JOB_QUEUE_LIMIT or 100.
+            retention_seconds (int): How long finished jobs stay retrievable
+        """
+        if max_workers is None:
+            max_workers = int(os.environ.get('INSIGHTA_JOB_WORKERS', DEFAULT_MAX_WORKERS))
+        if max_queued is None:
+            max_queued = int(os.environ.get('INSIGHTA_JOB_QUEUE_LIMIT', DEFAULT_MAX_QUEUED))
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='insighta-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._counters = {SUCCEEDED: 0, FAILED: 0, CANCELLED: 0}
+
+    def submit(self, kind, fn, *args, owner=None, **kwargs):
+        """
+        Queue fn(job, *args, **kwargs) for execution
+
+        Args:
+            kind (str): Job type, e.g. 'analysis'
+            fn (callable): Job function; its return value becomes the job result
+            owner (str, optional): Identifier of the submitting session
+
+        Returns:
+            Job: The queued job
+
+        Raises:
+            QueueFullError: If max_queued jobs are already waiting
+        """
+        self._prune()
+        with self._lock:
+            queued = sum(1 for job in self._jobs.values() if job.status == QUEUED)
+            if queued >= self.max_queued:
+                raise QueueFullError(f"{queued} jobs are already waiting; try again later")
+            job = Job(kind, owner=owner)
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        """Return the job with this id, or None"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Request cancellation of a job
+
+        Queued jobs are dropped immediately; running jobs stop at their next
+        check_cancelled() call.
+
+        Returns:
+            bool: False if the job does not exist or has already finished
+        """
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return False
+        job.request_cancel()
+        if job.future is not None and job.future.cancel():
+            self._finish(job, CANCELLED, message='Cancelled')
+        return True
+
+    def metrics(self):
+        """Return queue depth and job counters"""
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+            return {
+                'queue_depth': statuses.count(QUEUED),
+                'running': statuses.count(RUNNING),
+                'max_workers': self.max_workers,
+                'max_queued': self.max_queued,
+                'succeeded_total': self._counters[SUCCEEDED],
+                'failed_total': self._counters[FAILED],
+                'cancelled_total': self._counters[CANCELLED]
+            }
+
+    def shutdown(self, wait=True):
+        """Stop accepting jobs and cancel the queued ones"""
+        for job_id in list(self._jobs):
+            job = self.get(job_id)
+            if job is not None and job.status == QUEUED:
+                self.cancel(job_id)
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancel_requested:
+            self._finish(job, CANCELLED, message='Cancelled')
+            return
+        with job._lock:
+            job.status = RUNNING
+            job.started_at = time.time()
+            job.message = 'Running'
+        try:
+            result = fn(job, *args, **kwargs)
+        except JobCancelled:
+            self._finish(job, CANCELLED, message='Cancelled')
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.kind}) failed: {str(e)}")
+            import traceback
+            logger.error(traceback.format_exc())
+            self._finish(job, FAILED, message='Failed', error=str(e))
+        else:
+            self._finish(job, SUCCEEDED, message='Done', result=result)
+
+    def _finish(self, job, status, message, result=None, error=None):
+        with job._lock:
+            if job.status in FINISHED_STATES:
+                return
+            job.status = status
+            job.message = message
+            job.result = result
+            job.error = error
+            job.finished_at = time.time()
+            if status == SUCCEEDED:
+                job.progress = 1.0
+        with self._lock:
+            self._counters[status] += 1
+
+    def _prune(self):
+        """Forget finished jobs older than the retention period"""
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at is not None and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
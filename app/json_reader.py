@@ -0,0 +1,216 @@
+"""
+JSON reader: stream JSON arrays and NDJSON record by record and normalize them into DataFrames
+"""
+import os
+import json
+import logging
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+JSON_EXTENSIONS = ('.json', '.ndjson', '.jsonl')
+
+# Characters read from the file per step
+READ_CHUNK_CHARS = 1024 * 1024
+
+# Records flattened by one json_normalize call
+NORMALIZE_CHUNK_RECORDS = 50_000
+
+PREVIEW_CHARS = 1000
+
+_WHITESPACE = ' \t\r\n'
+
+
+def iter_json_values(file_path, chunk_chars=READ_CHUNK_CHARS):
+    """
+    Yield the elements of a top-level JSON array, or the values of an NDJSON file
+
+    Only one read chunk plus the value being decoded is held in memory. A file
+    holding a single non-array document yields that document once, but such
+    files are better parsed with json.load (see read_json).
+
+    Args:
+        file_path (str): Path to the JSON file
+        chunk_chars (int): Characters read per step
+
+    Returns:
+        iterator: Decoded values
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r', encoding='utf-8-sig') as f:
+        buffer = ''
+        position = 0
+        eof = False
+        in_array = None
+
+        while True:
+            # Skip separators between values
+            while True:
+                while position < len(buffer) and buffer[position] in _WHITESPACE:
+                    position += 1
+                if in_array and position < len(buffer) and buffer[position] == ',':
+                    position += 1
+                    continue
+                if position < len(buffer) or eof:
+                    break
+                buffer, position = f.read(chunk_chars), 0
+                eof = not buffer
+
+            if position >= len(buffer):
+                if in_array:
+                    raise ValueError("Invalid JSON: unterminated array")
+                return
+
+            if in_array is None:
+                in_array = buffer[position] == '['
+                if in_array:
+                    position += 1
+                    continue
+            elif in_array and buffer[position] == ']':
+                position += 1
+                if buffer[position:].strip() or f.read().strip():
+                    raise ValueError("Invalid JSON: extra data after the top-level array")
+                return
+
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise ValueError(f"Invalid JSON: {e}")
+                # The value continues in the next chunk; reading at least as much again
+                # as is pending keeps re-decoding a long value linear overall
+                more = f.read(max(chunk_chars, len(buffer) - position))
+                eof = not more
+                buffer, position = buffer[position:] + more, 0
+                continue
+
+            # Only accept the value once the character after it proves it is complete
+            # (e.g. "12" at the end of a chunk may continue as "12.5")
+            after = end
+            while after < len(buffer) and buffer[after] in _WHITESPACE:
+                after += 1
+            if after == len(buffer):
+                complete = eof
+            elif in_array:
+                complete = buffer[after] in ',]'
+            else:
+                complete = after > end or buffer[end - 1] in '}]"'
+            if not complete:
+                if eof:
+                    raise ValueError(f"Invalid JSON: unexpected {buffer[after]!r} after a value")
+                more = f.read(max(chunk_chars, len(buffer) - position))
+                eof = not more
+                buffer, position = buffer[position:] + more, 0
+                continue
+            yield value
+            position = end
+
+
+def read_json(file_path, chunk_records=NORMALIZE_CHUNK_RECORDS):
+    """
+    Read a JSON or NDJSON file, as a DataFrame when it holds records
+
+    Top-level arrays and NDJSON are streamed: records are flattened with
+    json_normalize one chunk at a time, so at most chunk_records decoded records
+    exist next to the growing DataFrame. Any other document is parsed whole with
+    json.load. A document wrapping a single list of records (e.g.
+    {"data": [...], "meta": {...}}) becomes a DataFrame of that list; anything
+    else (other documents, arrays of scalars) is returned decoded, as json.load
+    would return it; NDJSON of non-objects becomes a list.
+
+    Args:
+        file_path (str): Path to the JSON file
+        chunk_records (int): Records per normalization chunk
+
+    Returns:
+        data: DataFrame with one row per record and nested objects flattened to
+            dotted columns, or the decoded document
+    """
+    if _starts_with_array(file_path) or os.path.splitext(file_path)[1].lower() in ('.ndjson', '.jsonl'):
+        return _read_records(file_path, iter_json_values(file_path), chunk_records)
+
+    with open(file_path, 'r', encoding='utf-8-sig') as f:
+        text = f.read()
+    if not text.strip():
+        raise ValueError("Invalid JSON: the file is empty")
+    try:
+        document = json.loads(text)
+    except json.JSONDecodeError as e:
+        if not e.msg.startswith('Extra data'):
+            raise ValueError(f"Invalid JSON: {e}")
+        # Several documents one after another: NDJSON in a .json file
+        del text
+        return _read_records(file_path, iter_json_values(file_path), chunk_records)
+    del text
+
+    key = _records_key(document)
+    if key is None:
+        return document
+    logger.info(f"{file_path} wraps its records in {key!r}; other top-level fields are not tabulated")
+    return _read_records(file_path, iter(document[key]), chunk_records)
+
+
+def _records_key(document):
+    """Return the key of the only list of objects in a top-level object, else None"""
+    if not isinstance(document, dict):
+        return None
+    keys = [key for key, value in document.items()
+            if isinstance(value, list) and value and all(isinstance(item, dict) for item in value)]
+    return keys[0] if len(keys) == 1 else None
+
+
+def _read_records(file_path, values, chunk_records):
+    """Normalize a stream of decoded values into a DataFrame, chunk by chunk"""
+    frames = []
+    batch = []
+    for value in values:
+        if not isinstance(value, dict):
+            logger.info(f"{file_path} does not hold records; keeping it as a JSON document")
+            return list(iter_json_values(file_path))
+        batch.append(value)
+        if len(batch) >= chunk_records:
+            frames.append(pd.json_normalize(batch))
+            batch = []
+    if batch:
+        frames.append(pd.json_normalize(batch))
+    if not frames:
+        return []
+
+    data = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True, sort=False)
+    logger.info(f"Normalized {len(data)} JSON records into {data.shape[1]} columns from {len(frames)} chunks")
+    return data
+
+
+def json_preview(data, limit=PREVIEW_CHARS):
+    """
+    Return the first characters of the indented JSON encoding of data
+
+    The encoding is generated incrementally and stops once limit characters
+    exist, instead of serializing the whole structure.
+
+    Args:
+        data: Decoded JSON value
+        limit (int): Preview length
+
+    Returns:
+        str: Preview, ending in "..." when truncated
+    """
+    parts = []
+    length = 0
+    for part in json.JSONEncoder(indent=2).iterencode(data):
+        parts.append(part)
+        length += len(part)
+        if length > limit:
+            return ''.join(parts)[:limit] + "..."
+    return ''.join(parts)
+
+
+def _starts_with_array(file_path):
+    with open(file_path, 'r', encoding='utf-8-sig') as f:
+        while True:
+            chunk = f.read(4096)
+            if not chunk:
+                return False
+            stripped = chunk.lstrip(_WHITESPACE)
+            if stripped:
+                return stripped[0] == '['
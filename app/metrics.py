@@ -0,0 +1,249 @@
+"""
+Metrics: per-stage timing and memory histograms and component counters, exposed in the Prometheus text format
+"""
+import os
+import sys
+import math
+import time
+import logging
+import threading
+import tracemalloc
+import contextvars
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows has no getrusage; memory is then not recorded
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 1 KB to 4 GB in steps of 4x
+BYTE_BUCKETS = tuple(1024 * 4 ** i for i in range(12))
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, like a Prometheus client histogram"""
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """Record one observation"""
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        """Return the histogram in the Prometheus text exposition format"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+            for bound, count in zip(self.buckets + (math.inf,), values[:-1]):
+                le = 'le="+Inf"' if bound == math.inf else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{{{','.join(labels + [le])}}} {count}")
+            suffix = f"{{{','.join(labels)}}}" if labels else ''
+            lines.append(f"{self.name}_sum{suffix} {values[-1]:.17g}")
+            lines.append(f"{self.name}_count{suffix} {values[-2]}")
+        return '\n'.join(lines)
+
+
+class StatsCollector:
+    """Counters and gauges read from a component's stats() dict on every scrape"""
+    def __init__(self, name, documentation, stats, counters=()):
+        self.name = name
+        self.documentation = documentation
+        self.stats = stats
+        self.counters = tuple(counters)
+
+    def render(self):
+        """Return the numeric stats in the Prometheus text exposition format"""
+        try:
+            values = self.stats()
+        except Exception as e:
+            logger.warning(f"Could not collect {self.name} stats: {str(e)}")
+            return ''
+        lines = []
+        for key, value in values.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if not isinstance(value, (int, float)):
+                # e.g. a path, or no limit configured
+                continue
+            kind = 'counter' if key in self.counters else 'gauge'
+            name = f"{self.name}_{key}_total" if kind == 'counter' else f"{self.name}_{key}"
+            lines += [f"# HELP {name} {self.documentation}: {key.replace('_', ' ')}", f"# TYPE {name} {kind}",
+                      f"{name} {value:.17g}"]
+        return '\n'.join(lines)
+
+
+class MetricsRegistry:
+    """Named histograms and stats collectors of one process"""
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        """Return the histogram with this name, creating it on first use"""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Histogram(name, documentation, labelnames, buckets)
+            return metric
+
+    def collect(self, name, documentation, stats, counters=()):
+        """
+        Expose the numeric values of a stats() callback under a name prefix
+
+        Args:
+            name (str): Metric name prefix, e.g. 'insighta_dataset_cache'
+            documentation (str): What the component is
+            stats (callable): Returns a dict of current values
+            counters (tuple): Keys that only ever increase; the rest are gauges
+        """
+        with self._lock:
+            self._metrics[name] = StatsCollector(name, documentation, stats, counters)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(text for text in (metric.render() for metric in metrics) if text) + '\n'
+
+
+registry = MetricsRegistry()
+
+STAGE_DURATION = registry.histogram(
+    'insighta_stage_duration_seconds', 'Time spent in each processing stage', labelnames=('stage',))
+STAGE_PEAK_MEMORY = registry.histogram(
+    'insighta_stage_peak_memory_bytes', 'Peak memory growth during each processing stage',
+    labelnames=('stage',), buckets=BYTE_BUCKETS)
+PROMPT_BYTES = registry.histogram(
+    'insighta_prompt_bytes', 'Size of prompts sent to the model', labelnames=('insight_type',), buckets=BYTE_BUCKETS)
+RESPONSE_BYTES = registry.histogram(
+    'insighta_response_bytes', 'Size of model responses', labelnames=('insight_type',), buckets=BYTE_BUCKETS)
+REQUEST_DURATION = registry.histogram(
+    'insighta_request_duration_seconds', 'Time to produce an HTTP response (streamed bodies excluded)',
+    labelnames=('endpoint', 'method', 'status'))
+
+# Stage timings of the current request, for the Server-Timing header
+_request_timings = contextvars.ContextVar('insighta_request_timings', default=None)
+
+# Exact per-stage peaks (above the memory in use when the stage started) need
+# tracemalloc, which slows allocation-heavy code down; by default a stage records
+# how far it raised the process's peak resident memory instead, which is cheap and
+# shows the stages that drive the process toward its memory limit
+TRACE_MEMORY = os.environ.get('INSIGHTA_TRACE_MEMORY', '').lower() in ('1', 'true', 'yes')
+if TRACE_MEMORY and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+_trace_stack = threading.local()
+
+
+@contextmanager
+def stage(name):
+    """
+    Time a block as a processing stage and record its peak memory
+
+    Stages nest: an outer stage includes the time of the stages it runs.
+
+    Args:
+        name (str): Stage name, e.g. 'load' or 'llm'
+    """
+    started = time.perf_counter()
+    memory_start = _memory_start()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_DURATION.observe(elapsed, stage=name)
+        peak = _memory_peak(memory_start)
+        if peak is not None:
+            STAGE_PEAK_MEMORY.observe(peak, stage=name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def start_request_timings():
+    """Start collecting the stage timings of the current request"""
+    _request_timings.set([])
+
+
+def request_timings():
+    """Return (stage, seconds) pairs recorded so far in the current request"""
+    return list(_request_timings.get() or [])
+
+
+def server_timing_header(timings):
+    """
+    Format stage timings as a Server-Timing header value
+
+    Repeated stages (e.g. two loads) are summed.
+
+    Args:
+        timings (list): (stage, seconds) pairs
+
+    Returns:
+        str: e.g. "load;dur=120.5, prompt;dur=3.1"
+    """
+    totals = {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ', '.join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+
+
+def _memory_start():
+    if TRACE_MEMORY:
+        current, peak = tracemalloc.get_traced_memory()
+        stack = getattr(_trace_stack, 'frames', None)
+        if stack is None:
+            stack = _trace_stack.frames = []
+        if stack:
+            # The enclosing stage's peak so far would be lost by the reset below
+            stack[-1][1] = max(stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        frame = [current, 0]
+        stack.append(frame)
+        return frame
+    if resource is not None:
+        return _peak_rss()
+    return None
+
+
+def _memory_peak(memory_start):
+    if memory_start is None:
+        return None
+    if TRACE_MEMORY:
+        frame = _trace_stack.frames.pop()
+        peak = max(tracemalloc.get_traced_memory()[1], frame[1])
+        stack = _trace_stack.frames
+        if stack:
+            stack[-1][1] = max(stack[-1][1], peak)
+        return max(peak - frame[0], 0)
+    return max(_peak_rss() - memory_start, 0)
+
+
+def _peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
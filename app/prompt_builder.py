@@ -0,0 +1,212 @@
+"""
+PromptBuilder: compact a dataset profile into prompt text that fits a token budget
+"""
+import os
+import math
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_BUDGET = 4000
+
+# Rough characters-per-token ratio of English text and numbers for Gemini/GPT tokenizers
+CHARS_PER_TOKEN = 4
+
+# Share of the budget that column details may use; the rest is left for sample rows
+COLUMN_DETAIL_SHARE = 0.7
+
+# Sample rows are rendered with at most this many (top ranked) columns
+SAMPLE_COLUMNS = 10
+MIN_SAMPLE_ROWS = 2
+
+# Column names listed in the long-tail summary before truncating
+TAIL_NAMES = 20
+
+
+def estimate_tokens(text):
+    """Estimate the number of tokens in text"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class PromptBuilder:
+    """
+    Builds the "Data:" section of insight prompts within a token budget.
+
+    Columns are ranked by how informative they are (spread, cardinality and
+    missing values). The top ranked columns are described individually until the
+    budget is used up, the remaining long tail is summarised in aggregate, and the
+    sample rows come from the profile's stratified sample pool. Prompt size
+    therefore stays roughly constant however wide the dataset is.
+    """
+    def __init__(self, token_budget=None):
+        """
+        Args:
+            token_budget (int, optional): Token budget of the whole prompt. Defaults
+                to INSIGHTA_PROMPT_TOKEN_BUDGET or 4000.
+        """
+        if token_budget is None:
+            token_budget = int(os.environ.get('INSIGHTA_PROMPT_TOKEN_BUDGET', DEFAULT_TOKEN_BUDGET))
+        self.token_budget = token_budget
+
+    def rank_columns(self, profile):
+        """
+        Order columns by informativeness
+
+        Args:
+            profile (DatasetProfile): Profile of the data
+
+        Returns:
+            list: (column, score) pairs, most informative first; ties keep file order
+        """
+        scores = [(col, self._score(profile, col)) for col in profile.column_names]
+        return sorted(scores, key=lambda item: -item[1])
+
+    def build(self, profile, token_budget=None):
+        """
+        Describe a profiled dataset as prompt text
+
+        Args:
+            profile (DatasetProfile): Profile of the data
+            token_budget (int, optional): Tokens available for the returned text.
+                Defaults to the builder's budget.
+
+        Returns:
+            tuple: (text, report) where report holds the estimated token count and
+                which columns were detailed or summarised
+        """
+        if token_budget is None:
+            token_budget = self.token_budget
+        budget_chars = max(token_budget, 1) * CHARS_PER_TOKEN
+
+        header = f"DataFrame with {profile.rows} rows and {len(profile.column_names)} columns.\n"
+        ranked = [col for col, _ in self.rank_columns(profile)]
+
+        # Greedily describe the most informative columns within the detail share
+        detail_chars = int(budget_chars * COLUMN_DETAIL_SHARE) - len(header)
+        lines, used = {}, 0
+        for col in ranked:
+            line = self._describe_column(profile, col)
+            if used + len(line) + 1 > detail_chars and lines:
+                break
+            lines[col] = line
+            used += len(line) + 1
+        detailed = [col for col in profile.column_names if col in lines]
+        summarised = [col for col in ranked if col not in lines]
+
+        text = header
+        if profile.approximate:
+            text += "Statistics are computed over all rows; quantiles are approximate.\n"
+        text += "Column details (name [dtype]: statistics):\n"
+        text += ''.join(f"{lines[col]}\n" for col in detailed)
+        if summarised:
+            text += self._describe_tail(profile, summarised)
+
+        sample_text, sample_rows = self._sample_section(profile, [col for col in ranked if col in lines],
+                                                        budget_chars - len(text))
+        text += sample_text
+
+        report = {
+            'estimated_tokens': estimate_tokens(text),
+            'token_budget': token_budget,
+            'detailed_columns': len(detailed),
+            'summarised_columns': len(summarised),
+            'sample_rows': sample_rows
+        }
+        return text.rstrip('\n'), report
+
+    def _score(self, profile, col):
+        rows = max(profile.rows, 1)
+        null_rate = profile.null_counts.get(col, 0) / rows
+        present = 1.0 - null_rate
+
+        if col in profile.stats.columns:
+            count = profile.stats.at['count', col]
+            std = profile.stats.at['std', col]
+            mean = profile.stats.at['mean', col]
+            if not count or pd.isna(count):
+                return 0.0
+            if pd.isna(std) or std == 0:
+                return 0.1 * present
+            variation = std / (abs(mean) + 1e-12)
+            return present * (1.0 + math.tanh(variation))
+
+        info = profile.top_categories.get(col)
+        if info is not None:
+            unique = info['unique']
+            non_null = rows - profile.null_counts.get(col, 0)
+            if unique <= 1:
+                return 0.1 * present
+            if non_null > 20 and unique >= 0.95 * non_null:
+                # Identifier-like: nearly every value is distinct
+                return 0.3 * present
+            return present * (1.0 + 1.0 - math.log(unique) / math.log(max(non_null, 2)))
+
+        if col in profile.date_ranges:
+            # Dates anchor trends, so they rank with the most informative columns
+            return 2.0 * present
+
+        return 0.8 * present
+
+    def _describe_column(self, profile, col):
+        rows = max(profile.rows, 1)
+        nulls = profile.null_counts.get(col, 0)
+        missing = f", {nulls / rows:.0%} missing" if nulls else ""
+        name = f"- {col} [{profile.dtypes.get(col, 'unknown')}]"
+
+        if col in profile.stats.columns:
+            s = profile.stats[col]
+            return (f"{name}: mean {_fmt(s['mean'])}, std {_fmt(s['std'])}, min {_fmt(s['min'])}, "
+                    f"25% {_fmt(s['25%'])}, median {_fmt(s['50%'])}, 75% {_fmt(s['75%'])}, "
+                    f"max {_fmt(s['max'])}{missing}")
+
+        info = profile.top_categories.get(col)
+        if info is not None:
+            top = ', '.join(f"{value} ({count})" for value, count in info['values'][:5])
+            unique = f"~{info['unique']}" if info.get('approximate_unique') else info['unique']
+            return f"{name}: {unique} unique, top: {top}{missing}"
+
+        if col in profile.date_ranges:
+            first, last = profile.date_ranges[col]
+            return f"{name}: {_fmt_date(first)} to {_fmt_date(last)}{missing}"
+
+        return f"{name}{missing.replace(', ', ': ', 1)}"
+
+    def _describe_tail(self, profile, columns):
+        rows = max(profile.rows, 1)
+        numeric = sum(1 for col in columns if col in profile.stats.columns)
+        categorical = sum(1 for col in columns if col in profile.top_categories)
+        other = len(columns) - numeric - categorical
+        mean_missing = np.mean([profile.null_counts.get(col, 0) / rows for col in columns])
+        names = ', '.join(map(str, columns[:TAIL_NAMES]))
+        if len(columns) > TAIL_NAMES:
+            names += f", ... (+{len(columns) - TAIL_NAMES} more)"
+        return (f"{len(columns)} less informative columns not detailed ({numeric} numeric, "
+                f"{categorical} categorical, {other} other; {mean_missing:.0%} missing on average): {names}\n")
+
+    def _sample_section(self, profile, ranked_detailed, budget_chars):
+        pool = profile.sample_pool
+        columns = [col for col in ranked_detailed if col in pool.columns][:SAMPLE_COLUMNS]
+        if pool.empty or not columns:
+            return "", 0
+        columns = [col for col in pool.columns if col in columns]
+        title = "Random sample of rows" if profile.approximate else "Sample rows (stratified)"
+        if len(columns) < len(profile.column_names):
+            title += f", top {len(columns)} columns"
+
+        rendered, shown = "", 0
+        for n in range(1, len(pool) + 1):
+            candidate = f"{title}:\n{pool[columns].head(n).to_string()}\n"
+            if len(candidate) > budget_chars and n > MIN_SAMPLE_ROWS:
+                break
+            rendered, shown = candidate, n
+        return rendered, shown
+
+
+def _fmt(value):
+    return "n/a" if pd.isna(value) else f"{value:.4g}"
+
+
+def _fmt_date(value):
+    return value.date().isoformat() if value == value.normalize() else value.isoformat()
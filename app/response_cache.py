@@ -0,0 +1,164 @@
+"""
+ResponseCache: persistent SQLite cache of LLM responses keyed by prompt fingerprint
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join('cache', 'llm_responses.sqlite3')
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+
+
+class ResponseCache:
+    """
+    On-disk cache of model responses with TTL and size-based LRU eviction.
+
+    Safe to share between threads and between worker processes: every operation
+    opens its own SQLite connection and the database runs in WAL mode.
+    """
+    def __init__(self, path=None, ttl_seconds=None, max_bytes=None):
+        """
+        Args:
+            path (str, optional): SQLite file. Defaults to INSIGHTA_LLM_CACHE_PATH or
+                cache/llm_responses.sqlite3. An empty value disables the cache.
+            ttl_seconds (int, optional): Entry lifetime. Defaults to
+                INSIGHTA_LLM_CACHE_TTL_HOURS or 24 hours.
+            max_bytes (int, optional): Total size of cached responses. Defaults to
+                INSIGHTA_LLM_CACHE_MB or 100 MB.
+        """
+        if path is None:
+            path = os.environ.get('INSIGHTA_LLM_CACHE_PATH', DEFAULT_CACHE_PATH)
+        if ttl_seconds is None:
+            ttl_hours = os.environ.get('INSIGHTA_LLM_CACHE_TTL_HOURS')
+            ttl_seconds = float(ttl_hours) * 3600 if ttl_hours else DEFAULT_TTL_SECONDS
+        if max_bytes is None:
+            max_mb = os.environ.get('INSIGHTA_LLM_CACHE_MB')
+            max_bytes = int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_MAX_BYTES
+
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.enabled = bool(path) and max_bytes > 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if self.enabled:
+            try:
+                self._init_db()
+            except sqlite3.Error as e:
+                logger.warning(f"LLM response cache disabled, could not open {path}: {str(e)}")
+                self.enabled = False
+
+    @staticmethod
+    def make_key(model_name, prompt, dataset_hash):
+        """
+        Fingerprint a model call
+
+        Args:
+            model_name (str): Name of the model
+            prompt (str): Full prompt text
+            dataset_hash (str): Content hash of the dataset the prompt describes
+
+        Returns:
+            str: Hex digest identifying the call
+        """
+        digest = hashlib.sha256()
+        for part in (model_name, dataset_hash, prompt):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached response text, or None if missing or expired"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute('SELECT response, created_at FROM responses WHERE key = ?', (key,)).fetchone()
+                if row is not None and now - row[1] > self.ttl_seconds:
+                    conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                    row = None
+                if row is not None:
+                    conn.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+        except sqlite3.Error as e:
+            logger.warning(f"LLM response cache read failed: {str(e)}")
+            return None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return None if row is None else row[0]
+
+    def put(self, key, response):
+        """Store a response and evict expired or least recently used entries over budget"""
+        if not self.enabled:
+            return
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute('INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at) '
+                             'VALUES (?, ?, ?, ?, ?)', (key, response, size, now, now))
+                conn.execute('DELETE FROM responses WHERE created_at < ?', (now - self.ttl_seconds,))
+                self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"LLM response cache write failed: {str(e)}")
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        entries, total = 0, 0
+        if self.enabled:
+            try:
+                with closing(self._connect()) as conn:
+                    entries, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+            except sqlite3.Error:
+                pass
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': entries,
+                'current_bytes': total,
+                'max_bytes': self.max_bytes
+            }
+
+    def _evict(self, conn):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        removed = 0
+        for key, size in conn.execute('SELECT key, size FROM responses ORDER BY accessed_at').fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            total -= size
+            removed += 1
+        logger.info(f"Evicted {removed} entries from LLM response cache")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _init_db(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS responses ('
+                         'key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, '
+                         'created_at REAL NOT NULL, accessed_at REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)')
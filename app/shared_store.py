@@ -0,0 +1,273 @@
+"""
+SharedDatasetStore: columnar datasets keyed by content hash, memory-mapped by every worker process
+"""
+import os
+import time
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+import pandas as pd
+from app.columnar_store import write_columnar, read_columnar, read_schema, read_metadata
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no flock; fall back to unlocked access
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# tmpfs is RAM backed, so entries there are true shared memory; elsewhere the OS page cache shares them
+DEFAULT_STORE_DIR = '/dev/shm/insighta' if os.path.isdir('/dev/shm') else os.path.join('cache', 'datasets')
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+REFS_DIR = 'refs'
+LAST_USED_FILE = 'last_used'
+
+
+class SharedDatasetStore:
+    """
+    Cross-process store of parsed datasets.
+
+    Each dataset is written once, by whichever worker process parses it first, as
+    a columnar directory named after the file's content hash (see columnar_store).
+    Every process then opens the same .npy files memory-mapped, so numeric,
+    datetime and categorical data occupy memory once per unique dataset rather
+    than once per worker. String columns are decoded into Python objects by each
+    process that reads them.
+
+    A process holding a dataset leaves a pid file under its refs/ directory.
+    Entries are evicted least recently used first when the store exceeds its
+    budget, skipping entries referenced by a live process. Store-wide changes are
+    serialized with flock so several worker processes can share one directory.
+    """
+    def __init__(self, root=None, max_bytes=None):
+        """
+        Args:
+            root (str, optional): Store directory. Defaults to INSIGHTA_SHARED_STORE_DIR,
+                or /dev/shm/insighta where available. An empty value disables the store.
+            max_bytes (int, optional): Size budget. Defaults to INSIGHTA_SHARED_STORE_MB
+                or 2 GB.
+        """
+        if root is None:
+            root = os.environ.get('INSIGHTA_SHARED_STORE_DIR', DEFAULT_STORE_DIR)
+        if max_bytes is None:
+            max_mb = os.environ.get('INSIGHTA_SHARED_STORE_MB')
+            max_bytes = int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_MAX_BYTES
+        self.root = root
+        self.max_bytes = max_bytes
+        self.enabled = bool(root) and max_bytes > 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._attached = {}  # content hash -> number of references held by this process
+        self._lock = threading.Lock()
+
+        if self.enabled:
+            try:
+                os.makedirs(root, exist_ok=True)
+            except OSError as e:
+                logger.warning(f"Shared dataset store disabled, could not create {root}: {str(e)}")
+                self.enabled = False
+
+    def entry_path(self, content_hash):
+        """Return the columnar directory of a dataset"""
+        return os.path.join(self.root, content_hash)
+
+    def contains(self, content_hash):
+        """Check whether a dataset is stored"""
+        return self.enabled and read_schema(self.entry_path(content_hash)) is not None
+
+    def attach(self, content_hash, loader, columns=None, metadata=None):
+        """
+        Open a stored dataset, storing the result of loader() first if it is missing
+
+        Each successful call takes a reference that must be given back with release().
+
+        Args:
+            content_hash (str): Content hash of the source file
+            loader (callable): Parses the source file; only called on a miss, and only
+                by one process at a time per dataset
+            columns (list, optional): Only open these columns
+            metadata (callable, optional): Called after loader() on a miss; its dict is
+                stored with the dataset (see metadata())
+
+        Returns:
+            tuple: (data, attached) where data is the memory-mapped DataFrame, or
+                loader()'s result as is when it is not a DataFrame or cannot be stored
+                (attached is then False and no reference was taken)
+        """
+        entry_dir = self.entry_path(content_hash)
+        # References are taken under the store lock so eviction cannot remove the entry
+        # between the check and the read
+        if self._ref_if_stored(content_hash):
+            with self._lock:
+                self.hits += 1
+        else:
+            with self._flock(f"{content_hash}.lock"):
+                if self._ref_if_stored(content_hash):
+                    # Another process stored it while we waited for the lock
+                    with self._lock:
+                        self.hits += 1
+                else:
+                    with self._lock:
+                        self.misses += 1
+                    data = loader()
+                    if (not isinstance(data, pd.DataFrame)
+                            or not self._store(content_hash, data, None if metadata is None else metadata())):
+                        return (data if columns is None else data[columns]), False
+                    with self._flock('.store.lock'):
+                        self._add_ref(content_hash)
+            self._evict()
+
+        try:
+            return read_columnar(entry_dir, columns=columns), True
+        except Exception:
+            self.release(content_hash)
+            raise
+
+    def metadata(self, content_hash):
+        """Return the metadata stored with a dataset ({} if it is not stored)"""
+        if not self.enabled:
+            return {}
+        return read_metadata(self.entry_path(content_hash))
+
+    def release(self, content_hash):
+        """Give back a reference taken by attach()"""
+        with self._lock:
+            count = self._attached.get(content_hash, 0) - 1
+            if count > 0:
+                self._attached[content_hash] = count
+                return
+            self._attached.pop(content_hash, None)
+        try:
+            os.remove(os.path.join(self.entry_path(content_hash), REFS_DIR, str(os.getpid())))
+        except OSError:
+            pass
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current size"""
+        entries = self._entries() if self.enabled else []
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'root': self.root,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(entries),
+                'current_bytes': sum(size for _, size, _ in entries),
+                'max_bytes': self.max_bytes,
+                'attached': sum(self._attached.values())
+            }
+
+    def _store(self, content_hash, data, metadata=None):
+        try:
+            write_columnar(data, self.entry_path(content_hash), metadata=metadata)
+        except (OSError, TypeError, ValueError) as e:
+            # e.g. unhashable values from nested JSON, or a full /dev/shm
+            logger.warning(f"Could not put dataset {content_hash[:12]} in the shared store: {str(e)}")
+            return False
+        logger.info(f"Stored dataset {content_hash[:12]} in the shared store at {self.root}")
+        return True
+
+    def _ref_if_stored(self, content_hash):
+        with self._flock('.store.lock'):
+            if read_schema(self.entry_path(content_hash)) is None:
+                return False
+            self._add_ref(content_hash)
+            return True
+
+    def _add_ref(self, content_hash):
+        entry_dir = self.entry_path(content_hash)
+        with self._lock:
+            self._attached[content_hash] = self._attached.get(content_hash, 0) + 1
+        try:
+            refs_dir = os.path.join(entry_dir, REFS_DIR)
+            os.makedirs(refs_dir, exist_ok=True)
+            with open(os.path.join(refs_dir, str(os.getpid())), 'a'):
+                pass
+            with open(os.path.join(entry_dir, LAST_USED_FILE), 'w') as f:
+                f.write(str(time.time()))
+        except OSError as e:
+            # e.g. a read-only store; the reference only protects against eviction
+            logger.debug(f"Could not record reference to {content_hash[:12]}: {str(e)}")
+
+    def _entries(self):
+        """Return (content hash, bytes, last used) of every stored dataset"""
+        entries = []
+        for item in os.scandir(self.root):
+            if not item.is_dir() or read_schema(item.path) is None:
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(item.path) if f.is_file())
+            try:
+                last_used = os.stat(os.path.join(item.path, LAST_USED_FILE)).st_mtime
+            except OSError:
+                last_used = item.stat().st_mtime
+            entries.append((item.name, size, last_used))
+        return entries
+
+    def _live_refs(self, content_hash):
+        """Count processes referencing a dataset, removing refs of processes that exited"""
+        refs_dir = os.path.join(self.entry_path(content_hash), REFS_DIR)
+        live = 0
+        try:
+            pids = os.listdir(refs_dir)
+        except OSError:
+            return 0
+        for pid in pids:
+            if _process_alive(int(pid)):
+                live += 1
+            else:
+                try:
+                    os.remove(os.path.join(refs_dir, pid))
+                except OSError:
+                    pass
+        return live
+
+    def _evict(self):
+        """Remove least recently used unreferenced datasets until the store fits its budget"""
+        with self._flock('.store.lock'):
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            for content_hash, size, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                if self._live_refs(content_hash):
+                    continue
+                shutil.rmtree(self.entry_path(content_hash), ignore_errors=True)
+                try:
+                    # Worst case a process still waiting on the old lock file parses the
+                    # dataset concurrently; both writes replace the entry atomically
+                    os.remove(os.path.join(self.root, f"{content_hash}.lock"))
+                except OSError:
+                    pass
+                total -= size
+                with self._lock:
+                    self.evictions += 1
+                logger.info(f"Evicted dataset {content_hash[:12]} from the shared store")
+            if total > self.max_bytes:
+                logger.warning(f"Shared dataset store is over budget ({total} bytes) with every dataset in use")
+
+    @contextmanager
+    def _flock(self, name):
+        """Hold an exclusive lock shared by all processes using the store"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.root, name), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,154 @@
+"""
+SingleFlight: coalesce identical concurrent computations into one in-flight execution
+"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """Result slot of one in-flight call"""
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Broadcast:
+    """Chunks of one in-flight stream, replayable by any number of readers"""
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.condition = threading.Condition()
+
+    def produce(self, chunk_iter_fn, on_finish):
+        try:
+            for chunk in chunk_iter_fn():
+                with self.condition:
+                    self.chunks.append(chunk)
+                    self.condition.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            on_finish()
+            with self.condition:
+                self.done = True
+                self.condition.notify_all()
+
+    def __iter__(self):
+        position = 0
+        while True:
+            with self.condition:
+                while position >= len(self.chunks) and not self.done:
+                    self.condition.wait()
+                if position < len(self.chunks):
+                    chunk = self.chunks[position]
+                    position += 1
+                elif self.error is not None:
+                    raise self.error
+                else:
+                    return
+            yield chunk
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent work by key.
+
+    While a computation for a key is running, further callers with the same key
+    wait for it and receive the same result (or exception) instead of starting
+    their own. Once it finishes the key is released, so later callers recompute
+    (or, more usually, hit a cache the computation filled).
+    """
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """
+        Run fn() once for all concurrent callers with the same key
+
+        Args:
+            key (hashable): Identity of the computation
+            fn (callable): Computation to run
+
+        Returns:
+            The result of fn()
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            logger.info(f"Joining in-flight computation for {key[0]}")
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stream(self, key, chunk_iter_fn):
+        """
+        Share one streamed computation between all concurrent readers with the same key
+
+        The stream is produced on a background thread, so a reader that stops early
+        (e.g. a disconnected client) does not cut it short for the others. Readers
+        that join late first replay the chunks produced so far.
+
+        Args:
+            key (hashable): Identity of the computation
+            chunk_iter_fn (callable): Returns an iterator of chunks
+
+        Returns:
+            iterator: Chunks of the shared stream
+        """
+        with self._lock:
+            broadcast = self._streams.get(key)
+            if broadcast is None:
+                broadcast = _Broadcast()
+                self._streams[key] = broadcast
+                self.executions += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if leader:
+            def release():
+                with self._lock:
+                    self._streams.pop(key, None)
+            threading.Thread(target=broadcast.produce, args=(chunk_iter_fn, release),
+                             name='insighta-singleflight', daemon=True).start()
+        else:
+            logger.info(f"Joining in-flight stream for {key[0]}")
+        return iter(broadcast)
+
+    def stats(self):
+        """Return execution/coalescing counters"""
+        with self._lock:
+            return {
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._calls) + len(self._streams)
+            }
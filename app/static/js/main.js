@@ -236,16 +236,21 @@ document.addEventListener('DOMContentLoaded', function() {
         // Set file info - get filename either from the full response or from the session
         const filename = data.filename || document.getElementById('file-input').files[0].name;
         document.getElementById('filename').textContent = filename;
+        showSheetSelector(data.sheets, data.sheet);
         
         if (summary.type === 'dataframe') {
             document.getElementById('filetype').textContent = 'DataFrame';
             
             // Show data stats
-            const statsHtml = `
+            let statsHtml = `
                 <p><strong>Rows:</strong> ${summary.rows}</p>
                 <p><strong>Columns:</strong> ${summary.columns}</p>
                 <p><strong>Column Names:</strong> ${summary.column_names.join(', ')}</p>
             `;
+            if (summary.memory) {
+                const toMB = bytes => (bytes / (1024 * 1024)).toFixed(2);
+                statsHtml += `<p><strong>Memory:</strong> ${toMB(summary.memory.bytes_before)} MB &rarr; ${toMB(summary.memory.bytes_after)} MB</p>`;
+            }
             
             document.getElementById('data-stats').innerHTML = statsHtml;
             
@@ -262,6 +267,48 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
+    function showSheetSelector(sheets, current) {
+        // Workbooks list their sheets; switching converts the chosen sheet on the server
+        const sheetInfo = document.getElementById('sheet-info');
+        const select = document.getElementById('sheet-select');
+        if (!sheets || sheets.length === 0) {
+            sheetInfo.classList.add('hidden');
+            return;
+        }
+        
+        select.innerHTML = '';
+        sheets.forEach(sheet => {
+            const option = document.createElement('option');
+            option.value = sheet.name;
+            option.textContent = sheet.rows ? `${sheet.name} (${sheet.rows} rows)` : sheet.name;
+            option.selected = sheet.name === current;
+            select.appendChild(option);
+        });
+        select.disabled = sheets.length < 2;
+        select.onchange = () => selectSheet(select.value);
+        sheetInfo.classList.remove('hidden');
+    }
+    
+    function selectSheet(sheet) {
+        const select = document.getElementById('sheet-select');
+        select.disabled = true;
+        
+        fetch('/sheet', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ sheet: sheet })
+        })
+        .then(parseJsonResponse)
+        .then(data => {
+            showDataPreview(data);
+            showToast(`Switched to sheet ${data.sheet}`, 'success');
+        })
+        .catch(error => {
+            select.disabled = false;
+            showError(`Error loading sheet: ${error.message}`);
+        });
+    }
+    
     function createTablePreview(data, columns) {
         const table = document.getElementById('preview-table');
         table.innerHTML = '';
@@ -327,54 +374,43 @@ document.addEventListener('DOMContentLoaded', function() {
             requestData.question = question;
         }
         
-        // Send request to generate insights
-        fetch('/analyze', {
+        // Cancel the previous analysis if it is still running
+        if (currentJobId) {
+            fetch(`/jobs/${currentJobId}`, { method: 'DELETE' }).catch(() => {});
+            currentJobId = null;
+        }
+        
+        // Submit the analysis as a background job
+        fetch('/jobs/analyze', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
             },
             body: JSON.stringify(requestData)
         })
-        .then(response => {
-            if (!response.ok) {
-                return response.text().then(text => {
-                    try {
-                        // Try to parse as JSON if possible
-                        const jsonError = JSON.parse(text);
-                        throw new Error(jsonError.error || `Server error: ${response.status}`);
-                    } catch (parseError) {
-                        // If not valid JSON, use the text directly
-                        throw new Error(`Server error: ${response.status} - ${text || 'Unknown error'}`);
-                    }
-                });
-            }
-            
-            // Check content type
-            const contentType = response.headers.get('content-type');
-            
-            if (contentType && contentType.includes('application/json')) {
-                return response.json();
-            } else {
-                return response.text().then(text => {
-                    throw new Error('Server returned an invalid response format');
-                });
+        .then(parseJsonResponse)
+        .then(data => {
+            if (data.error) {
+                throw new Error(data.error);
             }
+            currentJobId = data.job_id;
+            return pollJob(data.job_id);
         })
-        .then(data => {
+        .then(result => {
+            if (!result) {
+                // Superseded by a newer analysis
+                return;
+            }
+            
             // Hide loading indicator
             loadingIndicator.classList.add('hidden');
             insightsDisplay.classList.remove('hidden');
             
-            if (data.error) {
-                showError(data.error);
-                return;
-            }
-            
             // Display insights
-            displayInsights(data.insights);
+            displayInsights(result.insights);
             
             // Generate visualizations
-            generateVisualizations(data.visualizations);
+            generateVisualizations(result.visualizations);
         })
         .catch(error => {
             loadingIndicator.classList.add('hidden');
@@ -383,6 +419,92 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // Id of the analysis job currently shown in the insights section
+    let currentJobId = null;
+    const JOB_POLL_INTERVAL_MS = 500;
+    
+    // Poll a job until it finishes, rendering partial results on the way.
+    // Resolves with the job result, or null if another analysis replaced it.
+    function pollJob(jobId) {
+        const loadingIndicator = document.getElementById('loading-indicator');
+        const insightsDisplay = document.getElementById('insights-display');
+        let renderedVisualizations = false;
+        
+        return new Promise((resolve, reject) => {
+            function poll() {
+                if (jobId !== currentJobId) {
+                    resolve(null);
+                    return;
+                }
+                
+                fetch(`/jobs/${jobId}`)
+                .then(parseJsonResponse)
+                .then(job => {
+                    if (jobId !== currentJobId) {
+                        resolve(null);
+                        return;
+                    }
+                    
+                    const partial = job.partial || {};
+                    if (partial.visualizations && !renderedVisualizations) {
+                        generateVisualizations(partial.visualizations);
+                        renderedVisualizations = true;
+                    }
+                    if (partial.insights) {
+                        loadingIndicator.classList.add('hidden');
+                        insightsDisplay.classList.remove('hidden');
+                        displayInsights(partial.insights);
+                    }
+                    
+                    switch(job.status) {
+                        case 'succeeded':
+                            currentJobId = null;
+                            fetch(`/jobs/${jobId}/result`).then(parseJsonResponse).then(resolve, reject);
+                            break;
+                        case 'failed':
+                            currentJobId = null;
+                            reject(new Error(job.error || 'Analysis failed'));
+                            break;
+                        case 'cancelled':
+                            resolve(null);
+                            break;
+                        default:
+                            setTimeout(poll, JOB_POLL_INTERVAL_MS);
+                    }
+                })
+                .catch(reject);
+            }
+            
+            poll();
+        });
+    }
+    
+    // Parse a JSON response, turning HTTP errors into exceptions
+    function parseJsonResponse(response) {
+        if (!response.ok) {
+            return response.text().then(text => {
+                try {
+                    // Try to parse as JSON if possible
+                    const jsonError = JSON.parse(text);
+                    throw new Error(jsonError.error || `Server error: ${response.status}`);
+                } catch (parseError) {
+                    // If not valid JSON, use the text directly
+                    throw new Error(`Server error: ${response.status} - ${text || 'Unknown error'}`);
+                }
+            });
+        }
+        
+        // Check content type
+        const contentType = response.headers.get('content-type');
+        
+        if (contentType && contentType.includes('application/json')) {
+            return response.json();
+        }
+        return response.text().then(text => {
+            throw new Error('Server returned an invalid response format');
+        });
+    }
+    
     // Handle insight type change
     document.getElementById('insight-type').addEventListener('change', function() {
         generateInsights();
@@ -473,8 +595,9 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
         
-        // Check if vizData has required properties
-        if (!vizData || !vizData.type || !vizData.data || vizData.data.length === 0) {
+        // Check if vizData has required properties (heatmaps carry a matrix instead of records)
+        const records = vizData && (vizData.type === 'heatmap' ? vizData.matrix : vizData.data);
+        if (!vizData || !vizData.type || !records || records.length === 0) {
             containerElement.innerHTML = '<p class="error">Invalid visualization data</p>';
             return;
         }
@@ -497,6 +620,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 case 'heatmap':
                     createHeatmap(vizData, container, width, height);
                     break;
+                case 'line':
+                    createLineChart(vizData, container, width, height);
+                    break;
                 default:
                     container.html(`<p>Unsupported visualization type: ${vizData.type}</p>`);
             }
@@ -570,6 +696,78 @@ document.addEventListener('DOMContentLoaded', function() {
             .text(vizData.y_field);
     }
     
+    function createLineChart(vizData, container, width, height) {
+        // Clear container
+        container.html('');
+        
+        // Define margins
+        const margin = {top: 20, right: 30, bottom: 60, left: 60};
+        const innerWidth = width - margin.left - margin.right;
+        const innerHeight = height - margin.top - margin.bottom;
+        
+        // Bucket labels are ISO dates, months ("2024-03"), quarters ("2024-Q1") or years
+        const parseBucket = label => {
+            const quarter = /^(\d{4})-Q([1-4])$/.exec(label);
+            if (quarter) {
+                return new Date(Number(quarter[1]), (Number(quarter[2]) - 1) * 3, 1);
+            }
+            const parts = /^(\d{4})(?:-(\d{2}))?(?:-(\d{2}))?$/.exec(label);
+            if (parts) {
+                return new Date(Number(parts[1]), parts[2] ? Number(parts[2]) - 1 : 0, parts[3] ? Number(parts[3]) : 1);
+            }
+            return new Date(label);
+        };
+        const points = vizData.data.map(d => ({date: parseBucket(d[vizData.x_field]), value: d[vizData.y_field]}));
+        
+        // Create SVG
+        const svg = container.append('svg')
+            .attr('width', width)
+            .attr('height', height);
+        
+        const g = svg.append('g')
+            .attr('transform', `translate(${margin.left},${margin.top})`);
+        
+        // Define scales
+        const xScale = d3.scaleTime()
+            .domain(d3.extent(points, d => d.date))
+            .range([0, innerWidth]);
+        
+        const yScale = d3.scaleLinear()
+            .domain(d3.extent(points, d => d.value))
+            .nice()
+            .range([innerHeight, 0]);
+        
+        // Draw the series
+        const line = d3.line()
+            .x(d => xScale(d.date))
+            .y(d => yScale(d.value));
+        
+        g.append('path')
+            .datum(points)
+            .attr('fill', 'none')
+            .attr('stroke', '#4361ee')
+            .attr('stroke-width', 1.5)
+            .attr('d', line);
+        
+        // Add axes
+        g.append('g')
+            .attr('transform', `translate(0,${innerHeight})`)
+            .call(d3.axisBottom(xScale).ticks(6))
+            .selectAll('text')
+            .attr('transform', 'rotate(-45)')
+            .style('text-anchor', 'end');
+        
+        g.append('g')
+            .call(d3.axisLeft(yScale).ticks(6, 's'));
+        
+        // Add axis label
+        svg.append('text')
+            .attr('text-anchor', 'middle')
+            .attr('x', width / 2)
+            .attr('y', height - 5)
+            .text(vizData.granularity ? `${vizData.x_field} (per ${vizData.granularity})` : vizData.x_field);
+    }
+    
     function createPieChart(vizData, container, width, height) {
         // Clear container
         container.html('');
@@ -679,18 +877,23 @@ document.addEventListener('DOMContentLoaded', function() {
         const g = svg.append('g')
             .attr('transform', `translate(${margin.left},${margin.top})`);
         
-        // Get unique x and y values
-        const xValues = [...new Set(vizData.data.map(d => d[vizData.x_field]))];
-        const yValues = [...new Set(vizData.data.map(d => d[vizData.y_field]))];
+        // Expand the columnar matrix payload into cells
+        const columns = vizData.columns;
+        const cells = [];
+        vizData.matrix.forEach((row, i) => {
+            row.forEach((value, j) => {
+                cells.push({x: columns[j], y: columns[i], value: value});
+            });
+        });
         
         // Define scales
         const xScale = d3.scaleBand()
-            .domain(xValues)
+            .domain(columns)
             .range([0, innerWidth])
             .padding(0.05);
         
         const yScale = d3.scaleBand()
-            .domain(yValues)
+            .domain(columns)
             .range([0, innerHeight])
             .padding(0.05);
         
@@ -700,26 +903,26 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Create heatmap cells
         g.selectAll('rect')
-            .data(vizData.data)
+            .data(cells)
             .enter().append('rect')
-            .attr('x', d => xScale(d[vizData.x_field]))
-            .attr('y', d => yScale(d[vizData.y_field]))
+            .attr('x', d => xScale(d.x))
+            .attr('y', d => yScale(d.y))
             .attr('width', xScale.bandwidth())
             .attr('height', yScale.bandwidth())
-            .attr('fill', d => colorScale(d[vizData.value_field]))
+            .attr('fill', d => d.value === null ? '#eee' : colorScale(d.value))
             .attr('stroke', 'white')
             .attr('stroke-width', 1);
         
         // Add cell values
         g.selectAll('text')
-            .data(vizData.data)
+            .data(cells)
             .enter().append('text')
-            .attr('x', d => xScale(d[vizData.x_field]) + xScale.bandwidth() / 2)
-            .attr('y', d => yScale(d[vizData.y_field]) + yScale.bandwidth() / 2)
+            .attr('x', d => xScale(d.x) + xScale.bandwidth() / 2)
+            .attr('y', d => yScale(d.y) + yScale.bandwidth() / 2)
             .attr('text-anchor', 'middle')
             .attr('dominant-baseline', 'middle')
-            .attr('fill', d => Math.abs(d[vizData.value_field]) > 0.5 ? 'white' : 'black')
-            .text(d => d[vizData.value_field].toFixed(2));
+            .attr('fill', d => Math.abs(d.value) > 0.5 ? 'white' : 'black')
+            .text(d => d.value === null ? '' : d.value.toFixed(2));
         
         // Add axes
         g.append('g')
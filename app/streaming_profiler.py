@@ -0,0 +1,460 @@
+"""
+Streaming profiler: single-pass, bounded-memory summary of CSV files larger than RAM
+"""
+import logging
+import numpy as np
+import pandas as pd
+from app.dataset_profile import (DatasetProfile, STAT_NAMES, SAMPLE_ROWS, SAMPLE_POOL_ROWS, TOP_K_CATEGORIES,
+                                 HISTOGRAM_COLUMNS, HISTOGRAM_BINS, CORRELATION_MAX_COLUMNS)
+
+logger = logging.getLogger(__name__)
+
+# Rows per chunk handed to pd.read_csv(chunksize=...)
+DEFAULT_CHUNKSIZE = 100_000
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch in the style of KLL.
+
+    Values are kept in levels of sorted buffers; an item at level i stands for 2**i
+    original values. When a level holds more than k items it is sorted and every
+    other item (random offset) is promoted to the next level. Memory is
+    O(k * log(n / k)) and quantiles are exact while fewer than k values were seen.
+    """
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        """Add an array of non-null float values"""
+        values = np.asarray(values, dtype='float64')
+        if values.size == 0:
+            return
+        self.count += values.size
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        """Fold another sketch into this one"""
+        self.count += other.count
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self._compress()
+
+    def quantiles(self, qs):
+        """
+        Estimate quantiles
+
+        Args:
+            qs (list): Quantiles in [0, 1]
+
+        Returns:
+            list: Estimated values (NaN when the sketch is empty)
+        """
+        if self.count == 0:
+            return [np.nan for _ in qs]
+        if len(self.levels) == 1 or all(len(items) == 0 for items in self.levels[1:]):
+            # Nothing compacted yet, so the answer is exact (and interpolated like pandas)
+            return [float(v) for v in np.quantile(self.levels[0], qs)]
+        values, weights = self.weighted_items()
+        order = np.argsort(values, kind='stable')
+        values, cumulative = values[order], np.cumsum(weights[order])
+        targets = np.asarray(qs, dtype='float64') * cumulative[-1]
+        positions = np.minimum(np.searchsorted(cumulative, targets, side='left'), len(values) - 1)
+        return [float(v) for v in values[positions]]
+
+    def weighted_items(self):
+        """Return (values, weights) of all retained items"""
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        return values, weights
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.k:
+                items = np.sort(items)
+                # An odd item out stays behind so total weight is preserved
+                kept = items[-1:] if len(items) % 2 else items[:0]
+                paired = items[:-1] if len(items) % 2 else items
+                promoted = paired[self._rng.integers(2)::2]
+                self.levels[level] = kept
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+
+class DistinctSketch:
+    """
+    HyperLogLog estimate of the number of distinct values in a column.
+
+    Every value is hashed to 64 bits; the first p bits pick one of 2**p registers,
+    which keeps the longest run of leading zeros seen in the remaining bits.
+    Memory is 2**p bytes and the standard error about 1.04 / sqrt(2**p).
+    """
+    def __init__(self, p=14):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype='uint8')
+
+    def update(self, series):
+        """Add the non-null values of a Series"""
+        values = series.dropna()
+        if values.empty:
+            return
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy(dtype='uint64')
+        buckets = (hashes >> np.uint64(64 - self.p)).astype('int64')
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        # frexp returns the bit length exactly: rest has fewer than 53 significant bits
+        _, bit_length = np.frexp(rest.astype('float64'))
+        ranks = (64 - self.p + 1 - bit_length).astype('uint8')
+        np.maximum.at(self.registers, buckets, ranks)
+
+    def estimate(self):
+        """Return the estimated number of distinct values"""
+        m = len(self.registers)
+        raw = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -self.registers.astype('int64')))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is more accurate while many registers are still empty
+            return int(round(m * np.log(m / zeros)))
+        return int(round(raw))
+
+
+class NumericAccumulator:
+    """Exact count/min/max/mean/std (Chan et al. parallel update) plus a quantile sketch"""
+    def __init__(self, sketch_k=200):
+        self.count = 0
+        self.nulls = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.nan
+        self.max = np.nan
+        self.sketch = QuantileSketch(k=sketch_k)
+        self.bin_counts = None
+        self._bin_edges = None
+
+    def update(self, series):
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+        mask = np.isnan(values)
+        self.nulls += int(mask.sum())
+        values = values[~mask]
+        n_b = values.size
+        if n_b == 0:
+            return
+
+        mean_b = float(values.mean())
+        m2_b = float(((values - mean_b) ** 2).sum())
+        n_a = self.count
+        total = n_a + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / total
+        self.m2 += m2_b + delta ** 2 * n_a * n_b / total
+        self.count = total
+        self.min = float(values.min()) if np.isnan(self.min) else min(self.min, float(values.min()))
+        self.max = float(values.max()) if np.isnan(self.max) else max(self.max, float(values.max()))
+        self.sketch.update(values)
+
+    def histogram(self, bins):
+        """
+        Histogram over bins equal-width bins between min and max
+
+        Exact when the values were counted into bin_edges(bins) with count_bins,
+        otherwise approximated from the weighted sketch items and scaled to the
+        exact count.
+
+        Returns:
+            tuple: (counts, bin edges, exact) where counts and edges are like np.histogram
+        """
+        if self.bin_counts is not None:
+            return self.bin_counts, self._bin_edges, True
+        if self.count == 0:
+            counts, edges = np.histogram(np.empty(0), bins=bins)
+            return counts, edges, True
+        values, weights = self.sketch.weighted_items()
+        counts, edges = np.histogram(values, bins=bins, range=(self.min, self.max), weights=weights)
+        counts = np.rint(counts * self.count / weights.sum()).astype('int64')
+        return counts, edges, False
+
+    def bin_edges(self, bins):
+        """Return the edges np.histogram would use for all values seen"""
+        return np.histogram_bin_edges(np.empty(0), bins=bins, range=(self.min, self.max))
+
+    def count_bins(self, series, edges):
+        """Count the non-null values of a Series into fixed bin edges"""
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+        counts, _ = np.histogram(values[~np.isnan(values)], bins=edges)
+        if self.bin_counts is None:
+            self.bin_counts, self._bin_edges = counts, edges
+        else:
+            self.bin_counts = self.bin_counts + counts
+
+    @property
+    def std(self):
+        # Sample standard deviation, matching pandas' ddof=1
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else np.nan
+
+
+class StreamingProfiler:
+    """
+    Builds the data summary of a CSV file in one pass over pd.read_csv(chunksize=...)
+
+    Memory stays bounded by the chunk size, the sketches and the reservoir sample,
+    regardless of the number of rows in the file.
+    """
+    def __init__(self, sample_size=SAMPLE_POOL_ROWS, sketch_k=200, max_tracked_categories=1000, seed=None):
+        self.sample_size = sample_size
+        self.sketch_k = sketch_k
+        self.rows = 0
+        self.column_names = None
+        self.dtypes = {}
+        self.numeric = {}
+        self.categories = {}  # column -> value counts Series
+        self.distinct = {}  # column -> DistinctSketch of all its values
+        self._capped = set()  # columns whose value counts were truncated
+        self.null_counts = {}
+        self.max_tracked_categories = max_tracked_categories
+        self._cov_columns = None
+        self._cov_count = 0
+        self._cov_mean = None
+        self._comoment = None
+        self._reservoir = []  # (row number, record) pairs
+        self._rng = np.random.default_rng(seed)
+
+    def profile_file(self, file_path, chunksize=DEFAULT_CHUNKSIZE, **read_csv_kwargs):
+        """
+        Stream a CSV file through the profiler
+
+        Histogram bins depend on the final min and max, so the charted columns are
+        counted exactly in a second pass that only converts those columns.
+
+        Args:
+            file_path (str): Path to the CSV file
+            chunksize (int): Rows per chunk
+            **read_csv_kwargs: Dialect arguments for pd.read_csv
+
+        Returns:
+            StreamingProfiler: self
+        """
+        with pd.read_csv(file_path, chunksize=chunksize, **read_csv_kwargs) as reader:
+            for chunk in reader:
+                self.update(chunk)
+        logger.info(f"Streamed {self.rows} rows of {file_path}")
+        self.count_histograms(file_path, chunksize=chunksize, **read_csv_kwargs)
+        return self
+
+    def count_histograms(self, file_path, chunksize=DEFAULT_CHUNKSIZE, **read_csv_kwargs):
+        """
+        Count the histogram columns of a profiled file exactly into their final bins
+
+        On failure the histograms stay approximate and are flagged as such.
+
+        Args:
+            file_path (str): Path to the CSV file profiled with update()
+            chunksize (int): Rows per chunk
+            **read_csv_kwargs: Dialect arguments for pd.read_csv
+        """
+        columns = [col for col in self.numeric_columns()[:HISTOGRAM_COLUMNS] if self.numeric[col].count]
+        if not columns:
+            return
+        edges = {col: self.numeric[col].bin_edges(HISTOGRAM_BINS) for col in columns}
+        try:
+            with pd.read_csv(file_path, chunksize=chunksize, usecols=columns, **read_csv_kwargs) as reader:
+                for chunk in reader:
+                    for col in columns:
+                        self.numeric[col].count_bins(chunk[col], edges[col])
+        except (ValueError, pd.errors.ParserError) as e:
+            logger.warning(f"Histograms of {file_path} stay approximate: {str(e)}")
+            for col in columns:
+                self.numeric[col].bin_counts = None
+
+    def update(self, chunk):
+        """Fold one DataFrame chunk into the profile"""
+        if self.column_names is None:
+            self.column_names = chunk.columns.tolist()
+
+        for col, dtype in chunk.dtypes.items():
+            merged = _merge_dtype(self.dtypes.get(col), dtype)
+            self.dtypes[col] = merged
+            if _is_numeric(merged):
+                self.numeric.setdefault(col, NumericAccumulator(sketch_k=self.sketch_k)).update(chunk[col])
+            else:
+                # A column that turns out to hold text is no longer summarized numerically
+                self.numeric.pop(col, None)
+                if merged == np.dtype('object'):
+                    self._update_categories(col, chunk[col])
+
+        for col, n in chunk.isna().sum().items():
+            self.null_counts[col] = self.null_counts.get(col, 0) + int(n)
+        self._update_comoments(chunk)
+        self._update_reservoir(chunk)
+        self.rows += len(chunk)
+
+    def to_profile(self):
+        """
+        Turn the accumulated state into a DatasetProfile
+
+        Returns:
+            DatasetProfile: Profile with exact moments and approximate quantiles,
+                correlation and category counts; histograms are exact after
+                count_histograms and approximate otherwise
+        """
+        numeric_cols = self.numeric_columns()
+        stats = pd.DataFrame(index=STAT_NAMES, columns=numeric_cols, dtype='float64')
+        histograms = {}
+        approximate_histograms = False
+        for col in numeric_cols:
+            acc = self.numeric[col]
+            q25, q50, q75 = acc.sketch.quantiles([0.25, 0.5, 0.75])
+            stats[col] = [acc.count, acc.mean if acc.count else np.nan, acc.std, acc.min, q25, q50, q75, acc.max]
+        for col in numeric_cols[:HISTOGRAM_COLUMNS]:
+            counts, edges, exact = self.numeric[col].histogram(HISTOGRAM_BINS)
+            histograms[col] = (counts, edges)
+            approximate_histograms = approximate_histograms or not exact
+
+        correlation = None
+        cov_cols = [col for col in self._cov_columns if col in self.numeric]
+        if len(cov_cols) >= 2 and self._cov_count > 1:
+            keep = [self._cov_columns.index(col) for col in cov_cols]
+            comoment = self._comoment[np.ix_(keep, keep)]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                scale = np.sqrt(np.diag(comoment))
+                corr = comoment / np.outer(scale, scale)
+            correlation = pd.DataFrame(corr, index=cov_cols, columns=cov_cols)
+
+        top_categories = {}
+        for col in self.column_names or []:
+            counts = self.categories.get(col)
+            if counts is None or self.dtypes.get(col) != np.dtype('object'):
+                continue
+            counts = counts.sort_values(ascending=False, kind='stable')
+            top_categories[col] = {
+                'values': list(zip(counts.index[:TOP_K_CATEGORIES].tolist(),
+                                   counts.to_numpy()[:TOP_K_CATEGORIES].astype('int64').tolist())),
+                'unique': int(len(counts))
+            }
+            if col in self._capped:
+                # Only the most frequent values were kept, so their number is a lower bound
+                non_null = self.rows - self.null_counts.get(col, 0)
+                estimate = min(self.distinct[col].estimate(), non_null)
+                top_categories[col]['unique'] = int(max(len(counts), estimate))
+                top_categories[col]['approximate_unique'] = True
+
+        return DatasetProfile(
+            rows=self.rows,
+            column_names=list(self.column_names or []),
+            dtypes={col: str(dtype) for col, dtype in self.dtypes.items()},
+            sample=self.sample_frame().head(SAMPLE_ROWS),
+            stats=stats,
+            null_counts=dict(self.null_counts),
+            histograms=histograms,
+            correlation=correlation,
+            top_categories=top_categories,
+            approximate=True,
+            approximate_histograms=approximate_histograms,
+            sample_pool=self.sample_frame()
+        )
+
+    def numeric_columns(self):
+        """Return numeric column names in file order"""
+        return [col for col in (self.column_names or []) if col in self.numeric]
+
+    def sample_frame(self):
+        """Return the reservoir sample as a DataFrame in file order"""
+        records = [record for _, record in sorted(self._reservoir, key=lambda item: item[0])]
+        return pd.DataFrame(records, columns=self.column_names)
+
+    def _update_categories(self, col, series):
+        """
+        Merge value counts, keeping only the most frequent values once the cap is reached
+
+        Every value also goes into a DistinctSketch, which provides the number of
+        distinct values once the counts were truncated.
+        """
+        try:
+            chunk_counts = series.value_counts()
+            self.distinct.setdefault(col, DistinctSketch()).update(series)
+        except TypeError:
+            return
+        counts = self.categories.get(col)
+        counts = chunk_counts if counts is None else counts.add(chunk_counts, fill_value=0)
+        if len(counts) > self.max_tracked_categories:
+            counts = counts.nlargest(self.max_tracked_categories)
+            self._capped.add(col)
+        self.categories[col] = counts
+
+    def _update_comoments(self, chunk):
+        """Merge the co-moment matrix of complete numeric rows (Chan et al. update)"""
+        if self._cov_columns is None:
+            self._cov_columns = self.numeric_columns()[:CORRELATION_MAX_COLUMNS]
+        cols = [col for col in self._cov_columns if col in self.numeric]
+        if len(cols) < 2:
+            return
+        if len(cols) < len(self._cov_columns):
+            # Nothing is accumulated yet until a complete numeric row has been seen
+            if self._cov_count:
+                keep = [self._cov_columns.index(col) for col in cols]
+                self._cov_mean = self._cov_mean[keep]
+                self._comoment = self._comoment[np.ix_(keep, keep)]
+            self._cov_columns = cols
+
+        values = chunk[cols].to_numpy(dtype='float64', na_value=np.nan)
+        values = values[~np.isnan(values).any(axis=1)]
+        n_b = len(values)
+        if n_b == 0:
+            return
+        mean_b = values.mean(axis=0)
+        centered = values - mean_b
+        comoment_b = centered.T @ centered
+        if self._cov_count == 0:
+            self._cov_count, self._cov_mean, self._comoment = n_b, mean_b, comoment_b
+            return
+        n_a = self._cov_count
+        total = n_a + n_b
+        delta = mean_b - self._cov_mean
+        self._comoment = self._comoment + comoment_b + np.outer(delta, delta) * n_a * n_b / total
+        self._cov_mean = self._cov_mean + delta * n_b / total
+        self._cov_count = total
+
+    def _update_reservoir(self, chunk):
+        """Algorithm R, vectorized over the rows of a chunk"""
+        positions = np.arange(self.rows, self.rows + len(chunk))
+        fill = max(0, min(self.sample_size - len(self._reservoir), len(chunk)))
+        for offset in range(fill):
+            self._reservoir.append((int(positions[offset]), _record(chunk, offset)))
+
+        rest = positions[fill:]
+        if rest.size == 0:
+            return
+        slots = self._rng.integers(0, rest + 1)
+        chosen = np.nonzero(slots < self.sample_size)[0]
+        # Later rows overwrite earlier ones, so only the last hit per slot matters
+        last_hit = {}
+        for i in chosen:
+            last_hit[int(slots[i])] = i
+        for slot, i in last_hit.items():
+            self._reservoir[slot] = (int(rest[i]), _record(chunk, fill + i))
+
+
+def _record(chunk, offset):
+    return {col: (None if pd.isna(value) else value) for col, value in chunk.iloc[offset].items()}
+
+
+def _is_numeric(dtype):
+    # Same semantics as select_dtypes(include=['number']): booleans are not numeric
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+def _merge_dtype(previous, current):
+    """Combine the dtypes pandas inferred for the same column in different chunks"""
+    if previous is None or previous == current:
+        return current
+    if _is_numeric(previous) and _is_numeric(current):
+        return np.dtype('float64')
+    return np.dtype('object')
@@ -0,0 +1,471 @@
+"""
+TimeSeries: date-bucketed aggregates of the numeric columns, downsampled trend lines and period-over-period tables
+"""
+import re
+import warnings
+import logging
+import numpy as np
+import pandas as pd
+from app.aggregate_cube import CubeTable
+from app.dtype_optimizer import parse_dates
+
+logger = logging.getLogger(__name__)
+
+# Bucket granularities from finest to coarsest: (name, numpy datetime unit, approximate seconds).
+# Each bucket lies inside one bucket of every coarser granularity, so buckets can be
+# merged into coarser ones without going back to the data
+GRANULARITIES = [
+    ('second', 's', 1),
+    ('minute', 'm', 60),
+    ('hour', 'h', 3600),
+    ('day', 'D', 86400),
+    ('month', 'M', 30.436875 * 86400),
+    ('quarter', 'Q', 91.310625 * 86400),
+    ('year', 'Y', 365.2425 * 86400)
+]
+
+# Buckets are as fine as possible while the series has at most this many
+MAX_BUCKETS = 10_000
+
+# Points per line chart after downsampling
+POINT_BUDGET = 200
+
+# Period-over-period tables use the finest granularity with at most this many periods,
+# and show the most recent REPORT_PERIODS of them
+MAX_REPORT_PERIODS = 24
+REPORT_PERIODS = 12
+
+# Column-name words of per-row levels, which are averaged, and of additive
+# quantities, which are totalled per period (see TimeSeries.aggregations)
+AVERAGED_WORDS = {'age', 'avg', 'average', 'index', 'lat', 'latitude', 'level', 'lon', 'longitude', 'margin',
+                  'mean', 'pct', 'percent', 'percentage', 'price', 'probability', 'rate', 'ratio', 'rating',
+                  'satisfaction', 'score', 'share', 'temp', 'temperature'}
+TOTALLED_WORDS = {'amount', 'clicks', 'cost', 'costs', 'count', 'expense', 'expenses', 'income', 'orders',
+                  'profit', 'qty', 'quantity', 'revenue', 'sales', 'sessions', 'sold', 'spend', 'total',
+                  'units', 'views', 'visits', 'volume'}
+
+MAX_MEASURES = 10
+CHART_MEASURES = 3
+REPORT_MEASURES = 4
+
+
+def detect_date_column(profile):
+    """
+    Find the column that dates the rows
+
+    Args:
+        profile (DatasetProfile): Profile of the data
+
+    Returns:
+        str: The first datetime column, else the first text column whose sampled
+            values parse as dates, else None
+    """
+    for col in profile.column_names:
+        if profile.dtypes.get(col, '').startswith('datetime') and col in profile.date_ranges:
+            return col
+    for col in profile.column_names:
+        if profile.dtypes.get(col) == 'object' and col in profile.sample_pool.columns:
+            if parse_dates(profile.sample_pool[col]) is not None:
+                return col
+    return None
+
+
+def choose_granularity(first, last, max_buckets=MAX_BUCKETS):
+    """
+    Pick the finest granularity that splits a time span into at most max_buckets buckets
+
+    Args:
+        first (Timestamp): Earliest date
+        last (Timestamp): Latest date
+        max_buckets (int): Bucket limit
+
+    Returns:
+        int: Index into GRANULARITIES
+    """
+    span = max((last - first).total_seconds(), 0)
+    for index, (_, _, seconds) in enumerate(GRANULARITIES):
+        if span / seconds < max_buckets:
+            return index
+    return len(GRANULARITIES) - 1
+
+
+# Index of the day granularity: dates without a time of day are never bucketed finer
+DAY = [name for name, _, _ in GRANULARITIES].index('day')
+
+
+def date_resolution(values):
+    """
+    Find how precisely dates are recorded
+
+    Args:
+        values (ndarray): datetime64 values (no NaT)
+
+    Returns:
+        int: Index into GRANULARITIES of the coarsest granularity, up to a day,
+            whose bucket starts include every value (DAY for date-only values)
+    """
+    for index in range(DAY, 0, -1):
+        if (bucket_dates(values, index) == values).all():
+            return index
+    return 0
+
+
+def bucket_dates(values, granularity):
+    """
+    Truncate datetime64 values to the start of their bucket
+
+    Args:
+        values (ndarray): datetime64 values (NaT allowed)
+        granularity (int): Index into GRANULARITIES
+
+    Returns:
+        ndarray: datetime64[ns] bucket starts
+    """
+    unit = GRANULARITIES[granularity][1]
+    if unit == 'Q':
+        months = values.astype('datetime64[M]').astype('int64')
+        # NaT stays NaT: its integer value is the minimum int64, which // 3 * 3 would change
+        quarters = np.where(np.isnat(values), months, months // 3 * 3)
+        return quarters.astype('datetime64[M]').astype('datetime64[ns]')
+    return values.astype(f'datetime64[{unit}]').astype('datetime64[ns]')
+
+
+def to_datetimes(series):
+    """Parse a column as naive datetime64 values (UTC for time-zone aware input); unparsable values become NaT"""
+    if not pd.api.types.is_datetime64_any_dtype(series.dtype):
+        with warnings.catch_warnings():
+            # Format inference warns when it falls back to parsing each value separately
+            warnings.simplefilter('ignore', category=UserWarning)
+            parsed = pd.to_datetime(series, errors='coerce')
+            if not pd.api.types.is_datetime64_any_dtype(parsed.dtype):
+                # Mixed time-zone offsets only parse as UTC
+                parsed = pd.to_datetime(series, errors='coerce', utc=True)
+        series = parsed
+    if getattr(series.dt, 'tz', None) is not None:
+        series = series.dt.tz_convert(None)
+    return series.to_numpy(dtype='datetime64[ns]')
+
+
+class TimeSeriesBuilder:
+    """
+    Accumulate date-bucketed aggregates over one or more chunks of data.
+
+    Buckets start as fine as the dates seen so far allow (never finer than the
+    dates are recorded) and are merged into coarser ones as the span grows, so a large file is aggregated in one pass
+    without knowing its date range in advance.
+    """
+    def __init__(self, date_column, measures):
+        """
+        Args:
+            date_column (str): Column holding the dates
+            measures (list): Numeric columns to aggregate
+        """
+        self.date_column = date_column
+        self.measures = list(measures)
+        self.granularity = 0
+        self.resolution = None
+        self.first = None
+        self.last = None
+        self.table = None
+        self.rows = 0
+        self.undated = 0
+
+    def update(self, chunk):
+        """Fold one DataFrame chunk (holding the date column and the measures) into the series"""
+        dates = to_datetimes(chunk[self.date_column])
+        valid = ~np.isnat(dates)
+        self.rows += len(chunk)
+        self.undated += int((~valid).sum())
+        if not valid.any():
+            return
+        first, last = pd.Timestamp(dates[valid].min()), pd.Timestamp(dates[valid].max())
+        self.first = first if self.first is None else min(self.first, first)
+        self.last = last if self.last is None else max(self.last, last)
+
+        # Buckets finer than the dates themselves (e.g. hours of date-only values) would
+        # only mislabel the series; the first chunk settles the resolution in practice,
+        # since buckets can be merged later but never split
+        resolution = date_resolution(dates[valid])
+        self.resolution = resolution if self.resolution is None else min(self.resolution, resolution)
+        granularity = max(self.granularity, self.resolution, choose_granularity(self.first, self.last))
+        if self.table is not None and granularity > self.granularity:
+            self.table = rebucket(self.table, granularity)
+        self.granularity = granularity
+
+        frame = chunk.loc[valid, self.measures].assign(_bucket=bucket_dates(dates[valid], granularity))
+        table = CubeTable.from_frame(frame, ('_bucket',), self.measures)
+        self.table = table if self.table is None else self.table.merge(table)
+
+    def result(self):
+        """
+        Returns:
+            TimeSeries: The accumulated series, or None if no row had a date
+        """
+        if self.table is None:
+            return None
+        logger.info(f"Built time series of {self.date_column}: {self.table.cells} "
+                    f"{GRANULARITIES[self.granularity][0]} buckets from {self.rows} rows")
+        return TimeSeries(self.date_column, self.measures, self.granularity, _sorted(self.table),
+                          self.rows, self.undated)
+
+
+def rebucket(table, granularity):
+    """Merge the buckets of a one-dimension CubeTable into coarser buckets"""
+    starts = bucket_dates(table.rows.index.to_numpy(dtype='datetime64[ns]'), granularity)
+    return table.map_keys(pd.Index(starts, name=table.rows.index.name))
+
+
+def _sorted(table):
+    order = np.argsort(table.rows.index.to_numpy(dtype='datetime64[ns]'), kind='stable')
+    return CubeTable(table.dimensions, table.rows.iloc[order], table.sums.iloc[order],
+                     table.counts.iloc[order], table.mins.iloc[order], table.maxs.iloc[order])
+
+
+class TimeSeries:
+    """
+    Numeric columns aggregated per date bucket.
+
+    Holds one row count and the sum, count, min and max of every measure per
+    bucket, which is enough for trend charts at any coarser granularity and for
+    period-over-period comparisons.
+    """
+    def __init__(self, date_column, measures, granularity, table, rows, undated=0):
+        """
+        Args:
+            date_column (str): Column holding the dates
+            measures (list): Aggregated numeric columns
+            granularity (int): Index into GRANULARITIES of the buckets
+            table (CubeTable): Aggregates indexed by bucket start, in date order
+            rows (int): Rows read
+            undated (int): Rows whose date was missing or unparsable
+        """
+        self.date_column = date_column
+        self.measures = list(measures)
+        self.granularity = granularity
+        self.table = table
+        self.rows = rows
+        self.undated = undated
+
+    @classmethod
+    def from_chunks(cls, chunks, date_column, measures):
+        """Build the series in one pass over DataFrame chunks"""
+        builder = TimeSeriesBuilder(date_column, measures)
+        for chunk in chunks:
+            builder.update(chunk)
+        return builder.result()
+
+    @property
+    def granularity_name(self):
+        return GRANULARITIES[self.granularity][0]
+
+    @property
+    def nbytes(self):
+        """Rough resident size, used to budget the cache"""
+        return self.table.nbytes + 1024
+
+    def aggregations(self, measure):
+        """
+        Decide how a measure is summed up per period
+
+        Only additive quantities are totalled: counts and amounts such as revenue,
+        units or costs. Prices, rates, scores and other per-row levels are
+        averaged, since their sum means nothing. A measure whose name gives no hint
+        is totalled when it holds whole, non-negative numbers (a count) and is
+        otherwise reported both ways.
+
+        Returns:
+            tuple: ('total',), ('average',) or ('total', 'average')
+        """
+        words = set(re.findall(r'[a-z]+', re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', str(measure)).lower()))
+        if words & AVERAGED_WORDS:
+            return ('average',)
+        if words & TOTALLED_WORDS:
+            return ('total',)
+        values = np.concatenate([self.table.mins[measure].to_numpy(dtype='float64', na_value=np.nan),
+                                 self.table.maxs[measure].to_numpy(dtype='float64', na_value=np.nan)])
+        values = values[~np.isnan(values)]
+        if (values >= 0).all() and (values == np.round(values)).all():
+            return ('total',)
+        return ('total', 'average')
+
+    def values(self, measure, aggregation, table=None):
+        """
+        Per-bucket totals or averages of a measure
+
+        Args:
+            measure (str): Measure column
+            aggregation (str): 'total' or 'average'
+            table (CubeTable, optional): Buckets to use; defaults to the series' own
+
+        Returns:
+            ndarray: One value per bucket (NaN where the measure is missing)
+        """
+        table = self.table if table is None else table
+        sums = table.sums[measure].to_numpy(dtype='float64', na_value=np.nan)
+        if aggregation == 'total':
+            return sums
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return sums / table.counts[measure].to_numpy(dtype='float64')
+
+    def visualizations(self, point_budget=POINT_BUDGET):
+        """
+        Build line chart payloads: rows per bucket and the first measures, each
+        downsampled with LTTB to at most point_budget points
+
+        Returns:
+            list: Visualization data objects
+        """
+        dates = self.table.rows.index.to_numpy(dtype='datetime64[ns]')
+        x = dates.astype('int64').astype('float64')
+        unit = self.granularity_name
+        series = [(f'Rows per {unit}', self.table.rows.to_numpy(dtype='float64'))]
+        for measure in self.measures[:CHART_MEASURES]:
+            # One line per measure: the average unless the measure is known to add up
+            aggregations = self.aggregations(measure)
+            aggregation = aggregations[0] if len(aggregations) == 1 else 'average'
+            series.append((f"{aggregation.capitalize()} {measure} per {unit}", self.values(measure, aggregation)))
+
+        visualizations = []
+        for title, values in series:
+            present = np.flatnonzero(~np.isnan(values))
+            if len(present) < 2:
+                continue
+            keep = present[lttb(x[present], values[present], point_budget)]
+            visualizations.append({
+                'type': 'line',
+                'title': title,
+                'data': [{'date': _format_bucket(date, self.granularity), 'value': float(f"{value:.6g}")}
+                         for date, value in zip(dates[keep], values[keep])],
+                'x_field': 'date',
+                'y_field': 'value',
+                'granularity': unit,
+                'buckets': int(len(present))
+            })
+        return visualizations
+
+    def period_table(self, max_periods=MAX_REPORT_PERIODS, periods=REPORT_PERIODS):
+        """
+        Aggregate the most recent periods with their change over the previous period
+
+        Args:
+            max_periods (int): The report granularity is the finest with at most this many periods
+            periods (int): Number of most recent periods shown
+
+        Returns:
+            DataFrame: One row per period with the row count and, per measure, its
+                total and/or average (see aggregations) and percent change; attrs['granularity'] is the
+                index into GRANULARITIES of the periods
+        """
+        granularity = self.granularity
+        table = self.table
+        while granularity < len(GRANULARITIES) - 1 and table.cells > max_periods:
+            granularity += 1
+            table = _sorted(rebucket(table, granularity))
+
+        dates = table.rows.index.to_numpy(dtype='datetime64[ns]')
+        report = pd.DataFrame({'period': [_format_bucket(date, granularity) for date in dates],
+                               'rows': table.rows.to_numpy(dtype='int64')})
+        for measure in self.measures[:REPORT_MEASURES]:
+            aggregations = self.aggregations(measure)
+            for aggregation in aggregations:
+                values = self.values(measure, aggregation, table)
+                previous = np.concatenate([[np.nan], values[:-1]])
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    change = np.where(previous != 0, (values - previous) / np.abs(previous) * 100, np.nan)
+                report[f"{measure} {aggregation}"] = np.round(values, 4)
+                label = f"{measure} {aggregation} change %" if len(aggregations) > 1 else f"{measure} change %"
+                report[label] = np.round(change, 1)
+        report.attrs['granularity'] = granularity
+        return report.tail(periods).reset_index(drop=True)
+
+    def describe_periods(self, max_chars):
+        """
+        Render the period-over-period table as prompt text
+
+        Args:
+            max_chars (int): Maximum length of the returned text; older periods are dropped to fit
+
+        Returns:
+            str: Table text, empty if there are fewer than two periods or it does not fit
+        """
+        report = self.period_table()
+        if len(report) < 2:
+            return ''
+        report_granularity = report.attrs['granularity']
+        granularity = GRANULARITIES[report_granularity][0]
+        first, last = self.table.rows.index[0], self.table.rows.index[-1]
+        last_period = bucket_dates(np.array([last], dtype='datetime64[ns]'), report_granularity)[0]
+        note = ''
+        if _next_bucket(last, self.granularity) < _next_bucket(last_period, report_granularity):
+            note = f"; the last {granularity} is partial"
+        while len(report) >= 2:
+            header = (f"Period-over-period aggregates by {granularity} of {self.date_column} "
+                      f"({_format_bucket(first, self.granularity)} to {_format_bucket(last, self.granularity)}, "
+                      f"most recent {len(report)} {granularity}s; change % is versus the previous {granularity}{note}):")
+            text = f"{header}\n{report.to_string(index=False, float_format=_format_value)}"
+            if len(text) <= max_chars:
+                return text
+            report = report.iloc[1:]
+        return ''
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling
+
+    Keeps the first and last points and, from each of threshold - 2 equal buckets
+    in between, the point forming the largest triangle with the point kept from the
+    previous bucket and the average of the next bucket. Peaks and troughs survive,
+    unlike with every-nth-point or bucket-average sampling.
+
+    Args:
+        x (ndarray): Increasing x values
+        y (ndarray): y values (no NaN)
+        threshold (int): Number of points to keep
+
+    Returns:
+        ndarray: Indices of the kept points, increasing
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(int)
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        following_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:following_end].mean()
+        avg_y = y[end:following_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def _next_bucket(start, granularity):
+    """Start of the bucket after the one starting at start"""
+    unit = GRANULARITIES[granularity][1]
+    if unit == 'Q':
+        return np.datetime64(start, 'M') + 3
+    return np.datetime64(start, unit) + 1
+
+
+def _format_value(value):
+    return f"{value:,.0f}" if abs(value) >= 1000 else f"{value:.4g}"
+
+
+def _format_bucket(date, granularity):
+    stamp = pd.Timestamp(date)
+    name = GRANULARITIES[granularity][0]
+    if name == 'year':
+        return f"{stamp.year}"
+    if name == 'quarter':
+        return f"{stamp.year}-Q{(stamp.month - 1) // 3 + 1}"
+    if name == 'month':
+        return stamp.strftime('%Y-%m')
+    if name == 'day':
+        return stamp.strftime('%Y-%m-%d')
+    return stamp.isoformat()
@@ -0,0 +1,186 @@
+"""
+UploadProfiler: profile a CSV upload incrementally while its bytes arrive
+"""
+import io
+import queue
+import logging
+import threading
+import pandas as pd
+from app.csv_sniffer import SNIFF_BYTES, sniff_csv_prefix
+from app.streaming_profiler import StreamingProfiler
+
+logger = logging.getLogger(__name__)
+
+# Bytes of complete records parsed per batch
+BATCH_BYTES = 8 * 1024 * 1024
+
+# Batches waiting for the parser thread; the upload blocks when parsing falls this far behind
+QUEUE_BATCHES = 4
+
+# Give up when this many batches arrive without a record boundary (e.g. an unbalanced quote)
+MAX_PENDING_BATCHES = 4
+
+
+class UploadProfiler:
+    """
+    Incremental CSV profiler fed with the raw bytes of an upload.
+
+    The dialect is sniffed from the first bytes. The stream is then cut at record
+    boundaries (newlines outside quotes) into batches, which a worker thread parses
+    with pd.read_csv and folds into a StreamingProfiler. Parsing overlaps with
+    receiving the upload, so the profile is ready right after the last byte
+    arrives instead of after a second pass over the stored file.
+
+    Any problem (UTF-16 input, bytes that do not decode, ragged rows) only disables
+    the profiler; the upload itself is unaffected and the file is then profiled
+    from disk as before.
+    """
+    def __init__(self, batch_bytes=BATCH_BYTES):
+        self.batch_bytes = batch_bytes
+        self.profiler = StreamingProfiler()
+        self.failed = False
+        self._dialect = None
+        self._quote = None
+        self._header = b''  # header record prepended to every batch
+        self._pending = bytearray()
+        self._queue = queue.Queue(maxsize=QUEUE_BATCHES)
+        self._batches = 0
+        self._worker = None
+        self._closed = False
+
+    def feed(self, data):
+        """Add the next block of the upload; never raises"""
+        if self.failed or self._closed:
+            return
+        self._pending += data
+        try:
+            if self._dialect is None:
+                if len(self._pending) < SNIFF_BYTES:
+                    return
+                self._start(complete=False)
+            if len(self._pending) >= self.batch_bytes:
+                self._flush(final=False)
+        except Exception as e:
+            self._fail(e)
+
+    def finish(self):
+        """
+        Parse the remaining bytes and wait for the parser thread
+
+        Returns:
+            DatasetProfile: Profile of the uploaded CSV, or None if it could not be
+                profiled while streaming
+        """
+        if not self.failed and not self._closed:
+            try:
+                if self._dialect is None:
+                    self._start(complete=True)
+                self._flush(final=True)
+            except Exception as e:
+                self._fail(e)
+        self.close()
+        if self.failed:
+            return None
+        logger.info(f"Profiled {self.profiler.rows} rows while the upload streamed")
+        return self.profiler.to_profile()
+
+    def close(self):
+        """Stop the parser thread; batches not yet parsed are dropped"""
+        if self._closed:
+            return
+        self._closed = True
+        self._pending = bytearray()
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join()
+
+    def _start(self, complete):
+        dialect = sniff_csv_prefix(bytes(self._pending[:SNIFF_BYTES]), complete=complete)
+        if dialect['encoding'] == 'utf-16':
+            # Newline and quote bytes cannot be found without decoding
+            raise ValueError("UTF-16 uploads are profiled after they are stored")
+        self._quote = dialect['quotechar'].encode(dialect['encoding'])
+        if dialect['header'] == 0:
+            end = _record_end(self._pending, self._quote, first=True)
+            if not end:
+                end = len(self._pending) if complete else 0
+            if not end:
+                raise ValueError("Header record is longer than the sniffed prefix")
+            self._header = bytes(self._pending[:end])
+            del self._pending[:end]
+        self._dialect = dialect
+        self._worker = threading.Thread(target=self._run, name='insighta-upload-profiler', daemon=True)
+        self._worker.start()
+
+    def _flush(self, final):
+        if final:
+            if self._batches and not self._pending.strip():
+                return
+            end = len(self._pending)
+        else:
+            end = _record_end(self._pending, self._quote)
+            if not end:
+                if len(self._pending) > MAX_PENDING_BATCHES * self.batch_bytes:
+                    raise ValueError("No record boundary found; the CSV may have an unbalanced quote")
+                return
+        batch = self._header + bytes(self._pending[:end])
+        del self._pending[:end]
+        self._queue.put(batch)
+        self._batches += 1
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            if self.failed:
+                # Keep draining so feed() never blocks on a full queue
+                continue
+            try:
+                chunk = pd.read_csv(io.BytesIO(batch), engine='c', **self._dialect)
+                if len(chunk) or self.profiler.column_names is None:
+                    # A header-only upload still reports its columns
+                    self.profiler.update(chunk)
+            except Exception as e:
+                self._fail(e)
+
+    def _fail(self, error):
+        if not self.failed:
+            logger.info(f"Upload will be profiled after it is stored: {str(error)}")
+        self.failed = True
+        self._pending = bytearray()
+
+
+def _record_end(buffer, quote, first=False):
+    """
+    Return the index just past the last (or first) complete record in buffer
+
+    The buffer starts at a record boundary, so a newline ends a record when an
+    even number of quote characters precede it. Doubled quotes inside fields
+    keep the count even.
+
+    Returns:
+        int: End offset, or 0 when the buffer holds no complete record
+    """
+    if first:
+        start, quotes = 0, 0
+        position = buffer.find(b'\n')
+        while position != -1:
+            quotes += buffer.count(quote, start, position)
+            if quotes % 2 == 0:
+                return position + 1
+            start = position
+            position = buffer.find(b'\n', position + 1)
+        return 0
+
+    position = buffer.rfind(b'\n')
+    if position == -1:
+        return 0
+    quotes = buffer.count(quote, 0, position)
+    while quotes % 2:
+        previous = buffer.rfind(b'\n', 0, position)
+        if previous == -1:
+            return 0
+        quotes -= buffer.count(quote, previous, position)
+        position = previous
+    return position + 1
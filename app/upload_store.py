@@ -0,0 +1,275 @@
+"""
+UploadStore: content-addressed upload storage with deduplication and a disk quota janitor
+"""
+import os
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUOTA_BYTES = 5 * 1024 * 1024 * 1024
+DEFAULT_JANITOR_INTERVAL_SECONDS = 5 * 60
+
+# Files used this recently are never evicted, so an upload survives until it is analysed
+# (and other worker processes, whose references this process cannot see, are covered)
+EVICTION_GRACE_SECONDS = 10 * 60
+
+TEMP_PREFIX = '.upload-'
+
+# Temporary files this old were left behind by a crashed process
+STALE_TEMP_SECONDS = 24 * 60 * 60
+
+# Artifacts derived from an upload that are removed together with it
+# (its columnar copy and the converted sheets of a workbook)
+DERIVED_SUFFIXES = ('.columnar', '.sheets')
+
+
+class HashingFile:
+    """
+    Temporary file that hashes everything written to it.
+
+    Handed to werkzeug as the destination of an uploaded file, so the upload is
+    hashed while it streams to disk instead of being read again afterwards. An
+    optional profiler (see upload_profiler) receives the same bytes.
+    """
+    def __init__(self, directory, profiler=None):
+        fd, self.path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=directory)
+        self._file = os.fdopen(fd, 'w+b')
+        self._digest = hashlib.sha256()
+        self.profiler = profiler
+        self.size = 0
+        self.committed = False
+
+    def write(self, data):
+        self._digest.update(data)
+        self.size += len(data)
+        if self.profiler is not None:
+            self.profiler.feed(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def close(self):
+        self._file.close()
+        if self.profiler is not None:
+            self.profiler.close()
+        if not self.committed:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def __getattr__(self, name):
+        # read/seek/tell/flush etc. go to the underlying file
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+
+class UploadStore:
+    """
+    Stores uploads under the SHA-256 of their content.
+
+    Uploading a file that is already stored reuses the stored copy, and with it
+    everything keyed by that path or hash: parsed datasets, profiles, columnar
+    copies and cached LLM responses. A janitor thread keeps the directory within
+    a disk quota by deleting least recently used files that are not in use.
+    """
+    def __init__(self, root, quota_bytes=None, janitor_interval=None, on_remove=None):
+        """
+        Args:
+            root (str): Upload directory
+            quota_bytes (int, optional): Disk quota for uploads and their derived files.
+                Defaults to INSIGHTA_UPLOAD_QUOTA_MB or 5 GB.
+            janitor_interval (float, optional): Seconds between quota checks. Defaults
+                to INSIGHTA_UPLOAD_JANITOR_SECONDS or 300.
+            on_remove (callable, optional): Called as on_remove(path) after the janitor
+                deletes an upload, so state kept for that path can be dropped
+        """
+        if quota_bytes is None:
+            quota_mb = os.environ.get('INSIGHTA_UPLOAD_QUOTA_MB')
+            quota_bytes = int(float(quota_mb) * 1024 * 1024) if quota_mb else DEFAULT_QUOTA_BYTES
+        if janitor_interval is None:
+            janitor_interval = float(os.environ.get('INSIGHTA_UPLOAD_JANITOR_SECONDS', DEFAULT_JANITOR_INTERVAL_SECONDS))
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.janitor_interval = janitor_interval
+        self.on_remove = on_remove
+        self.uploads = 0
+        self.deduplicated = 0
+        self.evictions = 0
+        self._in_use = {}  # path -> number of active users in this process
+        self._lock = threading.Lock()
+        self._janitor = None
+        self._stop = threading.Event()
+        os.makedirs(root, exist_ok=True)
+
+    def new_temp_file(self, profiler=None):
+        """Return a HashingFile in the upload directory, optionally feeding a profiler"""
+        return HashingFile(self.root, profiler=profiler)
+
+    def save(self, file_storage, ext):
+        """
+        Store an uploaded file under its content hash
+
+        Args:
+            file_storage (FileStorage): Uploaded file; hashed already when its stream
+                is a HashingFile, otherwise copied and hashed here
+            ext (str): File extension to keep, e.g. '.csv'
+
+        Returns:
+            tuple: (stored path, content hash, True if the content was already stored)
+        """
+        stream = file_storage.stream
+        if not isinstance(stream, HashingFile):
+            stream = self.new_temp_file()
+            shutil.copyfileobj(file_storage.stream, stream)
+        stream.flush()
+
+        content_hash = stream.hexdigest()
+        path = os.path.join(self.root, f"{content_hash}{ext}")
+        with self._lock:
+            self.uploads += 1
+            duplicate = os.path.exists(path)
+            if duplicate:
+                self.deduplicated += 1
+            else:
+                os.replace(stream.path, path)
+                stream.committed = True
+        if stream is not file_storage.stream:
+            stream.close()
+
+        self.touch(path)
+        if duplicate:
+            logger.info(f"Upload matches stored file {os.path.basename(path)}; reusing it")
+        return path, content_hash, duplicate
+
+    def touch(self, path):
+        """Mark a stored file as recently used by bumping its access time"""
+        path = source_path(path)
+        try:
+            # mtime must stay put: it is part of the file fingerprint that keys every cache
+            os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+        except OSError:
+            pass
+
+    @contextmanager
+    def in_use(self, path):
+        """Protect a stored file (or the upload a derived dataset comes from) from eviction while the block runs"""
+        path = source_path(path)
+        with self._lock:
+            self._in_use[path] = self._in_use.get(path, 0) + 1
+        self.touch(path)
+        try:
+            yield path
+        finally:
+            with self._lock:
+                count = self._in_use.pop(path) - 1
+                if count > 0:
+                    self._in_use[path] = count
+
+    def enforce_quota(self):
+        """
+        Delete least recently used files not in use until the store fits its quota
+
+        Returns:
+            int: Number of files deleted
+        """
+        files = []
+        total = 0
+        for item in os.scandir(self.root):
+            if item.is_file() and item.name.startswith(TEMP_PREFIX):
+                if item.stat().st_mtime < time.time() - STALE_TEMP_SECONDS:
+                    _remove_upload(item.path)
+                continue
+            if not item.is_file() or item.name.startswith('.'):
+                continue
+            stat = item.stat()
+            size = stat.st_size + sum(_tree_size(item.path + suffix) for suffix in DERIVED_SUFFIXES)
+            files.append((stat.st_atime, item.path, size))
+            total += size
+        if total <= self.quota_bytes:
+            return 0
+
+        removed = 0
+        cutoff = time.time() - EVICTION_GRACE_SECONDS
+        for last_used, path, size in sorted(files):
+            if total <= self.quota_bytes or last_used > cutoff:
+                break
+            with self._lock:
+                if path in self._in_use:
+                    continue
+                _remove_upload(path)
+            total -= size
+            removed += 1
+            logger.info(f"Evicted upload {os.path.basename(path)} ({size} bytes) to stay within the disk quota")
+            if self.on_remove is not None:
+                try:
+                    self.on_remove(path)
+                except Exception as e:
+                    logger.warning(f"Upload removal callback failed for {path}: {str(e)}")
+        with self._lock:
+            self.evictions += removed
+        if total > self.quota_bytes:
+            logger.warning(f"Uploads use {total} bytes, over the {self.quota_bytes} byte quota, but every file is in use")
+        return removed
+
+    def start_janitor(self):
+        """Run enforce_quota() periodically on a daemon thread"""
+        if self._janitor is not None or self.janitor_interval <= 0:
+            return
+        self._janitor = threading.Thread(target=self._janitor_loop, name='insighta-upload-janitor', daemon=True)
+        self._janitor.start()
+
+    def stop_janitor(self):
+        self._stop.set()
+
+    def stats(self):
+        """Return upload, deduplication and eviction counters"""
+        with self._lock:
+            return {
+                'uploads': self.uploads,
+                'deduplicated': self.deduplicated,
+                'evictions': self.evictions,
+                'in_use': len(self._in_use),
+                'quota_bytes': self.quota_bytes
+            }
+
+    def _janitor_loop(self):
+        while not self._stop.wait(self.janitor_interval):
+            try:
+                self.enforce_quota()
+            except Exception as e:
+                logger.error(f"Upload janitor failed: {str(e)}")
+
+
+def source_path(path):
+    """Return the upload a derived path belongs to, e.g. the workbook of a converted sheet"""
+    for suffix in DERIVED_SUFFIXES:
+        marker = suffix + os.sep
+        if marker in path:
+            return path[:path.index(marker)]
+    return path
+
+
+def _tree_size(path):
+    if not os.path.isdir(path):
+        return 0
+    return sum(os.path.getsize(os.path.join(directory, name))
+               for directory, _, names in os.walk(path) for name in names)
+
+
+def _remove_upload(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    for suffix in DERIVED_SUFFIXES:
+        shutil.rmtree(path + suffix, ignore_errors=True)
@@ -0,0 +1 @@
+# Benchmark suite for the ingestion and analysis pipeline; see README.md ("Benchmarks")
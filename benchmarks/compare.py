@@ -0,0 +1,100 @@
+"""
+Benchmark comparison: flag latency and memory regressions against a stored baseline
+
+Usage:
+    python -m benchmarks.compare benchmarks/results/latest.json benchmarks/baseline.json
+"""
+import sys
+import json
+import argparse
+
+# Metrics compared per result: (label, path into the result dict)
+COMPARED_METRICS = [
+    ('p50 ms', ('latency_ms', 'p50')),
+    ('p95 ms', ('latency_ms', 'p95')),
+    ('peak RSS MB', ('peak_rss_mb',))
+]
+
+# Differences below this are noise whatever the ratio (timer resolution, allocator slack)
+MIN_ABSOLUTE_CHANGE = {'p50 ms': 1.0, 'p95 ms': 2.0, 'peak RSS MB': 10.0}
+
+
+def compare_results(current, baseline, threshold=0.25):
+    """
+    Compare two benchmark result files
+
+    Args:
+        current (dict): Results of this run, as written by benchmarks.run
+        baseline (dict): Stored baseline results
+        threshold (float): Relative increase counted as a regression (0.25 = 25%)
+
+    Returns:
+        list: One dict per (case, scenario, metric) present in both, with the
+            baseline and current values, the relative change and a 'regression' flag
+    """
+    baseline_by_key = {(r['case'], r['scenario']): r for r in baseline.get('results', [])}
+    rows = []
+    for result in current.get('results', []):
+        base = baseline_by_key.get((result['case'], result['scenario']))
+        if base is None:
+            continue
+        for label, path in COMPARED_METRICS:
+            before, after = _lookup(base, path), _lookup(result, path)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else 0.0
+            rows.append({
+                'case': result['case'],
+                'scenario': result['scenario'],
+                'metric': label,
+                'baseline': before,
+                'current': after,
+                'change': change,
+                'regression': change > threshold and after - before > MIN_ABSOLUTE_CHANGE[label]
+            })
+    return rows
+
+
+def format_report(rows):
+    """Render comparison rows as a fixed-width table, regressions marked"""
+    if not rows:
+        return "No results in common with the baseline"
+    header = f"{'case':<40} {'scenario':<15} {'metric':<12} {'baseline':>10} {'current':>10} {'change':>8}"
+    lines = [header, '-' * len(header)]
+    for row in rows:
+        mark = '  REGRESSION' if row['regression'] else ''
+        lines.append(f"{row['case']:<40} {row['scenario']:<15} {row['metric']:<12} "
+                     f"{row['baseline']:>10.1f} {row['current']:>10.1f} {row['change']:>+8.1%}{mark}")
+    regressions = sum(1 for row in rows if row['regression'])
+    lines.append(f"{regressions} regression(s) in {len(rows)} comparisons")
+    return '\n'.join(lines)
+
+
+def _lookup(result, path):
+    value = result
+    for part in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare benchmark results against a baseline")
+    parser.add_argument('current', help="Results JSON of this run")
+    parser.add_argument('baseline', help="Baseline results JSON")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Allowed slowdown or memory growth (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    with open(args.current, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    rows = compare_results(current, baseline, threshold=args.threshold)
+    print(format_report(rows))
+    return 1 if any(row['regression'] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
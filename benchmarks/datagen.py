@@ -0,0 +1,172 @@
+"""
+Synthetic datasets: reproducible CSV files of any size, dtype mix, cardinality and dialect
+"""
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Rows generated and written per step, so files larger than memory can be produced
+CHUNK_ROWS = 100_000
+
+# Column kinds cycled through for each dtype mix
+MIXES = {
+    'numeric': ['int', 'float'],
+    'mixed': ['int', 'float', 'category', 'text', 'date', 'bool'],
+    'text': ['category', 'text']
+}
+
+# Distinct values of low-cardinality categorical columns
+LOW_CARDINALITY = 12
+
+# Dialect variants: delimiter and encoding
+VARIANTS = {
+    'comma-utf8': {'sep': ',', 'encoding': 'utf-8'},
+    'semicolon-cp1252': {'sep': ';', 'encoding': 'cp1252'},
+    'tab-utf8-bom': {'sep': '\t', 'encoding': 'utf-8-sig'},
+    'pipe-utf8': {'sep': '|', 'encoding': 'utf-8'}
+}
+
+# Words for text columns; the accented ones exercise encoding detection
+WORDS = np.array(['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel', 'india',
+                  'juliett', 'kilo', 'lima', 'café', 'naïve', 'résumé', 'über', 'señor', 'zoë'])
+
+
+class DatasetSpec:
+    """
+    Description of a synthetic CSV dataset.
+
+    The same spec always produces the same bytes, so results from different runs
+    and machines are comparable.
+    """
+    def __init__(self, rows, columns, mix='mixed', cardinality='low', variant='comma-utf8', seed=0):
+        """
+        Args:
+            rows (int): Number of data rows
+            columns (int): Number of columns
+            mix (str): Dtype mix, one of MIXES
+            cardinality (str): 'low' for a few repeated categories, 'high' for mostly distinct values
+            variant (str): Delimiter/encoding variant, one of VARIANTS
+            seed (int): Random seed
+        """
+        if mix not in MIXES:
+            raise ValueError(f"Unknown dtype mix: {mix}")
+        if cardinality not in ('low', 'high'):
+            raise ValueError(f"Unknown cardinality: {cardinality}")
+        if variant not in VARIANTS:
+            raise ValueError(f"Unknown variant: {variant}")
+        self.rows = rows
+        self.columns = columns
+        self.mix = mix
+        self.cardinality = cardinality
+        self.variant = variant
+        self.seed = seed
+
+    @property
+    def name(self):
+        return (f"{_short(self.rows)}x{self.columns}-{self.mix}-{self.cardinality}-{self.variant}"
+                f"{'' if self.seed == 0 else f'-s{self.seed}'}")
+
+    def to_dict(self):
+        return {'rows': self.rows, 'columns': self.columns, 'mix': self.mix,
+                'cardinality': self.cardinality, 'variant': self.variant, 'seed': self.seed}
+
+    def digest(self):
+        """Identify the generated bytes, including the generator's parameters"""
+        payload = json.dumps({'spec': self.to_dict(), 'chunk_rows': CHUNK_ROWS, 'version': 1}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12]
+
+
+def generate_frame(spec, start=0, rows=None):
+    """
+    Generate rows [start, start + rows) of a dataset
+
+    Args:
+        spec (DatasetSpec): Dataset description
+        start (int): First row
+        rows (int, optional): Number of rows; defaults to the rest of the dataset
+
+    Returns:
+        DataFrame: Generated rows
+    """
+    rows = spec.rows - start if rows is None else rows
+    # One generator per chunk keeps chunks reproducible whatever order they are made in
+    rng = np.random.default_rng([spec.seed, start])
+    kinds = MIXES[spec.mix]
+    data = {}
+    for i in range(spec.columns):
+        kind = kinds[i % len(kinds)]
+        data[f"{kind}_{i}"] = _column(kind, rng, rows, start, spec.cardinality)
+    return pd.DataFrame(data)
+
+
+def write_csv(spec, path):
+    """
+    Write a dataset to a CSV file chunk by chunk
+
+    Args:
+        spec (DatasetSpec): Dataset description
+        path (str): Destination file
+    """
+    variant = VARIANTS[spec.variant]
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding=variant['encoding'], newline='') as f:
+        for start in range(0, max(spec.rows, 1), CHUNK_ROWS):
+            frame = generate_frame(spec, start, min(CHUNK_ROWS, spec.rows - start))
+            frame.to_csv(f, sep=variant['sep'], index=False, header=start == 0, lineterminator='\n')
+    os.replace(tmp_path, path)
+
+
+def ensure_dataset(spec, data_dir):
+    """
+    Return the path of a dataset's CSV file, generating it on first use
+
+    Args:
+        spec (DatasetSpec): Dataset description
+        data_dir (str): Directory where generated files are kept between runs
+
+    Returns:
+        str: Path to the CSV file
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"{spec.name}-{spec.digest()}.csv")
+    if not os.path.exists(path):
+        logger.info(f"Generating {spec.name} ({spec.rows} rows, {spec.columns} columns)")
+        write_csv(spec, path)
+    return path
+
+
+def _column(kind, rng, rows, start, cardinality):
+    if kind == 'int':
+        return rng.integers(0, 1_000_000, rows)
+    if kind == 'float':
+        values = rng.normal(100.0, 15.0, rows).round(4)
+        values[rng.random(rows) < 0.02] = np.nan
+        return values
+    if kind == 'category':
+        if cardinality == 'low':
+            return np.char.add('cat_', rng.integers(0, LOW_CARDINALITY, rows).astype(str))
+        return np.char.add('id_', (start + np.arange(rows)).astype(str))
+    if kind == 'text':
+        text = np.char.add(np.char.add(WORDS[rng.integers(0, len(WORDS), rows)], ' '),
+                           WORDS[rng.integers(0, len(WORDS), rows)])
+        if cardinality == 'high':
+            text = np.char.add(np.char.add(text, ' #'), (start + np.arange(rows)).astype(str))
+        return text
+    if kind == 'date':
+        days = rng.integers(0, 5 * 365, rows)
+        return (np.datetime64('2020-01-01') + days.astype('timedelta64[D]')).astype(str)
+    if kind == 'bool':
+        return rng.random(rows) < 0.5
+    raise ValueError(f"Unknown column kind: {kind}")
+
+
+def _short(n):
+    for size, suffix in ((1_000_000, 'M'), (1_000, 'k')):
+        if n >= size and n % size == 0:
+            return f"{n // size}{suffix}"
+    return str(n)
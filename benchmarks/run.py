@@ -0,0 +1,283 @@
+"""
+Benchmark runner: time the ingestion and analysis pipeline on synthetic datasets
+
+Usage:
+    python -m benchmarks.run --suite quick --output benchmarks/results/latest.json
+    python -m benchmarks.run --suite quick --baseline benchmarks/baseline.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from io import BytesIO
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from benchmarks.datagen import DatasetSpec, ensure_dataset
+from benchmarks.compare import compare_results, format_report
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATA_DIR = os.path.join(ROOT, 'benchmarks', '.data')
+DEFAULT_OUTPUT = os.path.join(ROOT, 'benchmarks', 'results', 'latest.json')
+
+SCENARIOS = ('summary_cold', 'summary_warm', 'insights_mock', 'visualizations', 'http_upload', 'http_analyze')
+
+# The Flask test client holds request bodies in memory, so HTTP scenarios skip larger files
+HTTP_MAX_BYTES = 256 * 1024 * 1024
+
+QUICK_SUITE = [
+    DatasetSpec(1_000, 10),
+    DatasetSpec(100_000, 10),
+    DatasetSpec(100_000, 100, mix='numeric'),
+    DatasetSpec(10_000, 1000, mix='numeric'),
+    DatasetSpec(100_000, 20, mix='text', cardinality='high'),
+    DatasetSpec(100_000, 20, variant='semicolon-cp1252'),
+    DatasetSpec(100_000, 20, variant='tab-utf8-bom'),
+]
+
+SUITES = {
+    'quick': QUICK_SUITE,
+    'full': QUICK_SUITE + [
+        DatasetSpec(1_000_000, 10),
+        DatasetSpec(1_000_000, 100, mix='numeric'),
+        DatasetSpec(1_000_000, 20, cardinality='high'),
+        DatasetSpec(100_000, 1000),
+        DatasetSpec(1_000_000, 20, mix='text', variant='pipe-utf8'),
+        DatasetSpec(10_000_000, 10, mix='numeric'),
+        DatasetSpec(10_000_000, 10),
+    ]
+}
+
+
+def run_suite(specs, repeat=5, scenarios=SCENARIOS, data_dir=DEFAULT_DATA_DIR, verbose=False):
+    """
+    Benchmark every dataset, each in a fresh worker process
+
+    Args:
+        specs (list): DatasetSpecs to run
+        repeat (int): Timed runs per scenario
+        scenarios (tuple): Scenario names to run
+        data_dir (str): Directory of generated datasets
+        verbose (bool): Keep the application's INFO logging
+
+    Returns:
+        dict: {'meta': environment, 'results': one dict per dataset and scenario}
+    """
+    results = []
+    for spec in specs:
+        path = ensure_dataset(spec, data_dir)
+        logger.info(f"Running {spec.name} ({os.path.getsize(path) / 1e6:.1f} MB)")
+        # A fresh process per dataset keeps caches cold and peak RSS attributable
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results.extend(pool.submit(run_case, spec.to_dict(), spec.name, path, repeat,
+                                       tuple(scenarios), verbose).result())
+    return {'meta': environment(repeat), 'results': results}
+
+
+def run_case(spec, name, path, repeat, scenarios, verbose=False):
+    """
+    Worker process: run the scenarios against one dataset
+
+    Returns:
+        list: Result dicts with latency percentiles, throughput and peak RSS
+    """
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    # Mock model, no persistent caches, no shared store: measure the pipeline itself
+    os.environ.pop('GEMINI_API_KEY', None)
+    os.environ.update({'INSIGHTA_LLM_CACHE_PATH': '', 'INSIGHTA_SHARED_STORE_DIR': '',
+                       'INSIGHTA_UPLOAD_JANITOR_SECONDS': '0'})
+    workdir = tempfile.mkdtemp(prefix='insighta-bench-')
+    os.chdir(workdir)
+    try:
+        from app.insights_engine import InsightsEngine
+        from app.columnar_store import columnar_path
+        if not verbose:
+            logging.getLogger().setLevel(logging.WARNING)
+
+        file_bytes = os.path.getsize(path)
+        results = []
+
+        def record(scenario, timings):
+            latencies = np.asarray(timings) * 1000
+            p50 = float(np.percentile(latencies, 50))
+            results.append({
+                'case': name,
+                'scenario': scenario,
+                'spec': spec,
+                'file_bytes': file_bytes,
+                'runs': len(timings),
+                'latency_ms': {
+                    'p50': round(p50, 3),
+                    'p95': round(float(np.percentile(latencies, 95)), 3),
+                    'p99': round(float(np.percentile(latencies, 99)), 3),
+                    'mean': round(float(latencies.mean()), 3),
+                    'min': round(float(latencies.min()), 3)
+                },
+                'rows_per_s': round(spec['rows'] / (p50 / 1000), 1) if p50 else None,
+                'mb_per_s': round(file_bytes / 1e6 / (p50 / 1000), 2) if p50 else None,
+                # High-water mark of the worker process once the scenario has run
+                'peak_rss_mb': round(peak_rss_bytes() / 1e6, 1)
+            })
+
+        def timed(fn, runs):
+            timings = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                fn()
+                timings.append(time.perf_counter() - started)
+            return timings
+
+        if 'summary_cold' in scenarios:
+            timings = []
+            for _ in range(repeat):
+                # New engine, no columnar copy: parse and profile from scratch
+                shutil.rmtree(columnar_path(path), ignore_errors=True)
+                cold_engine = InsightsEngine()
+                timings += timed(lambda: cold_engine.get_data_summary(path), 1)
+            record('summary_cold', timings)
+
+        engine = InsightsEngine()
+        engine.get_data_summary(path)
+        if 'summary_warm' in scenarios:
+            record('summary_warm', timed(lambda: engine.get_data_summary(path), repeat))
+        if 'insights_mock' in scenarios:
+            record('insights_mock', timed(lambda: engine.generate_insights(path, insight_type='general'), repeat))
+        if 'visualizations' in scenarios:
+            record('visualizations', timed(lambda: engine.generate_visualization_data(path), repeat))
+
+        http = [s for s in scenarios if s.startswith('http_')]
+        if http and file_bytes <= HTTP_MAX_BYTES:
+            run_http(path, repeat, http, record)
+        elif http:
+            logger.warning(f"Skipping HTTP scenarios for {name}: {file_bytes / 1e6:.0f} MB is over the test client limit")
+        return results
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_http(path, repeat, scenarios, record):
+    """Drive /upload and /analyze through the Flask test client"""
+    spec = importlib.util.spec_from_file_location('insighta_webapp', os.path.join(ROOT, 'app.py'))
+    webapp = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(webapp)
+    client = webapp.app.test_client()
+    with open(path, 'rb') as f:
+        body = f.read()
+    filename = os.path.basename(path)
+
+    def upload():
+        response = client.post('/upload', data={'file': (BytesIO(body), filename)},
+                               content_type='multipart/form-data')
+        if response.status_code != 200:
+            raise RuntimeError(f"/upload returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+    def forget_upload():
+        # Uploads are deduplicated by content; start each timed upload from scratch
+        engine = webapp.insights_engine
+        engine.dataset_cache.clear()
+        engine.profile_cache.clear()
+        shutil.rmtree(webapp.UPLOAD_FOLDER, ignore_errors=True)
+        os.makedirs(webapp.UPLOAD_FOLDER, exist_ok=True)
+
+    def analyze():
+        response = client.post('/analyze', json={'insight_type': 'general'})
+        if response.status_code != 200:
+            raise RuntimeError(f"/analyze returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+    if 'http_upload' in scenarios:
+        timings = []
+        for _ in range(repeat):
+            forget_upload()
+            started = time.perf_counter()
+            upload()
+            timings.append(time.perf_counter() - started)
+        record('http_upload', timings)
+    else:
+        upload()
+    if 'http_analyze' in scenarios:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            analyze()
+            timings.append(time.perf_counter() - started)
+        record('http_analyze', timings)
+
+
+def peak_rss_bytes():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def environment(repeat):
+    """Describe the machine and code version the results come from"""
+    import pandas as pd
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'repeat': repeat
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Insighta ingestion and analysis pipeline")
+    parser.add_argument('--suite', choices=sorted(SUITES), default='quick', help="Dataset suite to run")
+    parser.add_argument('--case', action='append', default=[],
+                        help="Only run datasets whose name contains this text (repeatable)")
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, default=[],
+                        help="Only run this scenario (repeatable)")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per scenario")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="Where generated datasets are kept")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="Results JSON file")
+    parser.add_argument('--baseline', help="Compare against this results file and fail on regressions")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Allowed slowdown or memory growth over the baseline (0.25 = 25%%)")
+    parser.add_argument('--verbose', action='store_true', help="Show the application's log output")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    specs = [spec for spec in SUITES[args.suite] if not args.case or any(text in spec.name for text in args.case)]
+    if not specs:
+        parser.error("No dataset matches --case")
+
+    results = run_suite(specs, repeat=args.repeat, scenarios=tuple(args.scenario) or SCENARIOS,
+                        data_dir=args.data_dir, verbose=args.verbose)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Wrote {len(results['results'])} results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare_results(results, baseline, threshold=args.threshold)
+        print(format_report(rows))
+        return 1 if any(row['regression'] for row in rows) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())